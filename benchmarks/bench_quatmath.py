@@ -0,0 +1,56 @@
+"""Benchmark comparing the closed-form, batched quatmath functions against the
+matrix route (building L(q)/R(q) and taking matrix products one quaternion at
+a time) they replace.
+
+Run with:
+    python -m benchmarks.bench_quatmath [--samples N]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import quatmath as qm
+
+def Q_matrix_route(q: np.ndarray) -> np.ndarray:
+    return qm.H.T @ qm.R(q).T @ qm.L(q) @ qm.H
+
+def compose_matrix_route(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
+    return qm.L(q1) @ q2
+
+def rotate_matrix_route(q: np.ndarray, v: np.ndarray) -> np.ndarray:
+    return Q_matrix_route(q) @ v
+
+def best_time(fn, repeat: int = 5) -> float:
+    """Return the best wall clock time of fn over a number of repeats."""
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=10000,
+                        help="Number of quaternions to process.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    qs = rng.normal(size=(args.samples, 4))
+    qs /= np.linalg.norm(qs, axis=-1, keepdims=True)
+    vs = rng.normal(size=(args.samples, 3))
+
+    cases = {
+        "Q": (lambda: [Q_matrix_route(q) for q in qs],
+              lambda: qm.Q(qs)),
+        "compose": (lambda: [compose_matrix_route(q1, q2) for q1, q2 in zip(qs, qs[::-1])],
+                    lambda: qm.compose(qs, qs[::-1])),
+        "rotate": (lambda: [rotate_matrix_route(q, v) for q, v in zip(qs, vs)],
+                   lambda: qm.rotate(qs, vs)),
+    }
+
+    print(f"{'function':<10} {'matrix route (s)':>18} {'batched (s)':>14} {'speedup':>10}")
+    for name, (matrix_route, batched) in cases.items():
+        t_matrix = best_time(matrix_route, repeat=3)
+        t_batched = best_time(batched)
+        print(f"{name:<10} {t_matrix:>18.4f} {t_batched:>14.6f} {t_matrix / t_batched:>9.0f}x")
+
+if __name__ == "__main__":
+    main()
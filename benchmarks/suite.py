@@ -0,0 +1,286 @@
+"""Benchmark suite covering quatmath, the dynamics models, the integrators and
+full rollouts, with regression tracking against a saved JSON baseline.
+
+Every benchmark reports its throughput in steps per second (quaternions per
+second for quatmath, environment-steps per second for the models and
+rollouts) and its peak temporary memory per step, as measured by
+tracemalloc. The peak memory tracks how much a step allocates: a step that
+writes into preallocated buffers stays near zero, and one that creates a new
+array for every intermediate result grows with the batch size.
+
+Run with:
+    python -m benchmarks.suite                      # Run and compare.
+    python -m benchmarks.suite --save               # Record a new baseline.
+    python -m benchmarks.suite --quick --filter box # Subset, fewer repeats.
+
+The process exits with status 1 if any benchmark's throughput drops, or its
+memory per step grows, by more than --threshold relative to the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import quatmath as qm
+
+from dynamics_sim import jit
+from dynamics_sim.constellation import ConjunctionScreener, Constellation
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+from dynamics_sim.simulator import Simulator
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Memory differences below this many bytes per step are treated as noise.
+MEMORY_SLACK_BYTES = 64
+
+class Benchmark:
+    """A named function to time, and the number of steps one call performs."""
+
+    def __init__(self, name: str, fn: Callable[[], object], steps: int):
+        self.name = name
+        self.fn = fn
+        self.steps = steps
+
+def random_quaternions(rng: np.random.Generator, shape) -> np.ndarray:
+    q = rng.normal(size=tuple(shape) + (4,))
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+def box_states(rng: np.random.Generator, batch: int) -> np.ndarray:
+    x = rng.normal(size=(batch, 4))
+    # Keep v_x away from 0, where the friction discontinuity forces the
+    # adaptive integrator into tiny steps.
+    x[:, 2] = 1.0 + np.abs(x[:, 2])
+    return x
+
+def orbit_states(rng: np.random.Generator, batch: int) -> np.ndarray:
+    x = np.zeros((batch, 13))
+    x[:, 0] = 7000e3 + rng.normal(scale=1e3, size=batch)
+    x[:, 3:7] = random_quaternions(rng, (batch,))
+    x[:, 8] = 7.5e3
+    x[:, 10:] = rng.normal(scale=0.1, size=(batch, 3))
+    return x
+
+def constellation_states(rng: np.random.Generator, batch: int) -> np.ndarray:
+    """(N, 6) states of circular orbits at 7000 km with random planes."""
+    r = rng.normal(size=(batch, 3))
+    r /= np.linalg.norm(r, axis=-1, keepdims=True)
+    v = np.cross(r, rng.normal(size=(batch, 3)))
+    v /= np.linalg.norm(v, axis=-1, keepdims=True)
+    return np.concatenate([7000e3 * r, np.sqrt(3.986e14 / 7000e3) * v], axis=-1)
+
+def benchmarks(quick: bool = False) -> List[Benchmark]:
+    """Build the list of benchmarks.
+
+    Args:
+        quick (bool, optional): Use smaller batches and horizons. Defaults to
+        False.
+
+    Returns:
+        List[Benchmark]: The benchmarks.
+    """
+    rng = np.random.default_rng(0)
+    batch = 1000 if quick else 10000
+    cases = []
+
+    # quatmath, one quaternion at a time and batched.
+    q1, q2 = random_quaternions(rng, (2, batch))
+    v = rng.normal(size=(batch, 3))
+    phi = rng.normal(scale=0.1, size=(batch, 3))
+    for name, fn, args in [("Q", qm.Q, (q1,)),
+                           ("compose", qm.compose, (q1, q2)),
+                           ("rotate", qm.rotate, (q1, v)),
+                           ("exp", qm.exp, (phi,))]:
+        single = tuple(a[0] for a in args)
+        cases.append(Benchmark(f"quatmath.{name}[1]", lambda fn=fn, a=single: fn(*a), 1))
+        cases.append(Benchmark(f"quatmath.{name}[{batch}]", lambda fn=fn, a=args: fn(*a), batch))
+        args32 = tuple(a.astype(np.float32) for a in args)
+        cases.append(Benchmark(f"quatmath.{name}.float32[{batch}]",
+                               lambda fn=fn, a=args32: fn(*a), batch))
+
+    models = [("box", BoxDynamics(), box_states, np.zeros(2)),
+              ("gravity", GravityDynamics(dt=1.0), orbit_states, np.zeros(3))]
+
+    # Continuous-time dynamics, written into a reused output buffer.
+    for name, model, states, u in models:
+        for n in (1, batch):
+            x = states(rng, n)
+            u_n = np.broadcast_to(u, (n, len(u)))
+            out = np.empty_like(x)
+            cases.append(Benchmark(f"{name}.x_dot_k_1[{n}]",
+                                   lambda m=model, x=x, u=u_n, out=out: m.x_dot_k_1(x, u, out=out), n))
+
+    # Single steps of each integrator, and of the compiled backend if Numba
+    # is installed.
+    variants = [(integrator, "numpy") for integrator in
+                ["euler", "rk4", "velocity_verlet", "dopri5"]]
+    if jit.NUMBA_AVAILABLE:
+        variants.append(("rk4", "numba"))
+    for name, model, states, u in models:
+        for integrator, backend in variants:
+            stepper = type(model)(dt=model.dt, integrator=integrator, backend=backend)
+            suffix = "" if backend == "numpy" else f".{backend}"
+            for n in (1, batch):
+                x = states(rng, n)
+                u_n = np.broadcast_to(u, (n, len(u)))
+                out = np.empty_like(x)
+                cases.append(Benchmark(f"{name}.x_k_1.{integrator}{suffix}[{n}]",
+                                       lambda m=stepper, x=x, u=u_n, out=out: m.x_k_1(x, u, out=out), n))
+
+    # Full rollouts through the Simulator, reusing the trajectory buffers.
+    horizons = (100,) if quick else (100, 1000)
+    batches = (1, 100) if quick else (1, 100, 1000)
+    for name, model, states, u in models:
+        for horizon in horizons:
+            for n in batches:
+                simulator = Simulator(model, lambda x_k, k, u=u: u, states(rng, n), horizon)
+                buffers = simulator.allocate(len(u))
+                cases.append(Benchmark(f"{name}.rollout[T={horizon},N={n}]",
+                                       lambda s=simulator, b=buffers: s.simulate(*b), horizon * n))
+
+    # The same batched rollouts in float32 (see dynamics_sim.precision).
+    for name, model, states, u in models:
+        single = type(model)(dt=model.dt, precision="float32")
+        for horizon in horizons:
+            n = batches[-1]
+            simulator = Simulator(single, lambda x_k, k, u=u: u,
+                                  states(rng, n).astype(np.float32), horizon)
+            buffers = simulator.allocate(len(u))
+            cases.append(Benchmark(f"{name}.rollout.float32[T={horizon},N={n}]",
+                                   lambda s=simulator, b=buffers: s.simulate(*b), horizon * n))
+
+    # Constellation propagation and conjunction screening, per object.
+    x = constellation_states(rng, batch)
+    for j2 in (False, True):
+        constellation = Constellation.from_states(x, j2=j2)
+        cases.append(Benchmark(f"constellation.step{'.j2' if j2 else ''}[{batch}]",
+                               lambda c=constellation: c.step(1.0), batch))
+    screener = ConjunctionScreener(threshold=10e3)
+    cases.append(Benchmark(f"conjunction.screen[{batch}]",
+                           lambda c=constellation, s=screener: s.screen(c.r), batch))
+    return cases
+
+def measure(benchmark: Benchmark, repeat: int = 5) -> Dict[str, float]:
+    """Time a benchmark and measure its peak temporary memory.
+
+    Args:
+        benchmark (Benchmark): The benchmark.
+        repeat (int, optional): Number of timing repeats, of which the best is
+        kept. Defaults to 5.
+
+    Returns:
+        Dict[str, float]: steps_per_s and bytes_per_step.
+    """
+    # Warm up first, so that one-time costs (e.g., JIT compilation) do not
+    # skew the number of calls chosen by autorange.
+    benchmark.fn()
+    timer = timeit.Timer(benchmark.fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    # Measure after the timing runs, so that one-time allocations such as
+    # integrator scratch buffers are already made.
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        benchmark.fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"steps_per_s": benchmark.steps / best,
+            "bytes_per_step": (peak - start) / benchmark.steps}
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Find the benchmarks that regressed relative to a baseline.
+
+    Args:
+        results (Dict[str, Dict[str, float]]): The new results.
+        baseline (Dict[str, Dict[str, float]]): The baseline results.
+        threshold (float): Allowed relative regression, e.g., 0.2 for 20%.
+
+    Returns:
+        List[str]: A description of every regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["steps_per_s"] < base["steps_per_s"] * (1 - threshold):
+            regressions.append(f"{name}: {result['steps_per_s']:.4g} steps/s, baseline "
+                               f"{base['steps_per_s']:.4g}")
+        limit = base["bytes_per_step"] * (1 + threshold) + MEMORY_SLACK_BYTES
+        if result["bytes_per_step"] > limit:
+            regressions.append(f"{name}: {result['bytes_per_step']:.4g} bytes/step, baseline "
+                               f"{base['bytes_per_step']:.4g}")
+    return regressions
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]):
+    with open(path, "w") as f:
+        json.dump({"python": sys.version.split()[0],
+                   "numpy": np.__version__,
+                   "machine": platform.machine(),
+                   "results": results}, f, indent=2)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="Path of the JSON baseline to compare against (and save to).")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative regression before failing.")
+    parser.add_argument("--filter", default="",
+                        help="Only run benchmarks whose name contains this string.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of timing repeats per benchmark.")
+    parser.add_argument("--quick", action="store_true",
+                        help="Use smaller batches and horizons.")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    print(f"{'benchmark':<40} {'steps/s':>12} {'bytes/step':>12} {'vs baseline':>12}")
+    for benchmark in benchmarks(args.quick):
+        if args.filter not in benchmark.name:
+            continue
+        result = measure(benchmark, args.repeat)
+        results[benchmark.name] = result
+        change = ""
+        if baseline is not None and benchmark.name in baseline:
+            change = f"{result['steps_per_s'] / baseline[benchmark.name]['steps_per_s']:.2f}x"
+        print(f"{benchmark.name:<40} {result['steps_per_s']:>12.4g} "
+              f"{result['bytes_per_step']:>12.1f} {change:>12}")
+
+    if args.save:
+        save_baseline(args.baseline, {**(baseline or {}), **results})
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save to record one.")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Unit tests for the benchmark suite's regression check."""
+
+from benchmarks.suite import MEMORY_SLACK_BYTES, compare, load_baseline, save_baseline
+
+def test_compare():
+    """Test that only regressions past the threshold are flagged."""
+    baseline = {"fast": {"steps_per_s": 1000.0, "bytes_per_step": 100.0},
+                "lean": {"steps_per_s": 1000.0, "bytes_per_step": 100.0},
+                "retired": {"steps_per_s": 1000.0, "bytes_per_step": 100.0}}
+    # Within the threshold: slightly slower and slightly larger.
+    within = {"fast": {"steps_per_s": 850.0, "bytes_per_step": 100.0},
+              "lean": {"steps_per_s": 1000.0, "bytes_per_step": 115.0 + MEMORY_SLACK_BYTES},
+              "new": {"steps_per_s": 1.0, "bytes_per_step": 1e9}}
+    assert compare(within, baseline, threshold=0.2) == []
+
+    # Past the threshold: much slower, and much larger.
+    past = {"fast": {"steps_per_s": 700.0, "bytes_per_step": 100.0},
+            "lean": {"steps_per_s": 1000.0, "bytes_per_step": 130.0 + MEMORY_SLACK_BYTES}}
+    regressions = compare(past, baseline, threshold=0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("fast:") and "steps/s" in regressions[0]
+    assert regressions[1].startswith("lean:") and "bytes/step" in regressions[1]
+    # A looser threshold lets them through.
+    assert compare(past, baseline, threshold=0.5) == []
+
+def test_baseline_round_trip(tmp_path):
+    """Test that a saved baseline loads back, and a missing one loads as None."""
+    path = str(tmp_path / "baseline.json")
+    assert load_baseline(path) is None
+    results = {"fast": {"steps_per_s": 1000.0, "bytes_per_step": 100.0}}
+    save_baseline(path, results)
+    assert load_baseline(path) == results
@@ -0,0 +1,335 @@
+"""Content-addressed memoization of open-loop rollouts.
+
+A rollout is fully determined by the model class and its source code, the
+model's constructor parameters (including dt and the backend), the integrator
+and its settings, the initial state, and the control sequence. rollout_key
+hashes all of these into a stable key, so regenerating a notebook or report
+that re-runs the same rollouts only reads them back instead of simulating
+them again:
+
+    cache = RolloutCache("~/.cache/dynamics_sim/rollouts", max_disk_bytes=2**30)
+    states, controls = cache.rollout(BoxDynamics(surface_friction_coef=0.5), x_0, controls)
+
+Results are kept in two tiers. The in-memory tier is a bounded LRU of the
+most recently used rollouts. The on-disk tier keeps one .npy pair per key,
+written atomically, and evicts the least recently used entries (by
+modification time, which is refreshed on every hit) once the directory grows
+past max_disk_bytes.
+
+The source files of every class in the model's and the integrator's class
+hierarchies are part of the key, so editing a model (or an integrator, or
+the base class) invalidates its cached rollouts automatically. Rollouts of
+classes defined outside of files (e.g., in notebook cells) are not cached, as
+their edits could not be tracked. Code outside those files, such as quatmath,
+is not tracked either; bump CACHE_VERSION or call clear after changing it.
+
+Every attribute of the model is part of the key too, so a model attribute of
+a type the key cannot hash (e.g., a callable) raises a TypeError rather than
+being left out of the key.
+"""
+
+import hashlib
+import inspect
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from dynamics_sim.controllers.controller import OpenLoopController
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.simulator import Simulator
+
+# Part of every key. Bumped when rollouts change in ways the tracked source
+# files do not capture.
+CACHE_VERSION = 1
+
+# Model attributes derived from the others, or keyed separately.
+_DERIVED_ATTRIBUTES = ("_integrator", "_jit_step", "_linearization_cache", "_reduced_model")
+
+# Py_TPFLAGS_HEAPTYPE, set on classes defined by class statements rather
+# than built into the interpreter or extension modules.
+_HEAP_TYPE = 1 << 9
+
+# Source file hashes, keyed by path and invalidated by (mtime, size).
+_SOURCE_HASHES: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+def _source_hash(path: str) -> str:
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _SOURCE_HASHES.get(path)
+    if cached is None or cached[0] != signature:
+        with open(path, "rb") as f:
+            cached = (signature, hashlib.sha256(f.read()).hexdigest())
+        _SOURCE_HASHES[path] = cached
+    return cached[1]
+
+def source_fingerprint(cls: type) -> str:
+    """Hash the source files defining cls and its base classes. Built-in
+    classes have no source file, and are hashed by name.
+
+    Raises:
+        ValueError: If a class defined in Python has no source file, e.g.,
+        because it was defined in a notebook cell.
+    """
+    digest = hashlib.sha256()
+    for base in cls.__mro__:
+        if base is object:
+            continue
+        digest.update(f"{base.__module__}.{base.__qualname__}:".encode())
+        if not base.__flags__ & _HEAP_TYPE:
+            # Built-in classes only change along with the installed packages.
+            digest.update(b"builtin;")
+            continue
+        try:
+            path = inspect.getsourcefile(base)
+        except TypeError:
+            path = None
+        if path is None or not os.path.exists(path):
+            raise ValueError(f"{base.__qualname__} has no source file, so edits to it could "
+                             f"not invalidate its cached rollouts")
+        digest.update(_source_hash(path).encode())
+    return digest.hexdigest()
+
+def _update(digest: Any, value: Any, name: str = "value"):
+    """Feed a parameter value into digest, independently of dict ordering and
+    of how arrays happen to be laid out in memory.
+
+    Raises:
+        TypeError: If value (or any value it contains) is of a type that
+        cannot be hashed reliably.
+    """
+    if isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value):
+            digest.update(f"{key}=".encode())
+            _update(digest, value[key], f"{name}[{key!r}]")
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}(".encode())
+        for i, item in enumerate(value):
+            _update(digest, item, f"{name}[{i}]")
+        digest.update(b")")
+    elif isinstance(value, (np.ndarray, np.generic)):
+        array = np.ascontiguousarray(value)
+        if array.dtype.hasobject:
+            raise TypeError(f"Cannot hash {name}: object arrays are not supported")
+        digest.update(f"array{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    elif isinstance(value, np.dtype):
+        digest.update(f"dtype:{value.str};".encode())
+    elif value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+    else:
+        raise TypeError(f"Cannot hash {name} of type {type(value).__name__}")
+
+def rollout_key(model: DynamicsModel, x_0: np.ndarray, controls: np.ndarray) -> str:
+    """Compute the content address of an open-loop rollout.
+
+    Every attribute of the model is part of the key, except those derived
+    from the others (e.g., the numba kernel). The integrator's internal state
+    (e.g., the step size DormandPrince45 carries over between calls) is not,
+    as rollout resets it before simulating.
+
+    Args:
+        model (DynamicsModel): The model.
+        x_0 (np.ndarray): The (n,) or (N, n) initial state.
+        controls (np.ndarray): The (T, m) or (T, N, m) control sequence.
+
+    Returns:
+        str: The hex digest identifying the rollout.
+
+    Raises:
+        TypeError: If an attribute of the model cannot be hashed.
+        ValueError: If the model or integrator class has no source file.
+    """
+    attributes = {name: value for name, value in vars(model).items()
+                  if name not in _DERIVED_ATTRIBUTES}
+    integrator = model.integrator
+    integrator_settings = {name: value for name, value in vars(integrator).items()
+                           if not name.startswith("_")}
+    digest = hashlib.sha256()
+    _update(digest, {
+        "version": CACHE_VERSION,
+        "model": f"{type(model).__module__}.{type(model).__qualname__}",
+        "model_source": source_fingerprint(type(model)),
+        "attributes": attributes,
+        "integrator": type(integrator).__qualname__,
+        "integrator_source": source_fingerprint(type(integrator)),
+        "integrator_settings": integrator_settings,
+        "x_0": np.asarray(x_0),
+        "controls": np.asarray(controls),
+    }, "rollout")
+    return digest.hexdigest()
+
+
+class RolloutCache:
+    """Two-tier (memory and disk) LRU cache of open-loop rollouts."""
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 max_disk_bytes: int = 1 << 30,
+                 max_memory_bytes: int = 256 << 20):
+        """Initialize the cache.
+
+        Args:
+            directory (Optional[str], optional): Directory of the on-disk
+            tier. Created if it does not exist. Defaults to None (memory
+            only).
+            max_disk_bytes (int, optional): Size the on-disk tier is evicted
+            down to. Defaults to 1 GiB.
+            max_memory_bytes (int, optional): Size of the in-memory tier.
+            Defaults to 256 MiB.
+        """
+        self.directory = None if directory is None else os.path.expanduser(directory)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        return (os.path.join(self.directory, f"{key}.states.npy"),
+                os.path.join(self.directory, f"{key}.controls.npy"))
+
+    def _remember(self, key: str, result: Tuple[np.ndarray, np.ndarray]):
+        size = sum(a.nbytes for a in result)
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= sum(a.nbytes for a in self._memory.pop(key))
+        self._memory[key] = result
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum(a.nbytes for a in evicted)
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Look up a rollout by key.
+
+        Returns:
+            Optional[Tuple[np.ndarray, np.ndarray]]: The read-only states and
+            controls, or None on a miss.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits["memory"] += 1
+            return self._memory[key]
+        if self.directory is not None:
+            paths = self._paths(key)
+            try:
+                result = tuple(np.load(path) for path in paths)
+            except (FileNotFoundError, ValueError):
+                # Missing, evicted while reading, or unreadable.
+                result = None
+            if result is not None:
+                for array in result:
+                    array.flags.writeable = False
+                try:
+                    for path in paths:
+                        os.utime(path)
+                except FileNotFoundError:
+                    pass
+                self.hits["disk"] += 1
+                self._remember(key, result)
+                return result
+        self.misses += 1
+        return None
+
+    def put(self,
+            key: str,
+            states: np.ndarray,
+            controls: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Store a rollout under key in both tiers.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Read-only copies of the states and
+            controls, as get will return them.
+        """
+        result = (np.array(states), np.array(controls))
+        for array in result:
+            array.flags.writeable = False
+        self._remember(key, result)
+        if self.directory is None:
+            return result
+        for path, array in zip(self._paths(key), result):
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".rollout-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._evict()
+        return result
+
+    def _evict(self):
+        """Delete the least recently used rollouts until the on-disk tier fits
+        in max_disk_bytes.
+        """
+        # Last use time, files and total size of every stored key.
+        entries: Dict[str, list] = {}
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".npy") and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    used = entries.setdefault(entry.name.split(".")[0], [0, [], 0])
+                    used[0] = max(used[0], stat.st_mtime_ns)
+                    used[1].append(entry.path)
+                    used[2] += stat.st_size
+                    total += stat.st_size
+        for _, paths, size in sorted(entries.values()):
+            if total <= self.max_disk_bytes:
+                break
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        """Empty both tiers."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".npy"):
+                    os.unlink(os.path.join(self.directory, name))
+
+    def rollout(self,
+                model: DynamicsModel,
+                x_0: np.ndarray,
+                controls: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Simulate an open-loop control sequence, or read it back if the same
+        rollout was simulated before. The model's integrator is reset before
+        simulating, so that a rollout does not depend on what the model
+        simulated before.
+
+        Args:
+            model (DynamicsModel): The model.
+            x_0 (np.ndarray): The (n,) or (N, n) initial state.
+            controls (np.ndarray): The (T, m) or (T, N, m) controls, one per
+            timestep (the last one is recorded but does not affect the
+            states).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The read-only (T, ...) states and
+            controls, as returned by Simulator.simulate.
+        """
+        x_0 = np.asarray(x_0)
+        controls = np.asarray(controls)
+        key = rollout_key(model, x_0, controls)
+        result = self.get(key)
+        if result is None:
+            model.integrator.reset()
+            states, controls = Simulator(model, OpenLoopController(controls), x_0,
+                                         len(controls)).simulate()
+            result = self.put(key, states, controls)
+        return result
@@ -0,0 +1,226 @@
+"""Periodic checkpointing, resuming and deterministic replay of simulations.
+
+A checkpoint only holds what is needed to continue a run from timestep k: the
+state x_k and control u_k, the internal state of the controller and the
+integrator (see their get_state methods), and the states of any extra random
+generators (e.g., for process noise). The trajectory history itself is left
+to the sink, e.g., a TrajectoryWriter, which is flushed before every
+checkpoint so that the data on disk always covers at least the timesteps up to
+the latest checkpoint.
+
+Checkpoints are written to a temporary file in the same directory and then
+moved over the previous one with os.replace, which is atomic, so a process
+killed mid-write always leaves the previous complete checkpoint behind.
+
+Example:
+    checkpointer = Checkpointer("runs/orbit/checkpoint.pkl", every_seconds=600)
+    if os.path.exists(checkpointer.path):
+        checkpoint = load_checkpoint(checkpointer.path)
+        with TrajectoryWriter("runs/orbit", model, resume=checkpoint.k + 1) as writer:
+            simulator.stream(writer, checkpointer, resume=checkpoint)
+    else:
+        with TrajectoryWriter("runs/orbit", model) as writer:
+            simulator.stream(writer, checkpointer)
+"""
+
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Bumped when the checkpoint contents change incompatibly.
+CHECKPOINT_VERSION = 1
+
+class Checkpoint:
+    """Everything needed to continue a simulation after timestep k.
+
+    Attributes:
+        k (int): The timestep index.
+        x_k (np.ndarray): The state at timestep k.
+        u_k (np.ndarray): The control commanded at timestep k.
+        controller_state (dict): The controller's get_state().
+        integrator_state (dict): The model integrator's get_state().
+        rng_states (Dict[str, dict]): Bit generator states of extra random
+        generators, by name.
+        model (str): Class name of the model, checked on resume.
+    """
+
+    def __init__(self,
+                 k: int,
+                 x_k: np.ndarray,
+                 u_k: np.ndarray,
+                 controller_state: dict,
+                 integrator_state: dict,
+                 rng_states: Dict[str, dict],
+                 model: str):
+        self.k = k
+        self.x_k = x_k
+        self.u_k = u_k
+        self.controller_state = controller_state
+        self.integrator_state = integrator_state
+        self.rng_states = rng_states
+        self.model = model
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint):
+    """Atomically write a checkpoint to path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".checkpoint-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"version": CHECKPOINT_VERSION, **vars(checkpoint)}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def load_checkpoint(path: str) -> Checkpoint:
+    """Read a checkpoint written by save_checkpoint.
+
+    NOTE: Checkpoints are pickles, so only load checkpoints you wrote.
+    """
+    with open(path, "rb") as f:
+        contents = pickle.load(f)
+    version = contents.pop("version")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {version}, expected "
+                         f"{CHECKPOINT_VERSION}")
+    return Checkpoint(**contents)
+
+
+class Checkpointer:
+    """Decides when to checkpoint a running simulation, and captures and
+    restores everything but the trajectory history.
+    """
+
+    def __init__(self,
+                 path: str,
+                 every_steps: Optional[int] = None,
+                 every_seconds: Optional[float] = None,
+                 rngs: Optional[Dict[str, np.random.Generator]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize the checkpointer.
+
+        Args:
+            path (str): File the latest checkpoint is kept in.
+            every_steps (Optional[int], optional): Checkpoint every this many
+            timesteps. Defaults to None.
+            every_seconds (Optional[float], optional): Checkpoint when at
+            least this much wall time passed since the last one. Defaults to
+            None.
+            rngs (Optional[Dict[str, np.random.Generator]], optional): Extra
+            random generators used by the simulation (outside of the
+            controller) whose states are saved and restored. Defaults to None.
+            clock (Callable[[], float], optional): Monotonic clock. Defaults to
+            time.monotonic.
+        """
+        if every_steps is None and every_seconds is None:
+            raise ValueError("Give every_steps, every_seconds, or both")
+        self.path = path
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.rngs = rngs or {}
+        self._clock = clock
+        self._last_time = clock()
+        self._last_k = None
+
+    def capture(self, simulator, k: int, x_k: np.ndarray, u_k: np.ndarray) -> Checkpoint:
+        """Capture the state of a simulation at timestep k."""
+        controller = simulator.controller
+        get_state = getattr(controller, "get_state", None)
+        return Checkpoint(k=k,
+                          x_k=np.array(x_k),
+                          u_k=np.array(u_k),
+                          controller_state=get_state() if get_state is not None else {},
+                          integrator_state=simulator.model.integrator.get_state(),
+                          rng_states={name: rng.bit_generator.state
+                                      for name, rng in self.rngs.items()},
+                          model=type(simulator.model).__name__)
+
+    def restart(self, k: int):
+        """Restart the checkpoint interval from timestep k, e.g., on resume."""
+        self._last_k = k
+        self._last_time = self._clock()
+
+    def due(self, k: int) -> bool:
+        """Return whether a checkpoint should be written at timestep k."""
+        if self._last_k is None:
+            self._last_k = k
+        if self.every_steps is not None and k - self._last_k >= self.every_steps:
+            return True
+        return self.every_seconds is not None and \
+            self._clock() - self._last_time >= self.every_seconds
+
+    def save(self, simulator, k: int, x_k: np.ndarray, u_k: np.ndarray, sink: Any = None):
+        """Flush the sink and write a checkpoint of timestep k."""
+        flush = getattr(sink, "flush", None)
+        if flush is not None:
+            flush()
+        save_checkpoint(self.path, self.capture(simulator, k, x_k, u_k))
+        self.restart(k)
+
+
+def restore(simulator, checkpoint: Checkpoint, checkpointer: Optional[Checkpointer] = None):
+    """Restore the controller and integrator states of a checkpoint into a
+    simulator and, if a checkpointer is given, the states of its random
+    generators. The state itself is picked up by
+    Simulator.stream(resume=checkpoint), which calls this.
+    """
+    if checkpoint.model != type(simulator.model).__name__:
+        raise ValueError(f"Checkpoint is of a {checkpoint.model}, not a "
+                         f"{type(simulator.model).__name__}")
+    if checkpoint.controller_state:
+        simulator.controller.set_state(checkpoint.controller_state)
+    simulator.model.integrator.set_state(checkpoint.integrator_state)
+    if checkpointer is not None:
+        for name, state in checkpoint.rng_states.items():
+            checkpointer.rngs[name].bit_generator.state = state
+        checkpointer.restart(checkpoint.k)
+
+
+class _ListSink:
+    """Trajectory sink keeping copies of every timestep in memory."""
+
+    def __init__(self):
+        self.states = []
+        self.controls = []
+
+    def append(self, x_k: np.ndarray, u_k: Optional[np.ndarray] = None):
+        self.states.append(np.array(x_k))
+        self.controls.append(np.array(u_k))
+
+
+def replay(simulator,
+           checkpoint: Checkpoint,
+           checkpointer: Optional[Checkpointer] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Deterministically re-run a simulation from a checkpoint to the end of
+    its horizon, e.g., to reproduce or verify part of a recorded trajectory.
+    Given the same model, controller and checkpoint, the replayed states and
+    controls are bit-identical to those of the original run.
+
+    Args:
+        simulator (Simulator): A simulator set up like the original one. Its
+        controller and integrator states are overwritten.
+        checkpoint (Checkpoint): The checkpoint to replay from.
+        checkpointer (Optional[Checkpointer], optional): Owner of the extra
+        random generators saved in the checkpoint. Nothing is saved during
+        the replay. Defaults to None.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The states and controls of timesteps
+        checkpoint.k through T - 1.
+    """
+    sink = _ListSink()
+    sink.append(checkpoint.x_k, checkpoint.u_k)
+    # Only restore the random generators here, so that stream does not save
+    # checkpoints of the replay.
+    restore(simulator, checkpoint, checkpointer)
+    simulator.stream(sink, resume=checkpoint)
+    return np.stack(sink.states), np.stack(sink.controls)
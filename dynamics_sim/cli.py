@@ -0,0 +1,163 @@
+"""Headless command line entry point that runs a simulation scenario from a
+config file and only writes data. Nothing here imports plotly, meshcat or any
+other visualization dependency, so short batch jobs start quickly.
+
+Run with:
+    python -m dynamics_sim.cli scenario.json [--output DIR] [--horizon T]
+
+A scenario is a JSON object (or YAML, if PyYAML is installed):
+    {
+        "model": "BoxDynamics",
+        "params": {"dt": 0.01, "surface_friction_coef": 0.5},
+        "x_0": [0.0, 0.0, 0.0, 0.0],
+        "horizon": 250,
+        "controls": [{"until": 99, "u": [10.0, 0.0]}, {"u": [0.0, 0.0]}],
+        "stop_when": [{"state": "vx (m/s)", "value": 0.0, "direction": -1}],
+        "output": "runs/box_push",
+        "metadata": {"campaign": "friction"}
+    }
+
+model is the name of a built-in model or a "package.module:Class" path, and
+params are its constructor arguments. x_0 may be one state or a list of
+states for a batch. controls is a piecewise-constant schedule, each entry
+applying u until (excluding) timestep until, or to the end if until is
+omitted. stop_when optionally lists terminal events on single state
+components, given by label (see the model's state_layout). The trajectory is
+written with TrajectoryWriter (see dynamics_sim.trajectory_io).
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+import numpy as np
+
+from dynamics_sim.controllers.controller import OpenLoopController
+from dynamics_sim.events import Event
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.simulator import Simulator
+from dynamics_sim.trajectory_io import TrajectoryWriter
+
+# Built-in models, by name.
+MODELS = {
+    "BoxDynamics": "dynamics_sim.models.box_dynamics:BoxDynamics",
+    "GravityDynamics": "dynamics_sim.models.gravity_dynamics:GravityDynamics",
+}
+
+def load_config(path: str) -> Dict[str, Any]:
+    """Load a scenario config from a JSON or YAML file."""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("YAML scenarios require PyYAML: pip install pyyaml") from e
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def model_class(name: str) -> Type[DynamicsModel]:
+    """Resolve a built-in model name or a "package.module:Class" path."""
+    path = MODELS.get(name, name)
+    if ":" not in path:
+        raise ValueError(f"Unknown model '{name}'. Use one of {sorted(MODELS)} or a "
+                         f"'package.module:Class' path")
+    module, cls = path.split(":")
+    return getattr(importlib.import_module(module), cls)
+
+def control_tape(schedule: Sequence[Dict[str, Any]], horizon: int) -> np.ndarray:
+    """Expand a piecewise-constant control schedule into (T, m) controls.
+
+    Args:
+        schedule (Sequence[Dict[str, Any]]): Entries of {"u": [...], "until":
+        k}, in order. The last entry may omit until.
+        horizon (int): Number of timesteps T.
+
+    Returns:
+        np.ndarray: The (T, m) controls.
+    """
+    if not schedule:
+        raise ValueError("The control schedule is empty")
+    tape = np.empty((horizon, len(schedule[0]["u"])))
+    start = 0
+    for entry in schedule:
+        stop = min(entry.get("until", horizon), horizon)
+        tape[start:stop] = entry["u"]
+        start = max(start, stop)
+    # Hold the last control if the schedule ends early.
+    tape[start:] = schedule[-1]["u"]
+    return tape
+
+def stop_events(model: DynamicsModel, stop_when: Sequence[Dict[str, Any]]) -> List[Event]:
+    """Build terminal events from stop_when entries of {"state": label,
+    "value": threshold, "direction": -1, 0 or 1}.
+    """
+    labels = model.state_layout.labels if model.state_layout is not None else []
+    events = []
+    for entry in stop_when:
+        if entry["state"] not in labels:
+            raise ValueError(f"Unknown state '{entry['state']}'. Available states: {labels}")
+        i = labels.index(entry["state"])
+        value = float(entry.get("value", 0.0))
+        events.append(Event(lambda x, i=i, value=value: x[..., i] - value,
+                            direction=entry.get("direction", 0), name=entry["state"]))
+    return events
+
+def run(config: Dict[str, Any], output: Optional[str] = None) -> str:
+    """Run a scenario and write its trajectory.
+
+    Args:
+        config (Dict[str, Any]): The scenario (see the module docstring).
+        output (Optional[str], optional): Output directory, overriding the
+        config's. Defaults to None.
+
+    Returns:
+        str: The directory the trajectory was written to.
+    """
+    output = output or config.get("output")
+    if output is None:
+        raise ValueError("No output directory given in the config or on the command line")
+    model = model_class(config["model"])(**config.get("params", {}))
+    x_0 = np.asarray(config["x_0"], dtype=float)
+    horizon = int(config["horizon"])
+    controller = OpenLoopController(control_tape(config["controls"], horizon))
+    simulator = Simulator(model, controller, x_0, horizon)
+    metadata = {"scenario": config, **config.get("metadata", {})}
+
+    if not config.get("stop_when"):
+        with TrajectoryWriter(output, model=model, metadata=metadata) as writer:
+            simulator.stream(writer)
+        return output
+
+    result = simulator.simulate_until(stop_events(model, config["stop_when"]))
+    metadata.update(num_steps=result.num_steps.tolist(),
+                    t_event=[None if np.isnan(t) else float(t) for t in result.t_event])
+    # Single runs are truncated at their terminal event. Batches keep the
+    # longest run's length, with finished runs held at their final state.
+    num_steps = result.num_steps.max()
+    with TrajectoryWriter(output, model=model, metadata=metadata) as writer:
+        writer.extend(result.states[:num_steps], result.controls[:num_steps])
+    return output
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", help="Path of the scenario config (JSON or YAML).")
+    parser.add_argument("--output", help="Output directory, overriding the config's.")
+    parser.add_argument("--horizon", type=int, help="Number of timesteps, overriding the config's.")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.scenario)
+    if args.horizon is not None:
+        config["horizon"] = args.horizon
+    start = time.perf_counter()
+    output = run(config, args.output)
+    print(f"Wrote {config['horizon']} timesteps of {config['model']} to "
+          f"{os.path.abspath(output)} in {time.perf_counter() - start:.3f} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""Propagation of large constellations of point-mass satellites, and screening
+them for conjunctions (close approaches).
+
+GravityDynamics carries a full 13-dimensional attitude state per satellite in
+an (N, 13) array, i.e., an array of structures. For thousands of objects whose
+attitude does not matter, Constellation instead keeps the positions and
+velocities as a structure of arrays: one contiguous (N,) row per component,
+so every operation of the two-body (and optionally J2) acceleration streams
+through memory once with unit stride.
+
+ConjunctionScreener finds all pairs of objects closer than a threshold by
+hashing the positions into a uniform grid of cubic cells as large as the
+threshold. Only objects in the same or adjacent cells can be close, so the
+cost grows with N (plus the number of close pairs) rather than with N^2. The
+grid is kept as a sort of the objects by cell, which is re-sorted from the
+previous step's order every step. As objects only move to neighboring cells
+between steps, that order is almost sorted, and the (adaptive) stable sort
+finishes in close to linear time.
+
+Example:
+    constellation = Constellation.from_states(x_0, j2=True)
+    screener = ConjunctionScreener(threshold=5e3)
+    for k in range(num_steps):
+        constellation.step(dt)
+        pairs, distances = screener.screen(constellation.r)
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Earth's second zonal harmonic and the equatorial radius it is defined with.
+J2_EARTH = 1.08262668e-3
+R_EARTH_EQUATORIAL = 6378.137e3
+
+# Cell offsets of the half neighborhood of a cell. Together with the pairs
+# within each cell, visiting these from every cell visits every pair of
+# adjacent cells exactly once.
+_HALF_NEIGHBORHOOD = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                               for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)])
+
+# Bits per axis of the packed cell keys.
+_KEY_BITS = 21
+
+
+class Constellation:
+    """N point-mass satellites in Earth orbit, stored as a structure of
+    arrays and propagated together.
+
+    Attributes:
+        x (np.ndarray): The (6, N) state, rows [r_x, r_y, r_z, v_x, v_y, v_z]
+        in the Earth Centered Inertial (ECI) frame.
+        r (np.ndarray): The (3, N) positions, a view of x.
+        v (np.ndarray): The (3, N) velocities, a view of x.
+
+    NOTE: The velocity Verlet integrator reuses the accelerations computed at
+    the end of the previous step. Call invalidate after changing r directly.
+    """
+
+    def __init__(self,
+                 r: np.ndarray,
+                 v: np.ndarray,
+                 mu: float = 3.986e14,
+                 R: float = R_EARTH_EQUATORIAL,
+                 j2: bool = False,
+                 integrator: str = "velocity_verlet"):
+        """Initialize the constellation.
+
+        Args:
+            r (np.ndarray): The (3, N) positions in meters.
+            v (np.ndarray): The (3, N) velocities in m/s.
+            mu (float, optional): Gravitational parameter of the Earth in
+            m^3/s^2. Defaults to 3.986e14.
+            R (float, optional): Equatorial radius of the Earth in meters, used
+            by the J2 term. Defaults to R_EARTH_EQUATORIAL.
+            j2 (bool, optional): Include the J2 (oblateness) perturbation.
+            Defaults to False.
+            integrator (str, optional): "velocity_verlet" (symplectic, one
+            acceleration evaluation per step) or "rk4". Defaults to
+            "velocity_verlet".
+        """
+        if integrator not in ("velocity_verlet", "rk4"):
+            raise ValueError(f"Unknown constellation integrator '{integrator}'")
+        r = np.asarray(r, dtype=float)
+        if r.ndim != 2 or r.shape[0] != 3 or np.shape(v) != r.shape:
+            raise ValueError(f"Expected (3, N) positions and velocities, got {r.shape} "
+                             f"and {np.shape(v)}")
+        self.x = np.empty((6, r.shape[1]))
+        self.r = self.x[:3]
+        self.v = self.x[3:]
+        self.r[...] = r
+        self.v[...] = v
+        self.mu = mu
+        self.R = R
+        self.j2 = j2
+        self.integrator = integrator
+        self.t = 0.0
+
+        # Scratch rows reused by every acceleration evaluation and step.
+        n = self.num_objects
+        self._a = np.empty((3, n))
+        self._tmp = np.empty((3, n))
+        self._rows = np.empty((4, n))
+        self._a_valid = False
+
+    @classmethod
+    def from_states(cls, x: np.ndarray, **kwargs) -> "Constellation":
+        """Build a constellation from (N, 6) [r_N, v_N] or (N, 13)
+        GravityDynamics states (whose attitude is dropped).
+
+        Args:
+            x (np.ndarray): The (N, 6) or (N, 13) states.
+            **kwargs: Passed on to the constructor.
+
+        Returns:
+            Constellation: The constellation.
+        """
+        x = np.asarray(x, dtype=float)
+        if x.shape[-1] == 13:
+            return cls(x[:, 0:3].T, x[:, 7:10].T, **kwargs)
+        if x.shape[-1] == 6:
+            return cls(x[:, 0:3].T, x[:, 3:6].T, **kwargs)
+        raise ValueError(f"Expected (N, 6) or (N, 13) states, got {x.shape}")
+
+    @property
+    def num_objects(self) -> int:
+        return self.x.shape[1]
+
+    def states(self) -> np.ndarray:
+        """Return a copy of the state as (N, 6) [r_N, v_N] rows."""
+        return self.x.T.copy()
+
+    def acceleration(self, r: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute the gravitational acceleration at (3, N) positions r.
+
+        Args:
+            r (np.ndarray): The (3, N) positions.
+            out (Optional[np.ndarray], optional): Array to write the (3, N)
+            accelerations into. Defaults to None.
+
+        Returns:
+            np.ndarray: The (3, N) accelerations.
+        """
+        if out is None:
+            out = np.empty(r.shape)
+        r2, scale, tmp, factor_z = self._rows
+        # r2 = |r|^2, summed row by row so every operation is a contiguous
+        # (N,) pass.
+        np.multiply(r[0], r[0], out=r2)
+        np.multiply(r[1], r[1], out=tmp)
+        r2 += tmp
+        np.multiply(r[2], r[2], out=tmp)
+        r2 += tmp
+        # scale = -mu / |r|^3
+        np.sqrt(r2, out=scale)
+        scale *= r2
+        np.divide(-self.mu, scale, out=scale)
+
+        if not self.j2:
+            np.multiply(r, scale, out=out)
+            return out
+
+        # J2 perturbation, with z2 = (z / |r|)^2 and c = 1.5 J2 (R / |r|)^2:
+        #   a_xy = -mu r_xy / |r|^3 (1 - c (5 z2 - 1))
+        #   a_z  = -mu z / |r|^3 (1 - c (5 z2 - 3))
+        np.multiply(r[2], r[2], out=tmp)
+        tmp /= r2
+        np.divide(1.5 * J2_EARTH * self.R**2, r2, out=r2)
+        # The factors of z, then of x and y, reusing the r2 and tmp rows.
+        tmp *= 5.0
+        np.subtract(tmp, 3.0, out=factor_z)
+        factor_z *= r2
+        np.subtract(1.0, factor_z, out=factor_z)
+        factor_z *= scale
+        tmp -= 1.0
+        tmp *= r2
+        np.subtract(1.0, tmp, out=tmp)
+        tmp *= scale
+        np.multiply(r[0], tmp, out=out[0])
+        np.multiply(r[1], tmp, out=out[1])
+        np.multiply(r[2], factor_z, out=out[2])
+        return out
+
+    def invalidate(self):
+        """Discard the accelerations cached between steps."""
+        self._a_valid = False
+
+    def x_dot(self, x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute the (6, N) time derivative of a (6, N) state."""
+        if out is None:
+            out = np.empty(x.shape)
+        out[:3] = x[3:]
+        self.acceleration(x[:3], out=out[3:])
+        return out
+
+    def step(self, dt: float):
+        """Advance all objects by dt seconds in place."""
+        if self.integrator == "velocity_verlet":
+            self._verlet_step(dt)
+        else:
+            self._rk4_step(dt)
+        self.t += dt
+
+    def propagate(self, dt: float, num_steps: int):
+        """Advance all objects by num_steps steps of dt seconds in place."""
+        for _ in range(num_steps):
+            self.step(dt)
+
+    def _verlet_step(self, dt: float):
+        a, tmp = self._a, self._tmp
+        if not self._a_valid:
+            self.acceleration(self.r, out=a)
+        # Half kick, drift, and a half kick with the new accelerations, which
+        # are kept for the first half kick of the next step.
+        np.multiply(a, 0.5 * dt, out=tmp)
+        self.v += tmp
+        np.multiply(self.v, dt, out=tmp)
+        self.r += tmp
+        self.acceleration(self.r, out=a)
+        np.multiply(a, 0.5 * dt, out=tmp)
+        self.v += tmp
+        self._a_valid = True
+
+    def _rk4_step(self, dt: float):
+        x = self.x
+        buffers = getattr(self, "_rk4_buffers", None)
+        if buffers is None:
+            buffers = self._rk4_buffers = [np.empty_like(x) for _ in range(3)]
+        k, stage, acc = buffers
+        self.x_dot(x, out=k)
+        np.multiply(k, dt / 6, out=acc)
+        for weight, c in ((2.0, 0.5), (2.0, 0.5), (1.0, 1.0)):
+            np.multiply(k, c * dt, out=stage)
+            stage += x
+            self.x_dot(stage, out=k)
+            np.multiply(k, weight * dt / 6, out=stage)
+            acc += stage
+        x += acc
+        self._a_valid = False
+
+
+class ConjunctionScreener:
+    """Finds the pairs of objects closer than a threshold with a uniform
+    spatial hash grid, re-sorted incrementally between calls.
+
+    NOTE: Screening looks at the positions at one instant. To catch close
+    approaches in between steps, pad the threshold by the distance two
+    objects can close in one step (e.g., 2 * 8 km/s * dt in LEO), and refine
+    the returned candidates.
+    """
+
+    def __init__(self, threshold: float, cell_size: Optional[float] = None):
+        """Initialize the screener.
+
+        Args:
+            threshold (float): Report pairs closer than this distance, in
+            meters.
+            cell_size (Optional[float], optional): Edge length of the grid
+            cells. Must be at least threshold. Defaults to None (threshold).
+        """
+        cell_size = threshold if cell_size is None else cell_size
+        if cell_size < threshold:
+            raise ValueError(f"The cell size {cell_size} is smaller than the threshold {threshold}")
+        self.threshold = threshold
+        self.cell_size = cell_size
+        self._order: Optional[np.ndarray] = None
+
+    def _cell_keys(self, r: np.ndarray) -> np.ndarray:
+        """Pack the cell indices of (3, N) positions into int64 keys."""
+        cells = np.floor(r / self.cell_size).astype(np.int64)
+        # Start the grid one cell below the lowest object, so that neighbor
+        # keys never underflow into the next axis.
+        cells -= cells.min(axis=1, keepdims=True) - 1
+        if cells.max() >= (1 << _KEY_BITS) - 1:
+            raise ValueError("The objects span too many cells; increase cell_size")
+        return (cells[0] << 2 * _KEY_BITS) | (cells[1] << _KEY_BITS) | cells[2]
+
+    def _sort(self, keys: np.ndarray) -> np.ndarray:
+        """Return the order sorting keys, starting from the previous order."""
+        order = self._order
+        if order is None or len(order) != len(keys):
+            order = np.argsort(keys, kind="stable")
+        else:
+            order = order[np.argsort(keys[order], kind="stable")]
+        self._order = order
+        return order
+
+    def reset(self):
+        """Forget the previous order, e.g., when screening a different set of
+        objects of the same size.
+        """
+        self._order = None
+
+    def candidates(self, r: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Find all pairs of objects in the same or adjacent cells.
+
+        Args:
+            r (np.ndarray): The (3, N) positions.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (P,) indices i and j of the
+            candidate pairs.
+        """
+        keys = self._cell_keys(r)
+        order = self._sort(keys)
+        sorted_keys = keys[order]
+        # Cells holding at least one object, with the start (into order) and
+        # number of their objects.
+        is_start = np.empty(len(sorted_keys), dtype=bool)
+        is_start[:1] = True
+        np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=is_start[1:])
+        starts = np.flatnonzero(is_start)
+        cell_keys = sorted_keys[starts]
+        counts = np.diff(np.append(starts, len(sorted_keys)))
+
+        first, second = [], []
+        # Pairs within a cell, i < j.
+        crowded = counts > 1
+        if np.any(crowded):
+            i, j = _block_pairs(starts[crowded], counts[crowded], starts[crowded], counts[crowded])
+            upper = i < j
+            first.append(i[upper])
+            second.append(j[upper])
+        # Pairs between a cell and each of its occupied half neighbors.
+        strides = np.array([1 << 2 * _KEY_BITS, 1 << _KEY_BITS, 1], dtype=np.int64)
+        for offset in _HALF_NEIGHBORHOOD @ strides:
+            neighbor_keys = cell_keys + offset
+            k = np.searchsorted(cell_keys, neighbor_keys)
+            k[k == len(cell_keys)] = 0
+            found = np.flatnonzero(cell_keys[k] == neighbor_keys)
+            if len(found):
+                i, j = _block_pairs(starts[found], counts[found],
+                                    starts[k[found]], counts[k[found]])
+                first.append(i)
+                second.append(j)
+
+        if not first:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        i = order[np.concatenate(first)]
+        j = order[np.concatenate(second)]
+        return np.minimum(i, j), np.maximum(i, j)
+
+    def screen(self, r: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Find all pairs of objects closer than the threshold.
+
+        Args:
+            r (np.ndarray): The (3, N) positions.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (P, 2) object indices (i < j)
+            of the close pairs, sorted, and their (P,) distances.
+        """
+        i, j = self.candidates(r)
+        d = r[:, i] - r[:, j]
+        distances = np.sqrt(np.einsum("ij,ij->j", d, d))
+        close = distances < self.threshold
+        pairs = np.stack([i[close], j[close]], axis=-1)
+        distances = distances[close]
+        sort = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        return pairs[sort], distances[sort]
+
+
+def _block_pairs(starts_a: np.ndarray,
+                 counts_a: np.ndarray,
+                 starts_b: np.ndarray,
+                 counts_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Enumerate every (a, b) pair of the blocks [starts_a, starts_a +
+    counts_a) x [starts_b, starts_b + counts_b), without a Python loop over
+    the blocks.
+    """
+    sizes = counts_a * counts_b
+    block = np.repeat(np.arange(len(sizes)), sizes)
+    # Position of every pair within its block.
+    t = np.arange(len(block)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return starts_a[block] + t // counts_b[block], starts_b[block] + t % counts_b[block]
@@ -0,0 +1,67 @@
+"""Module containing a controller base class"""
+
+import numpy as np
+
+class Controller:
+    """Base class for controllers.
+
+    A controller maps the current state x_k (a single (n,) state or an
+    (N, n) batch of states) and the timestep index k to the control input to
+    command. Controllers are callable, so they can be passed to a Simulator
+    anywhere a plain controller function can.
+    """
+
+    def policy(self, x_k: np.ndarray, k: int) -> np.ndarray:
+        """Returns the control input to command at timestep k. This is to be
+        implemented by each specific controller subclass.
+
+        Args:
+            x_k (np.ndarray): The (n,) state, or an (N, n) batch of states.
+            k (int): The timestep index.
+
+        Returns:
+            np.ndarray: The (m,) control input, or an (N, m) batch of them.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Reset any internal state (e.g., warm starts) before a new run."""
+
+    def select_runs(self, index: np.ndarray):
+        """Keep only the internal state (e.g., warm starts) of the runs at
+        index of the current (N, n) batch, which are the only runs the
+        controller is called with from now on. Called by
+        Simulator.simulate_until as runs terminate. Stateless controllers do
+        not need to implement this.
+        """
+
+    def get_state(self) -> dict:
+        """Return the controller's internal state (e.g., warm starts and
+        random generator states) so that a run can be checkpointed and
+        resumed bit-identically. Stateless controllers return {}.
+        """
+        return {}
+
+    def set_state(self, state: dict):
+        """Restore internal state returned by get_state."""
+
+    def __call__(self, x_k: np.ndarray, k: int) -> np.ndarray:
+        return self.policy(x_k, k)
+
+
+class OpenLoopController(Controller):
+    """Replays a fixed sequence of control inputs, holding the last one once
+    the sequence runs out.
+    """
+
+    def __init__(self, controls: np.ndarray):
+        """Initialize the controller.
+
+        Args:
+            controls (np.ndarray): (T, m) control inputs, one per timestep.
+        """
+        self.controls = np.asarray(controls)
+
+    def policy(self, x_k: np.ndarray, k: int) -> np.ndarray:
+        u_k = self.controls[min(k, len(self.controls) - 1)]
+        return np.broadcast_to(u_k, x_k.shape[:-1] + u_k.shape)
@@ -0,0 +1,144 @@
+"""Sampling-based model predictive control (MPPI) built on batched rollouts of
+a DynamicsModel.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+
+from dynamics_sim.controllers.controller import Controller
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+# Stage cost of a batch of states and controls at timestep k, returning one
+# cost per sample: (..., n), (..., m), k -> (...,).
+StageCostFn = Callable[[np.ndarray, np.ndarray, int], np.ndarray]
+# Terminal cost of a batch of states: (..., n) -> (...,).
+TerminalCostFn = Callable[[np.ndarray], np.ndarray]
+
+class MPPI(Controller):
+    """Model Predictive Path Integral controller.
+
+    At every control step, num_samples perturbations of the nominal control
+    sequence are rolled out through the model over the planning horizon. All
+    samples are stepped together in one batched x_k_1 call per horizon step,
+    so the cost of a control step is horizon model calls rather than
+    horizon * num_samples. The nominal sequence is then updated to the
+    exponentially cost-weighted average of the samples, its first control is
+    applied, and the rest is shifted forward to warm start the next step.
+
+    Batches of states are supported: each of the N environments in an (N, n)
+    batch keeps its own nominal sequence and its samples are rolled out in
+    the same batched call.
+    """
+
+    def __init__(self,
+                 model: DynamicsModel,
+                 cost: StageCostFn,
+                 horizon: int,
+                 noise_sigma: np.ndarray,
+                 num_samples: int = 1024,
+                 temperature: float = 1.0,
+                 terminal_cost: Optional[TerminalCostFn] = None,
+                 u_min: Optional[np.ndarray] = None,
+                 u_max: Optional[np.ndarray] = None,
+                 u_init: Optional[np.ndarray] = None,
+                 seed: Optional[int] = None):
+        """Initialize the controller.
+
+        Args:
+            model (DynamicsModel): The model used for the rollouts.
+            cost (StageCostFn): Batched stage cost.
+            horizon (int): Number of timesteps H planned over.
+            noise_sigma (np.ndarray): (m,) standard deviation of the control
+            perturbations.
+            num_samples (int, optional): Number of sampled control sequences
+            K. Defaults to 1024.
+            temperature (float, optional): Temperature lambda of the
+            exponential weighting. Lower values concentrate the weight on the
+            best samples. Defaults to 1.0.
+            terminal_cost (Optional[TerminalCostFn], optional): Batched cost of
+            the final rollout state. Defaults to None.
+            u_min (Optional[np.ndarray], optional): (m,) lower control limits.
+            Defaults to None.
+            u_max (Optional[np.ndarray], optional): (m,) upper control limits.
+            Defaults to None.
+            u_init (Optional[np.ndarray], optional): (m,) control used to
+            initialize (and extend) the nominal sequence. Defaults to zeros.
+            seed (Optional[int], optional): Seed of the sampling generator.
+            Defaults to None.
+        """
+        self.model = model
+        self.cost = cost
+        self.terminal_cost = terminal_cost
+        self.horizon = horizon
+        self.noise_sigma = np.asarray(noise_sigma, dtype=float)
+        self.num_samples = num_samples
+        self.temperature = temperature
+        self.u_min = u_min
+        self.u_max = u_max
+        self.u_init = np.zeros_like(self.noise_sigma) if u_init is None else np.asarray(u_init, dtype=float)
+        self.rng = np.random.default_rng(seed)
+        self.U = None
+
+    def reset(self):
+        self.U = None
+
+    def select_runs(self, index: np.ndarray):
+        # Keep the warm starts of the remaining environments.
+        if self.U is not None and self.U.ndim > 2:
+            self.U = self.U[index]
+
+    def get_state(self) -> dict:
+        return {"U": None if self.U is None else self.U.copy(),
+                "rng": self.rng.bit_generator.state}
+
+    def set_state(self, state: dict):
+        self.U = None if state["U"] is None else state["U"].copy()
+        self.rng.bit_generator.state = state["rng"]
+
+    def policy(self, x_k: np.ndarray, k: int) -> np.ndarray:
+        batch_shape = x_k.shape[:-1]
+        H, K = self.horizon, self.num_samples
+        m = self.noise_sigma.shape[-1]
+        if self.U is None or self.U.shape[:-2] != batch_shape:
+            self.U = np.broadcast_to(self.u_init, batch_shape + (H, m)).copy()
+
+        # (..., K, H, m) sampled control sequences around the nominal one.
+        V = self.U[..., None, :, :] + self.rng.standard_normal(batch_shape + (K, H, m)) * self.noise_sigma
+        if self.u_min is not None or self.u_max is not None:
+            np.clip(V, self.u_min, self.u_max, out=V)
+
+        # Roll every sample out together, stepping the (..., K, n) batch in
+        # place. The batch keeps the dtype of x_k, so that the rollouts of a
+        # reduced precision model (see dynamics_sim.precision) are not upcast.
+        x = np.array(np.broadcast_to(x_k[..., None, :], batch_shape + (K, x_k.shape[-1])),
+                     dtype=np.result_type(x_k, 1.0))
+        costs = np.zeros(batch_shape + (K,))
+        for t in range(H):
+            u_t = V[..., t, :]
+            costs += self.cost(x, u_t, k + t)
+            self.model.x_k_1(x, u_t, out=x)
+        if self.terminal_cost is not None:
+            costs += self.terminal_cost(x)
+        # Samples that diverged get no weight.
+        costs = np.where(np.isfinite(costs), costs, np.inf)
+
+        # Exponentially weighted average of the samples, shifting by the
+        # minimum cost for numerical stability.
+        beta = np.min(costs, axis=-1, keepdims=True)
+        # If every sample of an environment diverged there is nothing to
+        # weight, so that environment keeps its warm-started plan instead of
+        # a NaN average that would poison every later step.
+        diverged = ~np.isfinite(beta)
+        beta = np.where(diverged, 0.0, beta)
+        weights = np.exp(-(costs - beta) / self.temperature)
+        weights = np.where(diverged, 1.0, weights)
+        weights /= np.sum(weights, axis=-1, keepdims=True)
+        self.U = np.where(diverged[..., None], self.U,
+                          np.einsum("...k,...khm->...hm", weights, V))
+
+        u_k = self.U[..., 0, :].copy()
+        # Warm start the next step by shifting the plan forward one timestep.
+        self.U[..., :-1, :] = self.U[..., 1:, :]
+        self.U[..., -1, :] = self.u_init
+        return u_k
@@ -0,0 +1,215 @@
+"""Event functions that are monitored while a simulation runs, e.g., a
+velocity changing sign, a satellite reentering, or a state diverging.
+
+An event is a scalar function g(x) of the state whose sign change marks the
+event. After every step, g is evaluated at the new states; for the runs where
+it changed sign, the crossing is located within the step by root-finding on a
+cubic Hermite interpolant of the step (built from the states and derivatives at
+both ends), so event times are resolved far more finely than the timestep
+without re-integrating. See Simulator.simulate_until.
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+# Maps a batch of states (..., n) to the event values (...,).
+EventFn = Callable[[np.ndarray], np.ndarray]
+
+class Event:
+    """An event g(x) = 0 monitored during a simulation."""
+
+    def __init__(self,
+                 fn: EventFn,
+                 terminal: bool = True,
+                 direction: int = 0,
+                 name: Optional[str] = None):
+        """Initialize the event.
+
+        Args:
+            fn (EventFn): Batched event function g(x).
+            terminal (bool, optional): Whether a run stops at the event.
+            Defaults to True.
+            direction (int, optional): Only count crossings where g goes from
+            negative to positive (1), positive to negative (-1), or either (0).
+            Defaults to 0.
+            name (Optional[str], optional): Name used when reporting the
+            event. Defaults to None (the function's name).
+        """
+        if direction not in (-1, 0, 1):
+            raise ValueError(f"direction must be -1, 0 or 1, got {direction}")
+        self.fn = fn
+        self.terminal = terminal
+        self.direction = direction
+        self.name = getattr(fn, "__name__", "event") if name is None else name
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return self.fn(x)
+
+    def crossed(self, g_0: np.ndarray, g_1: np.ndarray) -> np.ndarray:
+        """Return which runs crossed the event between values g_0 and g_1."""
+        rising = (g_0 < 0) & (g_1 >= 0)
+        falling = (g_0 > 0) & (g_1 <= 0)
+        if self.direction > 0:
+            return rising
+        if self.direction < 0:
+            return falling
+        return rising | falling
+
+
+def reentry(model: DynamicsModel, altitude: float = 0.0, terminal: bool = True) -> Event:
+    """Event triggered when a GravityDynamics-like model's position r_N drops
+    below altitude above its radius R.
+    """
+    view = model.state_layout.view
+    def reentry(x: np.ndarray) -> np.ndarray:
+        return np.linalg.norm(view(x, "r_N"), axis=-1) - (model.R + altitude)
+    return Event(reentry, terminal=terminal, direction=-1)
+
+def diverged(limit: float = 1e12, terminal: bool = True) -> Event:
+    """Event triggered when any state component exceeds limit in magnitude or
+    becomes NaN or infinite.
+    """
+    def diverged(x: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            margin = limit - np.max(np.abs(x), axis=-1)
+        return np.where(np.isfinite(margin), margin, -1.0)
+    return Event(diverged, terminal=terminal, direction=-1)
+
+
+def hermite(x_0: np.ndarray,
+            f_0: np.ndarray,
+            x_1: np.ndarray,
+            f_1: np.ndarray,
+            h: float,
+            s: np.ndarray) -> np.ndarray:
+    """Evaluate the cubic Hermite interpolant of a step of length h at the
+    fractions s in [0, 1] of the step.
+
+    Args:
+        x_0 (np.ndarray): (B, n) states at the start of the step.
+        f_0 (np.ndarray): (B, n) derivatives at the start of the step.
+        x_1 (np.ndarray): (B, n) states at the end of the step.
+        f_1 (np.ndarray): (B, n) derivatives at the end of the step.
+        h (float): The step length.
+        s (np.ndarray): (B,) fractions of the step.
+
+    Returns:
+        np.ndarray: The (B, n) interpolated states.
+    """
+    s = s[..., None]
+    s2 = s * s
+    s3 = s2 * s
+    return ((2 * s3 - 3 * s2 + 1) * x_0 + (s3 - 2 * s2 + s) * h * f_0
+            + (3 * s2 - 2 * s3) * x_1 + (s3 - s2) * h * f_1)
+
+def locate(event: Event,
+           model: DynamicsModel,
+           x_0: np.ndarray,
+           x_1: np.ndarray,
+           u: np.ndarray,
+           g_0: np.ndarray,
+           g_1: np.ndarray,
+           t_tol: float = 1e-9,
+           max_iter: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """Locate the event crossings of a batch of steps of length model.dt.
+
+    The roots are found with the Illinois variant of regula falsi on the
+    step's Hermite interpolant, all runs at once. Only two extra x_dot_k_1
+    evaluations are made, regardless of the number of iterations.
+
+    Args:
+        event (Event): The event that crossed in every run.
+        model (DynamicsModel): The simulated model.
+        x_0 (np.ndarray): (B, n) states at the start of the step.
+        x_1 (np.ndarray): (B, n) states at the end of the step.
+        u (np.ndarray): (B, m) controls applied during the step.
+        g_0 (np.ndarray): (B,) event values at x_0.
+        g_1 (np.ndarray): (B,) event values at x_1.
+        t_tol (float, optional): Time tolerance. Defaults to 1e-9.
+        max_iter (int, optional): Maximum number of iterations. Defaults to 50.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (B,) times of the crossings within
+        the step, and the (B, n) states at the crossings.
+    """
+    h = model.dt
+    f_0 = model.x_dot_k_1(x_0, u)
+    f_1 = model.x_dot_k_1(x_1, u)
+    # Steps that ended on non-finite states cannot be interpolated, so their
+    # events are reported at the end of the step.
+    finite = np.all(np.isfinite(x_1) & np.isfinite(f_1), axis=-1)
+
+    lo = np.zeros(len(x_0))
+    hi = np.ones(len(x_0))
+    g_lo = g_0.astype(float)
+    g_hi = g_1.astype(float)
+    last_side = np.zeros(len(x_0), dtype=int)
+    s_tol = t_tol / h
+    for _ in range(max_iter):
+        active = finite & (hi - lo > s_tol) & (g_hi != 0)
+        if not np.any(active):
+            break
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = hi - g_hi * (hi - lo) / (g_hi - g_lo)
+        bad = ~np.isfinite(s) | (s <= lo) | (s >= hi)
+        s = np.where(bad, 0.5 * (lo + hi), s)
+        g = event(hermite(x_0, f_0, x_1, f_1, h, s))
+
+        # The crossing lies in [s, hi] if g has the same sign as g_lo.
+        right = active & (np.sign(g) == np.sign(g_lo))
+        left = active & ~right
+        # Illinois modification: halve the value at the end that was kept
+        # twice in a row so that the interval keeps shrinking from both sides.
+        g_hi = np.where(right & (last_side == 1), 0.5 * g_hi, g_hi)
+        g_lo = np.where(left & (last_side == -1), 0.5 * g_lo, g_lo)
+        lo = np.where(right, s, lo)
+        g_lo = np.where(right, g, g_lo)
+        hi = np.where(left, s, hi)
+        g_hi = np.where(left, g, g_hi)
+        last_side = np.where(right, 1, np.where(left, -1, last_side))
+
+    # Report the crossing at the end of the final bracket, where the event
+    # has already occurred.
+    x_event = np.where(finite[:, None], hermite(x_0, f_0, x_1, f_1, h, hi), x_1)
+    return hi * h, x_event
+
+
+class EventResult:
+    """Result of Simulator.simulate_until.
+
+    Attributes:
+        states (np.ndarray): (T, N, n) states. Once a run terminates, its
+        state at the terminal event is held for the rest of the horizon.
+        controls (np.ndarray): (T, N, m) controls, held like the states.
+        num_steps (np.ndarray): (N,) number of valid timesteps of each run.
+        The last one is the terminal event state, at time t_event.
+        t_event (np.ndarray): (N,) time of each run's terminal event, NaN if
+        it ran to the end of the horizon.
+        event_index (np.ndarray): (N,) index of each run's terminal event, -1
+        if none.
+        occurrences (List[Tuple[int, int, float, np.ndarray]]): Every located
+        event (terminal or not) as (run, event index, time, state), in the
+        order they were detected.
+    """
+
+    def __init__(self,
+                 states: np.ndarray,
+                 controls: np.ndarray,
+                 num_steps: np.ndarray,
+                 t_event: np.ndarray,
+                 event_index: np.ndarray,
+                 occurrences: List[Tuple[int, int, float, np.ndarray]]):
+        self.states = states
+        self.controls = controls
+        self.num_steps = num_steps
+        self.t_event = t_event
+        self.event_index = event_index
+        self.occurrences = occurrences
+
+    @property
+    def terminated(self) -> np.ndarray:
+        """(N,) whether each run stopped at a terminal event."""
+        return self.event_index >= 0
@@ -0,0 +1,381 @@
+"""Batched system identification: fitting model parameters to logged
+trajectories with multiple shooting.
+
+The logs are cut into short segments of segment_length steps. Every segment
+is simulated from its own initial (shooting node) state, so that errors in
+the parameters cannot compound over the whole log the way they do in a single
+long simulation, which keeps the fit well conditioned. The residuals are the
+differences between the simulated and logged states along every segment.
+
+All segments, and all candidate parameter sets, are simulated together as one
+vectorized (candidates * segments, n) rollout of segment_length steps, with
+the parameters passed to the model as per-environment (B,) arrays (see
+dynamics_sim.sweep). The number of Python-level steps is therefore
+segment_length, however long the logs are. Parameter gradients come from
+finite differences (or complex steps) whose perturbed candidates are all
+evaluated in that same single rollout, and are supplied to
+scipy.optimize.least_squares as its Jacobian.
+
+Example:
+    identification = SystemIdentification(BoxDynamics, ["box_mass", "surface_friction_coef"],
+                                          states, controls, model_kwargs={"dt": 0.01})
+    result = identification.fit([1.0, 0.1], bounds=([0.1, 0.0], [10.0, 2.0]))
+    result.params  # {"box_mass": ..., "surface_friction_coef": ...}
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+GRADIENT_METHODS = ("central", "forward", "complex")
+
+def _import_scipy():
+    try:
+        import scipy.optimize
+        import scipy.sparse
+    except ImportError as e:
+        raise ImportError("System identification requires SciPy: pip install scipy") from e
+    return scipy
+
+
+class IdentificationResult:
+    """The outcome of SystemIdentification.fit.
+
+    Attributes:
+        params (Dict[str, float]): The fitted parameters, by name.
+        theta (np.ndarray): The fitted parameters, as a (p,) vector.
+        nodes (np.ndarray): The (S, n) shooting node states (the logged states
+        at the segment starts, unless they were estimated too).
+        cost (float): Half the sum of squared (scaled) residuals.
+        rms (float): Root mean square of the scaled state residuals.
+        covariance (np.ndarray): (p, p) covariance estimate of theta, from
+        the Jacobian at the solution.
+        result (scipy.optimize.OptimizeResult): The full least_squares result.
+    """
+
+    def __init__(self,
+                 params: Dict[str, float],
+                 theta: np.ndarray,
+                 nodes: np.ndarray,
+                 cost: float,
+                 rms: float,
+                 covariance: np.ndarray,
+                 result: Any):
+        self.params = params
+        self.theta = theta
+        self.nodes = nodes
+        self.cost = cost
+        self.rms = rms
+        self.covariance = covariance
+        self.result = result
+
+    @property
+    def success(self) -> bool:
+        return bool(self.result.success)
+
+
+class SystemIdentification:
+    """Multiple-shooting least squares fit of model parameters to logged
+    states and controls.
+    """
+
+    def __init__(self,
+                 model_cls: Type[DynamicsModel],
+                 param_names: Sequence[str],
+                 states: np.ndarray,
+                 controls: np.ndarray,
+                 segment_length: int = 50,
+                 model_kwargs: Optional[Dict[str, Any]] = None,
+                 scale: Optional[np.ndarray] = None,
+                 estimate_nodes: bool = False):
+        """Set up the identification problem.
+
+        Args:
+            model_cls (Type[DynamicsModel]): The model class. Its dynamics must
+            broadcast (B,) array-valued parameters over a batch.
+            param_names (Sequence[str]): Constructor arguments to fit.
+            states (np.ndarray): The logged (T, n) states, or (N, T, n) for N
+            logs of the same length.
+            controls (np.ndarray): The logged (T, m) or (N, T, m) controls,
+            where controls[k] was applied from states[k].
+            segment_length (int, optional): Steps per shooting segment. Steps
+            after the last whole segment are not used. Defaults to 50.
+            model_kwargs (Optional[Dict[str, Any]], optional): Fixed
+            constructor arguments, e.g., dt. Defaults to None.
+            scale (Optional[np.ndarray], optional): (n,) scale dividing the
+            residuals of each state component. Defaults to None (the standard
+            deviation of each component in the logs).
+            estimate_nodes (bool, optional): Also estimate the shooting node
+            states instead of taking them from the (noisy) logs. This adds n
+            unknowns per segment and makes the Jacobian sparse. Defaults to
+            False.
+        """
+        states = np.asarray(states, dtype=float)
+        controls = np.asarray(controls, dtype=float)
+        if states.ndim == 2:
+            states, controls = states[None], controls[None]
+        if states.shape[:2] != controls.shape[:2]:
+            raise ValueError(f"Got states of shape {states.shape} but controls of shape "
+                             f"{controls.shape}")
+        num_segments = (states.shape[1] - 1) // segment_length
+        if num_segments < 1:
+            raise ValueError(f"The logs are shorter than one segment of {segment_length} steps")
+
+        self.model_cls = model_cls
+        self.param_names = list(param_names)
+        self.model_kwargs = model_kwargs or {}
+        self.segment_length = segment_length
+        self.estimate_nodes = estimate_nodes
+
+        # (L + 1, S, n) logged states and (L, S, m) controls of every segment,
+        # with the segments of all logs side by side.
+        steps = np.arange(num_segments)[None, :] * segment_length \
+            + np.arange(segment_length + 1)[:, None]
+        segment_states = states[:, steps].transpose(1, 0, 2, 3)
+        segment_controls = controls[:, steps[:-1]].transpose(1, 0, 2, 3)
+        self.num_segments = states.shape[0] * num_segments
+        self.node_states = segment_states[0].reshape(self.num_segments, -1)
+        self._targets = segment_states[1:].reshape(segment_length, self.num_segments, -1)
+        self._controls = segment_controls.reshape(segment_length, self.num_segments, -1)
+
+        if scale is None:
+            scale = states.reshape(-1, states.shape[-1]).std(axis=0)
+            scale[scale == 0.0] = 1.0
+        self.scale = np.asarray(scale, dtype=float)
+
+    @property
+    def num_residuals(self) -> int:
+        S, n = self.node_states.shape
+        return S * n * (self.segment_length + self.estimate_nodes)
+
+    def _rollout(self, thetas: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Simulate every segment under every candidate in one batch.
+
+        Args:
+            thetas (np.ndarray): (P, p) candidate parameters.
+            nodes (np.ndarray): (P, S, n) segment initial states.
+
+        Returns:
+            np.ndarray: The (L, P, S, n) simulated states after every step.
+        """
+        P, S, n = nodes.shape
+        L = self.segment_length
+        kwargs = dict(self.model_kwargs)
+        for i, name in enumerate(self.param_names):
+            kwargs[name] = np.repeat(thetas[:, i], S)
+        model = self.model_cls(**kwargs)
+
+        dtype = np.result_type(thetas, nodes, float)
+        predicted = np.empty((L, P * S, n), dtype=dtype)
+        x = nodes.reshape(P * S, n).astype(dtype)
+        for t in range(L):
+            u = np.broadcast_to(self._controls[t], (P,) + self._controls[t].shape)
+            model.x_k_1(x, u.reshape(P * S, -1), out=predicted[t])
+            x = predicted[t]
+        return predicted.reshape(L, P, S, n)
+
+    def _residuals(self, thetas: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """(P, R) residuals of P candidates, ordered by segment, step and state
+        component, followed by the node residuals if the nodes are estimated.
+        """
+        predicted = self._rollout(thetas, nodes)
+        errors = (predicted - self._targets[:, None]) / self.scale
+        residuals = errors.transpose(1, 2, 0, 3).reshape(len(thetas), -1)
+        if self.estimate_nodes:
+            node_errors = (nodes - self.node_states) / self.scale
+            residuals = np.concatenate([residuals, node_errors.reshape(len(thetas), -1)], axis=1)
+        return residuals
+
+    def residuals(self,
+                  thetas: np.ndarray,
+                  nodes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Evaluate the residuals of one or many candidate parameter sets in a
+        single vectorized rollout.
+
+        Args:
+            thetas (np.ndarray): (p,) parameters or (P, p) candidates.
+            nodes (Optional[np.ndarray], optional): (S, n) or (P, S, n) node
+            states. Defaults to None (the logged states).
+
+        Returns:
+            np.ndarray: The (R,) or (P, R) residuals.
+        """
+        thetas = np.asarray(thetas)
+        single = thetas.ndim == 1
+        thetas = np.atleast_2d(thetas)
+        nodes = self.node_states if nodes is None else np.asarray(nodes)
+        nodes = np.broadcast_to(nodes, (len(thetas),) + self.node_states.shape)
+        residuals = self._residuals(thetas, nodes)
+        return residuals[0] if single else residuals
+
+    def _split(self, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        p = len(self.param_names)
+        if not self.estimate_nodes:
+            return z, self.node_states
+        return z[:p], z[p:].reshape(self.node_states.shape)
+
+    def jacobian(self,
+                 theta: np.ndarray,
+                 nodes: Optional[np.ndarray] = None,
+                 method: str = "central") -> Union[np.ndarray, Any]:
+        """Compute the Jacobian of the residuals with respect to the
+        parameters (and node states, if estimated), evaluating every perturbed
+        candidate in a single vectorized rollout.
+
+        Every node state only affects its own segment, so the node columns
+        of all segments are perturbed at once: n (or 2n) candidates cover all
+        S * n node columns.
+
+        Args:
+            theta (np.ndarray): The (p,) parameters.
+            nodes (Optional[np.ndarray], optional): The (S, n) node states.
+            Defaults to None (the logged states).
+            method (str, optional): "central" or "forward" finite differences,
+            or "complex" steps, which are exact to rounding but require the
+            model's dynamics to be complex-analytic in its parameters and
+            state (true for BoxDynamics, not for GravityDynamics, whose
+            np.linalg.norm is not). Defaults to "central".
+
+        Returns:
+            Union[np.ndarray, scipy.sparse.csr_matrix]: The (R, p) Jacobian,
+            or the sparse (R, p + S * n) Jacobian if the nodes are estimated.
+        """
+        if method not in GRADIENT_METHODS:
+            raise ValueError(f"Unknown gradient method '{method}'. Use one of {GRADIENT_METHODS}")
+        theta = np.asarray(theta, dtype=float)
+        nodes = self.node_states if nodes is None else np.asarray(nodes, dtype=float)
+        p = len(theta)
+        S, n = nodes.shape
+        num_node_columns = n if self.estimate_nodes else 0
+
+        # Step sizes, relative to the magnitude of each variable.
+        if method == "complex":
+            relative = 1e-20
+        elif method == "forward":
+            relative = np.sqrt(np.finfo(float).eps)
+        else:
+            relative = np.finfo(float).eps**(1 / 3)
+        h_theta = relative * np.maximum(np.abs(theta), 1.0)
+        h_nodes = relative * np.maximum(np.abs(nodes), 1.0)
+
+        # One candidate (or two, for central differences) per parameter, and
+        # per node state component (covering all segments at once).
+        num_columns = p + num_node_columns
+        signs = [1.0, -1.0] if method == "central" else [1.0]
+        step = 1j if method == "complex" else 1.0
+        thetas = np.tile(theta.astype(complex if method == "complex" else float),
+                         (len(signs) * num_columns, 1))
+        all_nodes = np.tile(nodes.astype(thetas.dtype), (len(thetas), 1, 1))
+        for s, sign in enumerate(signs):
+            for i in range(p):
+                thetas[s * num_columns + i, i] += sign * step * h_theta[i]
+            for c in range(num_node_columns):
+                all_nodes[s * num_columns + p + c, :, c] += sign * step * h_nodes[:, c]
+        if method == "forward":
+            thetas = np.concatenate([theta[None], thetas])
+            all_nodes = np.concatenate([nodes[None], all_nodes])
+
+        residuals = self._residuals(thetas, all_nodes)
+        if method == "complex":
+            differences = residuals.imag
+            h = 1.0
+        elif method == "forward":
+            differences = residuals[1:] - residuals[0]
+            h = 1.0
+        else:
+            differences = residuals[:num_columns] - residuals[num_columns:]
+            h = 2.0
+        # (num_columns, R) derivative of the residuals along each candidate.
+        steps = np.concatenate([np.broadcast_to(h_theta, (p,)),
+                                np.ones(num_node_columns)])
+        derivatives = differences / (h * steps[:, None])
+
+        J_theta = derivatives[:p].T
+        if not self.estimate_nodes:
+            return J_theta
+
+        # Node columns: segment j's rows only depend on node j, so the
+        # derivative along candidate c restricted to segment j's rows is
+        # column (j, c), divided by that node's own step size.
+        scipy = _import_scipy()
+        L = self.segment_length
+        rows_per_segment = L * n
+        segment_rows = np.arange(S)[:, None] * rows_per_segment + np.arange(rows_per_segment)
+        rows = [np.repeat(np.arange(len(J_theta)), p)]
+        columns = [np.tile(np.arange(p), len(J_theta))]
+        values = [J_theta.reshape(-1)]
+        for c in range(n):
+            d = derivatives[p + c, :S * rows_per_segment].reshape(S, rows_per_segment)
+            rows.append(segment_rows.reshape(-1))
+            columns.append(np.repeat(p + np.arange(S) * n + c, rows_per_segment))
+            values.append((d / h_nodes[:, c:c + 1]).reshape(-1))
+            # The node residual (node - logged node) / scale of component c.
+            rows.append(S * rows_per_segment + np.arange(S) * n + c)
+            columns.append(p + np.arange(S) * n + c)
+            values.append(np.full(S, 1.0 / self.scale[c]))
+        return scipy.sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(self.num_residuals, p + S * n))
+
+    def fit(self,
+            theta_0: Sequence[float],
+            bounds: Tuple[Any, Any] = (-np.inf, np.inf),
+            method: str = "central",
+            **least_squares_kwargs) -> IdentificationResult:
+        """Fit the parameters with scipy.optimize.least_squares, supplying the
+        batched Jacobian.
+
+        Args:
+            theta_0 (Sequence[float]): Initial (p,) parameters.
+            bounds (Tuple[Any, Any], optional): Lower and upper bounds on the
+            parameters. Defaults to (-np.inf, np.inf).
+            method (str, optional): Gradient method (see jacobian). Defaults to
+            "central".
+            **least_squares_kwargs: Passed on to least_squares, e.g., xtol.
+
+        Returns:
+            IdentificationResult: The fitted parameters and diagnostics.
+        """
+        scipy = _import_scipy()
+        theta_0 = np.asarray(theta_0, dtype=float)
+        p = len(theta_0)
+        lower, upper = (np.broadcast_to(np.asarray(b, dtype=float), (p,)) for b in bounds)
+        z_0 = theta_0
+        # The optimizer works on the unknowns divided by their typical
+        # magnitudes, so that parameters as different as a friction
+        # coefficient and mu (~4e14) are equally well conditioned.
+        unit = np.where(theta_0 != 0.0, np.abs(theta_0), 1.0)
+        if self.estimate_nodes:
+            z_0 = np.concatenate([theta_0, self.node_states.reshape(-1)])
+            lower = np.concatenate([lower, np.full(self.node_states.size, -np.inf)])
+            upper = np.concatenate([upper, np.full(self.node_states.size, np.inf)])
+            unit = np.concatenate([unit, np.tile(self.scale, self.num_segments)])
+            least_squares_kwargs.setdefault("tr_solver", "lsmr")
+
+        def fun(w: np.ndarray) -> np.ndarray:
+            return self.residuals(*self._split(w * unit))
+
+        def jac(w: np.ndarray) -> Union[np.ndarray, Any]:
+            J = self.jacobian(*self._split(w * unit), method=method)
+            return J @ scipy.sparse.diags(unit) if self.estimate_nodes else J * unit
+
+        result = scipy.optimize.least_squares(fun, z_0 / unit, jac=jac,
+                                              bounds=(lower / unit, upper / unit),
+                                              **least_squares_kwargs)
+        theta, nodes = self._split(result.x * unit)
+        J_theta = result.jac[:, :p]
+        J_theta = J_theta.toarray() if hasattr(J_theta, "toarray") else np.asarray(J_theta)
+        J_theta = J_theta / unit[:p]
+        num_state_residuals = self.num_segments * self.segment_length * len(self.scale)
+        state_residuals = result.fun[:num_state_residuals]
+        dof = max(len(result.fun) - len(result.x), 1)
+        covariance = np.linalg.pinv(J_theta.T @ J_theta) * (2 * result.cost / dof)
+        return IdentificationResult(params=dict(zip(self.param_names, theta.tolist())),
+                                    theta=np.array(theta),
+                                    nodes=np.array(nodes),
+                                    cost=float(result.cost),
+                                    rms=float(np.sqrt(np.mean(state_residuals**2))),
+                                    covariance=covariance,
+                                    result=result)
@@ -0,0 +1,322 @@
+"""Opt-in instrumentation of models, simulators and trajectory sinks.
+
+A Profiler times the phases of a simulation (the derivative evaluations, the
+integrator steps, the controller and any sinks such as trajectory writers or
+visualizers) and counts derivative evaluations, e.g.:
+
+    profiler = Profiler()
+    with profiler.attach(simulator, writer):
+        simulator.stream(writer)
+    print(profiler.summary())
+    profiler.export_chrome_trace("trace.json")
+
+Timings are aggregated as they are recorded, into streaming statistics and a
+fixed set of logarithmically spaced histogram bins per phase, so a profiler's
+memory use does not grow with the length of a campaign (only the optional
+trace keeps individual calls, up to max_trace_events).
+
+The integrator phase is the time spent in x_k_1 outside of the x_dot_k_1
+calls it makes. With the numba backend the derivative is fused into the
+compiled step, so those steps make no x_dot_k_1 calls to time or count: they
+are counted as "x_k_1 fused steps" and their integrator time includes the
+derivative.
+
+Instrumentation works by shadowing the instrumented methods (x_dot_k_1,
+x_k_1, the simulator's controller, and a sink's append) with timing wrappers
+on the instances themselves, and removing them again on detach. Nothing in
+the models or the simulation loop checks whether profiling is enabled, so an
+unprofiled simulation runs exactly the same code as before. The trace can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.simulator import Simulator
+
+# Phase names used for the instrumented methods.
+DERIVATIVE = "x_dot_k_1"
+STEP = "x_k_1"
+INTEGRATOR = "integrator"
+CONTROLLER = "controller"
+SINK = "sink"
+
+# Counter of x_k_1 calls that made no x_dot_k_1 calls, i.e., ran a fused
+# (numba) kernel whose derivative evaluations cannot be timed or counted.
+FUSED_STEPS = "x_k_1 fused steps"
+
+_MISSING = object()
+
+
+class PhaseStats:
+    """Streaming statistics of the durations of one phase: the count, sum,
+    minimum and maximum, and a histogram with fixed, logarithmically spaced
+    bins from 10 ns to 1000 s, from which percentiles are estimated.
+    """
+
+    # Histogram bins per decade, and the decades covered (log10 of ns).
+    BINS_PER_DECADE = 10
+    MIN_DECADE = 1
+    MAX_DECADE = 12
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+        self.counts = np.zeros((self.MAX_DECADE - self.MIN_DECADE) * self.BINS_PER_DECADE,
+                               dtype=np.int64)
+
+    @classmethod
+    def edges(cls) -> np.ndarray:
+        """The bin edges in seconds."""
+        return np.logspace(cls.MIN_DECADE, cls.MAX_DECADE,
+                           (cls.MAX_DECADE - cls.MIN_DECADE) * cls.BINS_PER_DECADE + 1) * 1e-9
+
+    def add(self, duration_ns: int):
+        """Record one duration in nanoseconds. Durations outside of the
+        histogram's range are counted in its first or last bin.
+        """
+        self.count += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if self.max_ns is None or duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        index = int((math.log10(max(duration_ns, 1)) - self.MIN_DECADE) * self.BINS_PER_DECADE)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile in seconds, as the geometric center
+        of the bin holding it, clamped to the observed minimum and maximum.
+        """
+        rank = q / 100 * (self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+        edges = self.edges()
+        center = math.sqrt(edges[index] * edges[index + 1])
+        return min(max(center, self.min_ns * 1e-9), self.max_ns * 1e-9)
+
+class Profiler:
+    """Collects phase timings, counters and (optionally) a trace of every
+    timed call.
+    """
+
+    def __init__(self, trace: bool = True, max_trace_events: int = 1_000_000):
+        """Initialize the profiler.
+
+        Args:
+            trace (bool, optional): Record every timed call for the Chrome
+            trace export, in addition to the aggregate statistics. Defaults
+            to True.
+            max_trace_events (int, optional): Maximum number of trace events
+            kept, bounding the trace's memory use on long campaigns. Defaults
+            to 1_000_000.
+        """
+        self.counters: Dict[str, int] = {}
+        self.phases: Dict[str, PhaseStats] = {}
+        self.max_trace_events = max_trace_events
+        self._trace: Optional[List[Tuple[str, int, int]]] = [] if trace else None
+        self._start = time.perf_counter_ns()
+        self._patched: List[Tuple[Any, str, Any]] = []
+        # Total time (and number) of the x_dot_k_1 calls so far, so that the
+        # time x_k_1 spends in them can be subtracted.
+        self._derivative = [0, 0]
+
+    def count(self, name: str, n: int = 1):
+        """Increment the counter name by n."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _patch(self, obj: Any, attr: str, wrapper: Any):
+        self._patched.append((obj, attr, vars(obj).get(attr, _MISSING)))
+        setattr(obj, attr, wrapper)
+
+    def _timed(self, fn, phase: str, count_states: bool = False):
+        """Wrap fn so that every call is timed as phase. If count_states is
+        set, the number of states in the first argument is also counted.
+        """
+        clock = time.perf_counter_ns
+        stats = self.phases.setdefault(phase, PhaseStats())
+        trace = self._trace
+        max_trace_events = self.max_trace_events
+        counters = self.counters
+        states_counter = f"{phase} states"
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                duration = clock() - start
+                stats.add(duration)
+                if count_states:
+                    counters[states_counter] = counters.get(states_counter, 0) \
+                        + int(np.prod(np.shape(args[0])[:-1]))
+                if trace is not None and len(trace) < max_trace_events:
+                    trace.append((phase, start, duration))
+        return timed
+
+    def _timed_derivative(self, fn):
+        """Wrap x_dot_k_1, also accumulating its time for _timed_step."""
+        timed = self._timed(fn, DERIVATIVE, count_states=True)
+        clock = time.perf_counter_ns
+        derivative = self._derivative
+
+        def timed_derivative(*args, **kwargs):
+            start = clock()
+            try:
+                return timed(*args, **kwargs)
+            finally:
+                derivative[0] += clock() - start
+                derivative[1] += 1
+        return timed_derivative
+
+    def _timed_step(self, fn):
+        """Wrap x_k_1, recording the time it spends outside of x_dot_k_1 as
+        the integrator phase.
+        """
+        timed = self._timed(fn, STEP, count_states=True)
+        clock = time.perf_counter_ns
+        integrator = self.phases.setdefault(INTEGRATOR, PhaseStats())
+        derivative = self._derivative
+        counters = self.counters
+
+        def timed_step(*args, **kwargs):
+            start = clock()
+            derivative_ns, derivative_calls = derivative
+            try:
+                return timed(*args, **kwargs)
+            finally:
+                integrator.add(clock() - start - (derivative[0] - derivative_ns))
+                if derivative[1] == derivative_calls:
+                    counters[FUSED_STEPS] = counters.get(FUSED_STEPS, 0) + 1
+        return timed_step
+
+    def instrument_model(self, model: DynamicsModel):
+        """Time (and count) the model's x_dot_k_1 and x_k_1 calls, and the
+        integrator's own time within x_k_1.
+        """
+        self._patch(model, "x_dot_k_1", self._timed_derivative(model.x_dot_k_1))
+        self._patch(model, "x_k_1", self._timed_step(model.x_k_1))
+
+    def instrument_simulator(self, simulator: Simulator):
+        """Time the simulator's model and controller."""
+        self.instrument_model(simulator.model)
+        self._patch(simulator, "controller", self._timed(simulator.controller, CONTROLLER))
+
+    def instrument_sink(self, sink: Any, phase: str = SINK):
+        """Time a trajectory sink's append calls, e.g., a TrajectoryWriter or
+        a MeshcatSink.
+        """
+        self._patch(sink, "append", self._timed(sink.append, phase))
+
+    def detach(self):
+        """Remove all instrumentation, restoring the original methods."""
+        while self._patched:
+            obj, attr, original = self._patched.pop()
+            if original is _MISSING:
+                delattr(obj, attr)
+            else:
+                setattr(obj, attr, original)
+
+    @contextmanager
+    def attach(self, *objects: Any) -> Iterator["Profiler"]:
+        """Instrument models, simulators and sinks for the duration of a with
+        block.
+
+        Args:
+            *objects (Any): DynamicsModels, Simulators, or sinks (anything
+            with an append method).
+
+        Yields:
+            Profiler: This profiler.
+        """
+        try:
+            for obj in objects:
+                if isinstance(obj, Simulator):
+                    self.instrument_simulator(obj)
+                elif isinstance(obj, DynamicsModel):
+                    self.instrument_model(obj)
+                else:
+                    self.instrument_sink(obj)
+            yield self
+        finally:
+            self.detach()
+
+    def histogram(self, phase: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Histogram of a phase's call durations, with logarithmically spaced
+        bins (see PhaseStats), trimmed to the bins that were hit.
+
+        Args:
+            phase (str): The phase name.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (bins,) counts and the
+            (bins + 1,) bin edges in seconds.
+        """
+        counts = self.phases[phase].counts
+        hit = np.flatnonzero(counts)
+        first, last = (hit[0], hit[-1] + 1) if len(hit) else (0, 0)
+        return counts[first:last].copy(), PhaseStats.edges()[first:last + 1]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Aggregate statistics of every phase, with times in seconds. The
+        percentiles are estimated from the phase's histogram.
+        """
+        stats = {}
+        for phase, s in self.phases.items():
+            if s.count == 0:
+                continue
+            total = s.total_ns * 1e-9
+            stats[phase] = {"calls": s.count, "total": total, "mean": total / s.count,
+                            "min": s.min_ns * 1e-9, "p50": s.percentile(50),
+                            "p90": s.percentile(90), "p99": s.percentile(99),
+                            "max": s.max_ns * 1e-9}
+        return stats
+
+    def summary(self) -> str:
+        """Format the phase statistics and counters as a table.
+
+        NOTE: Phases nest (every x_k_1 includes the x_dot_k_1 calls it makes,
+        and the integrator phase is the rest of it), so their shares of the
+        wall time do not add up to 100%.
+        """
+        wall = (time.perf_counter_ns() - self._start) * 1e-9
+        lines = [f"{'phase':<14} {'calls':>10} {'total (s)':>10} {'share':>7} "
+                 f"{'mean (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10} {'max (us)':>10}"]
+        for phase, s in self.stats().items():
+            lines.append(f"{phase:<14} {s['calls']:>10} {s['total']:>10.4f} "
+                         f"{s['total'] / wall:>7.1%} {s['mean'] * 1e6:>10.2f} "
+                         f"{s['p50'] * 1e6:>10.2f} {s['p99'] * 1e6:>10.2f} "
+                         f"{s['max'] * 1e6:>10.2f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<24} {value:>10}")
+        if self.counters.get(FUSED_STEPS):
+            lines.append(f"NOTE: {self.counters[FUSED_STEPS]} x_k_1 calls ran a fused (numba) "
+                         f"kernel, whose x_dot_k_1 calls are not timed or counted, and are "
+                         f"included in the integrator time")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Build the trace in the Chrome trace event format."""
+        if self._trace is None:
+            raise ValueError("The profiler was created with trace=False")
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = [{"name": phase, "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - self._start) / 1e3, "dur": duration / 1e3}
+                  for phase, start, duration in self._trace]
+        return {"traceEvents": events, "displayTimeUnit": "ns",
+                "otherData": {"counters": self.counters}}
+
+    def export_chrome_trace(self, path: str):
+        """Write the trace to a Chrome trace JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,464 @@
+"""Fixed-step numerical integrators used by DynamicsModel.x_k_1 to turn the
+continuous-time dynamics x_dot_k_1 into discrete-time dynamics.
+
+Integrators are registered by name so that a model can select one with, e.g.,
+BoxDynamics(integrator="semi_implicit_euler"). Each integrator instance owns a
+set of scratch buffers that are reused across steps, and the model's
+x_dot_k_1 writes its derivatives straight into them, so the only arrays
+allocated per step are the model's own temporaries (and the result, if the
+caller does not provide an out buffer).
+"""
+
+from typing import Callable, Dict, Optional, Type
+
+import numpy as np
+
+# Maps integrator names to Integrator subclasses.
+INTEGRATORS: Dict[str, Type["Integrator"]] = {}
+
+def register_integrator(*names: str) -> Callable[[Type["Integrator"]], Type["Integrator"]]:
+    """Class decorator that registers an Integrator subclass under one or more
+    names.
+
+    Args:
+        *names (str): The names (and aliases) to register the integrator as.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(cls: Type["Integrator"]) -> Type["Integrator"]:
+        for name in names:
+            if name in INTEGRATORS:
+                raise ValueError(f"An integrator named '{name}' is already registered")
+            INTEGRATORS[name] = cls
+        cls.name = names[0]
+        return cls
+    return decorator
+
+def get_integrator(name: str) -> "Integrator":
+    """Construct a new instance of the integrator registered under name.
+
+    Args:
+        name (str): Name of a registered integrator.
+
+    Returns:
+        Integrator: A fresh integrator instance with its own scratch buffers.
+    """
+    try:
+        return INTEGRATORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown integrator '{name}'. Available integrators: "
+                         f"{sorted(INTEGRATORS)}") from None
+
+
+def state_dtype(x_k: np.ndarray, u_k: np.ndarray) -> np.dtype:
+    """Return the floating point dtype used to integrate x_k under u_k."""
+    return np.result_type(x_k, u_k, 1.0)
+
+
+class Integrator:
+    """Base class for fixed-step integrators."""
+
+    name = None
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _scratch(self, key: str, shape, dtype) -> np.ndarray:
+        """Return a reusable scratch buffer, only (re)allocating it when the
+        requested shape or dtype changes.
+        """
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
+    @staticmethod
+    def _output(out: Optional[np.ndarray], shape, dtype) -> np.ndarray:
+        return np.empty(shape, dtype=dtype) if out is None else out
+
+    def get_state(self) -> dict:
+        """Return any internal state that affects future steps (e.g., an
+        adaptive integrator's current step size), for checkpointing. Scratch
+        buffers are not included.
+        """
+        return {}
+
+    def set_state(self, state: dict):
+        """Restore internal state returned by get_state."""
+
+    def reset(self):
+        """Reset any internal state (e.g., an adaptive integrator's step
+        size) before a new run.
+        """
+
+    def step(self,
+             model,
+             x_k: np.ndarray,
+             u_k: np.ndarray,
+             dt: float,
+             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Advance the state of model by one timestep of length dt.
+
+        Args:
+            model (DynamicsModel): The model whose x_dot_k_1 is integrated.
+            x_k (np.ndarray): The state at timestep k, (n,) or (N, n).
+            u_k (np.ndarray): The control input at timestep k.
+            dt (float): The timestep length.
+            out (Optional[np.ndarray], optional): Array to write x_k+1 into.
+            May alias x_k. Defaults to None (allocate a new array).
+
+        Returns:
+            np.ndarray: The state at timestep k+1.
+        """
+        raise NotImplementedError
+
+
+@register_integrator("euler")
+class ExplicitEuler(Integrator):
+    """First order explicit (forward) Euler: x_k+1 = x_k + dt * f(x_k, u_k)."""
+
+    def step(self, model, x_k, u_k, dt, out=None):
+        dtype = state_dtype(x_k, u_k)
+        acc = self._scratch("acc", x_k.shape, dtype)
+        model.x_dot_k_1(x_k, u_k, out=acc)
+        acc *= dt
+        out = self._output(out, x_k.shape, dtype)
+        np.add(x_k, acc, out=out)
+        return out
+
+
+@register_integrator("rk4")
+class RK4(Integrator):
+    """Classic fourth order Runge-Kutta, evaluated into reused scratch buffers
+    instead of allocating a temporary for every intermediate expression.
+    """
+
+    def step(self, model, x_k, u_k, dt, out=None):
+        f = model.x_dot_k_1
+        dtype = state_dtype(x_k, u_k)
+        stage = self._scratch("stage", x_k.shape, dtype)
+        acc = self._scratch("acc", x_k.shape, dtype)
+        k1 = f(x_k, u_k, out=self._scratch("k1", x_k.shape, dtype))
+
+        np.multiply(k1, 0.5 * dt, out=stage)
+        stage += x_k
+        k2 = f(stage, u_k, out=self._scratch("k2", x_k.shape, dtype))
+        np.multiply(k2, 0.5 * dt, out=stage)
+        stage += x_k
+        k3 = f(stage, u_k, out=self._scratch("k3", x_k.shape, dtype))
+        np.add(k2, k3, out=acc)
+        np.multiply(k3, dt, out=stage)
+        stage += x_k
+        # k4 is only needed once k2 is no longer, so it can share its buffer.
+        k4 = f(stage, u_k, out=k2)
+
+        # acc = k1 + 2 * k2 + 2 * k3 + k4
+        acc *= 2.0
+        acc += k1
+        acc += k4
+        acc *= dt / 6
+        out = self._output(out, x_k.shape, dtype)
+        np.add(x_k, acc, out=out)
+        return out
+
+
+class _PartitionedIntegrator(Integrator):
+    """Base class for integrators that treat the "position" and "velocity"
+    parts of the state differently. Models opt in by setting the positions and
+    velocities slices of the state vector.
+    """
+
+    def _partition(self, model):
+        positions = getattr(model, "positions", None)
+        velocities = getattr(model, "velocities", None)
+        if positions is None or velocities is None:
+            raise ValueError(f"The '{self.name}' integrator requires "
+                             f"{type(model).__name__} to define the positions "
+                             f"and velocities slices of its state")
+        return positions, velocities
+
+    @staticmethod
+    def _kick(stage: np.ndarray, x_dot: np.ndarray, dt: float, tmp: np.ndarray, part: slice):
+        """Update stage[..., part] += dt * x_dot[..., part] in place, using tmp
+        as scratch space instead of allocating a temporary.
+        """
+        np.multiply(x_dot[..., part], dt, out=tmp[..., part])
+        stage[..., part] += tmp[..., part]
+
+
+@register_integrator("semi_implicit_euler", "symplectic_euler")
+class SemiImplicitEuler(_PartitionedIntegrator):
+    """First order semi-implicit (symplectic) Euler. The velocities are updated
+    first, and the positions are then updated using the new velocities.
+    """
+
+    def step(self, model, x_k, u_k, dt, out=None):
+        P, V = self._partition(model)
+        f = model.x_dot_k_1
+        dtype = state_dtype(x_k, u_k)
+        stage = self._scratch("stage", x_k.shape, dtype)
+        tmp = self._scratch("tmp", x_k.shape, dtype)
+        k = self._scratch("k", x_k.shape, dtype)
+
+        stage[...] = x_k
+        self._kick(stage, f(x_k, u_k, out=k), dt, tmp, V)
+        self._kick(stage, f(stage, u_k, out=k), dt, tmp, P)
+
+        out = self._output(out, x_k.shape, dtype)
+        out[...] = stage
+        return out
+
+
+@register_integrator("velocity_verlet", "leapfrog")
+class VelocityVerlet(_PartitionedIntegrator):
+    """Second order velocity Verlet (kick-drift-kick leapfrog). Symplectic for
+    forces that only depend on position, which keeps the energy of orbits
+    bounded over long horizons even at large timesteps.
+    """
+
+    def step(self, model, x_k, u_k, dt, out=None):
+        P, V = self._partition(model)
+        f = model.x_dot_k_1
+        dtype = state_dtype(x_k, u_k)
+        stage = self._scratch("stage", x_k.shape, dtype)
+        tmp = self._scratch("tmp", x_k.shape, dtype)
+        k = self._scratch("k", x_k.shape, dtype)
+
+        # Half kick.
+        stage[...] = x_k
+        self._kick(stage, f(x_k, u_k, out=k), 0.5 * dt, tmp, V)
+        # Drift with the half-step velocities.
+        self._kick(stage, f(stage, u_k, out=k), dt, tmp, P)
+        # Half kick with the accelerations at the new positions.
+        self._kick(stage, f(stage, u_k, out=k), 0.5 * dt, tmp, V)
+
+        out = self._output(out, x_k.shape, dtype)
+        out[...] = stage
+        return out
+
+
+class DenseSolution:
+    """Continuous solution produced by an adaptive integrator. Stores the
+    accepted step boundaries along with the interpolant coefficients of every
+    step, so the trajectory can be sampled at arbitrary times after the fact
+    without having to integrate at the output rate.
+
+    Attributes:
+        t (np.ndarray): The (S+1,) times of the accepted step boundaries.
+        x (np.ndarray): The (S+1, ...) states at the accepted step boundaries.
+        nfev (int): Number of x_dot_k_1 evaluations used.
+    """
+
+    def __init__(self, t: np.ndarray, x: np.ndarray, Q: np.ndarray, nfev: int):
+        self.t = t
+        self.x = x
+        self._Q = Q
+        self._h = np.diff(t)
+        self.nfev = nfev
+
+    def __call__(self, t) -> np.ndarray:
+        """Evaluate the solution at the given time(s).
+
+        Args:
+            t (float or np.ndarray): Time or (K,) array of times within
+            [t[0], t[-1]].
+
+        Returns:
+            np.ndarray: The state at t, or a (K, ...) array of states.
+        """
+        t_query = np.asarray(t, dtype=float)
+        scalar = t_query.ndim == 0
+        t_query = np.atleast_1d(t_query)
+        if np.any(t_query < self.t[0]) or np.any(t_query > self.t[-1]):
+            raise ValueError(f"Requested times must lie within [{self.t[0]}, {self.t[-1]}]")
+        if len(self._h) == 0:
+            x = np.broadcast_to(self.x[0], t_query.shape + self.x.shape[1:]).copy()
+            return x[0] if scalar else x
+
+        i = np.clip(np.searchsorted(self.t, t_query, side="right") - 1, 0, len(self._h) - 1)
+        h = self._h[i]
+        sigma = (t_query - self.t[i]) / h
+        powers = np.cumprod(np.repeat(sigma[:, None], self._Q.shape[1], axis=1), axis=1)
+        # Interpolate in the dtype of the states, as the times are float64.
+        dtype = self.x.dtype
+        x = self.x[i] + np.einsum("k,kj,kj...->k...", h.astype(dtype, copy=False),
+                                  powers.astype(dtype, copy=False), self._Q[i])
+        return x[0] if scalar else x
+
+
+@register_integrator("dopri5", "rk45")
+class DormandPrince45(Integrator):
+    """Adaptive, error-controlled Dormand-Prince 5(4) Runge-Kutta.
+
+    When used as a model's integrator, x_k_1 advances exactly one model
+    timestep dt, but internally takes as many (or as few) substeps as needed to
+    meet the rtol/atol tolerances, carrying the step size over between calls.
+    For long propagations, integrate returns a DenseSolution that can be
+    sampled at arbitrary output times.
+
+    For a batch of states, a single step size is shared by the whole batch and
+    is controlled by the worst error in the batch.
+    """
+
+    C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+    A = np.array([
+        [0, 0, 0, 0, 0, 0],
+        [1/5, 0, 0, 0, 0, 0],
+        [3/40, 9/40, 0, 0, 0, 0],
+        [44/45, -56/15, 32/9, 0, 0, 0],
+        [19372/6561, -25360/2187, 64448/6561, -212/729, 0, 0],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656, 0],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+    ])
+    # Difference between the 5th and embedded 4th order weights.
+    E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+    # Coefficients of the 4th order continuous extension (dense output).
+    P = np.array([
+        [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+        [0, 0, 0, 0],
+        [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+        [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+        [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+        [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+        [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]
+    ])
+
+    SAFETY = 0.9
+    MIN_FACTOR = 0.2
+    MAX_FACTOR = 10.0
+
+    def __init__(self, rtol=1e-6, atol=1e-9, first_step=None, max_step=np.inf):
+        """Initialize the integrator.
+
+        Args:
+            rtol (float, optional): Relative tolerance. Defaults to 1e-6.
+            atol (float, optional): Absolute tolerance. Defaults to 1e-9.
+            first_step (float, optional): Initial step size. Defaults to None
+            (chosen automatically).
+            max_step (float, optional): Largest allowed step size. Defaults to
+            np.inf.
+        """
+        super().__init__()
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.first_step = first_step
+        self._h = first_step
+
+    def get_state(self) -> dict:
+        return {"h": self._h}
+
+    def set_state(self, state: dict):
+        self._h = state["h"]
+
+    def reset(self):
+        self._h = self.first_step
+
+    def _error_norm(self, error: np.ndarray, x: np.ndarray, x_new: np.ndarray) -> float:
+        scale = self.atol + self.rtol * np.maximum(np.abs(x), np.abs(x_new))
+        return float(np.max(np.sqrt(np.mean((error / scale)**2, axis=-1))))
+
+    def _initial_step(self, f, x, u, k1) -> float:
+        """Select an initial step size following Hairer, Norsett and Wanner,
+        "Solving Ordinary Differential Equations I", Sec. II.4.
+        """
+        scale = self.atol + self.rtol * np.abs(x)
+        d0 = np.max(np.sqrt(np.mean((x / scale)**2, axis=-1)))
+        d1 = np.max(np.sqrt(np.mean((k1 / scale)**2, axis=-1)))
+        h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        k2 = f(x + h0 * k1, u)
+        d2 = np.max(np.sqrt(np.mean(((k2 - k1) / scale)**2, axis=-1))) / h0
+        if max(d1, d2) <= 1e-15:
+            h1 = max(1e-6, h0 * 1e-3)
+        else:
+            h1 = (0.01 / max(d1, d2))**(1 / 5)
+        return min(100 * h0, h1, self.max_step)
+
+    def _advance(self, model, x_k, u_k, t_0, t_1, segments=None):
+        """Integrate from t_0 to t_1 with adaptive steps.
+
+        Returns:
+            Tuple[np.ndarray, int]: The state at t_1 and the number of
+            x_dot_k_1 evaluations.
+        """
+        f = model.x_dot_k_1
+        x = np.array(x_k, dtype=state_dtype(x_k, u_k))
+        # The float64 tableau would upcast float32 stages.
+        A, E, P = (c.astype(x.dtype, copy=False) for c in (self.A, self.E, self.P))
+        K = self._scratch("K", (7,) + x.shape, x.dtype)
+        k1 = f(x, u_k, out=K[0])
+        nfev = 1
+        if self._h is None:
+            self._h = self._initial_step(f, x, u_k, k1)
+            nfev += 1
+
+        t = t_0
+        while t < t_1:
+            h_proposed = min(self._h, self.max_step)
+            h = min(h_proposed, t_1 - t)
+            while True:
+                K[0] = k1
+                for s in range(1, 7):
+                    stage = x + h * np.tensordot(A[s, :s], K[:s], axes=1)
+                    f(stage, u_k, out=K[s])
+                nfev += 6
+                # With the FSAL property, the last stage is the new state.
+                x_new = stage
+                error = h * np.tensordot(E, K, axes=1)
+                error_norm = self._error_norm(error, x, x_new)
+                if error_norm <= 1.0:
+                    factor = self.MAX_FACTOR if error_norm == 0 else \
+                        min(self.MAX_FACTOR, self.SAFETY * error_norm**(-1 / 5))
+                    break
+                h *= max(self.MIN_FACTOR, self.SAFETY * error_norm**(-1 / 5))
+                if h < 10 * np.finfo(float).eps * max(abs(t), 1.0):
+                    raise RuntimeError(f"Step size underflow at t={t}: the "
+                                       f"requested tolerances cannot be met")
+                h_proposed = h
+
+            if segments is not None:
+                segments.append((t + h, x_new.copy(), np.tensordot(P.T, K, axes=1)))
+            # Only update the carried step size if this step was not shortened
+            # to land exactly on t_1.
+            if h == h_proposed:
+                self._h = h * factor
+            t = t + h
+            x = x_new
+            k1 = K[6].copy()
+        return x, nfev
+
+    def step(self, model, x_k, u_k, dt, out=None):
+        x, _ = self._advance(model, x_k, u_k, 0.0, dt)
+        out = self._output(out, x_k.shape, x.dtype)
+        out[...] = x
+        return out
+
+    def integrate(self,
+                  model,
+                  x_0: np.ndarray,
+                  u_k: np.ndarray,
+                  t_final: float,
+                  t_0: float = 0.0) -> DenseSolution:
+        """Integrate model from t_0 to t_final holding the control input u_k
+        constant, recording a dense output interpolant.
+
+        Args:
+            model (DynamicsModel): The model whose x_dot_k_1 is integrated.
+            x_0 (np.ndarray): The initial state, (n,) or (N, n).
+            u_k (np.ndarray): The control input held over the whole interval.
+            t_final (float): The final time.
+            t_0 (float, optional): The initial time. Defaults to 0.0.
+
+        Returns:
+            DenseSolution: The continuous solution over [t_0, t_final].
+        """
+        segments = []
+        _, nfev = self._advance(model, x_0, u_k, t_0, t_final, segments)
+        x_0 = np.asarray(x_0, dtype=state_dtype(x_0, u_k))
+        t = np.array([t_0] + [segment[0] for segment in segments])
+        x = np.stack([x_0] + [segment[1] for segment in segments])
+        Q = np.stack([segment[2] for segment in segments]) if segments else \
+            np.empty((0, self.P.shape[1]) + x_0.shape)
+        return DenseSolution(t, x, Q, nfev)
@@ -0,0 +1,215 @@
+"""Optional Numba backend for the dynamics and integrator kernels.
+
+With small states (4 for BoxDynamics, 13 for GravityDynamics), a NumPy step is
+dominated by the fixed overhead of dispatching a few dozen array operations,
+not by arithmetic. For single-trajectory closed-loop runs that cannot be
+batched, this backend compiles a model's scalar x_dot kernel together with
+the explicit Euler or RK4 step into one machine-code loop over the batch (and,
+for open-loop rollouts, over time), removing that overhead.
+
+Models opt in by providing:
+    x_dot_kernel(x, u, params, out)   A staticmethod computing the derivative
+                                      of a single (n,) state into out, using
+                                      only scalar loops and indexing.
+    kernel_parameters()               A tuple of the scalar parameters passed
+                                      to the kernel as params.
+Models that override x_k_1 must also override fuses_rollouts() to report when
+their steps match the kernel, or rollout steps them with x_k_1.
+
+Select the backend with, e.g., BoxDynamics(backend="numba"). When Numba is not
+installed, or the model, integrator or inputs are not supported (non-float64
+states, array-valued parameters, other integrators), x_k_1 falls back to the
+NumPy implementation.
+"""
+
+import warnings
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+# Integrators with fused kernels.
+SUPPORTED_INTEGRATORS = ("euler", "rk4")
+
+# Compiled (step, rollout) kernels, keyed by (x_dot kernel, integrator name).
+_COMPILED: Dict[Tuple[Callable, str], Tuple[Callable, Callable]] = {}
+
+def _compile(x_dot_kernel: Callable, integrator: str) -> Tuple[Callable, Callable]:
+    """Compile the batched step and rollout kernels of a model's x_dot kernel
+    under an integrator.
+    """
+    key = (x_dot_kernel, integrator)
+    if key in _COMPILED:
+        return _COMPILED[key]
+
+    x_dot = numba.njit(x_dot_kernel)
+
+    if integrator == "euler":
+        @numba.njit
+        def step_one(x, u, dt, params, k1, k2, k3, stage, out):
+            x_dot(x, u, params, k1)
+            for j in range(x.shape[0]):
+                out[j] = x[j] + dt * k1[j]
+    else:
+        @numba.njit
+        def step_one(x, u, dt, params, k1, k2, k3, stage, out):
+            n = x.shape[0]
+            x_dot(x, u, params, k1)
+            for j in range(n):
+                stage[j] = x[j] + 0.5 * dt * k1[j]
+            x_dot(stage, u, params, k2)
+            # Accumulate k1 + 2 k2 + 2 k3 + k4 into k1 as the stages go.
+            for j in range(n):
+                stage[j] = x[j] + 0.5 * dt * k2[j]
+                k1[j] += 2.0 * k2[j]
+            x_dot(stage, u, params, k3)
+            for j in range(n):
+                stage[j] = x[j] + dt * k3[j]
+                k1[j] += 2.0 * k3[j]
+            x_dot(stage, u, params, k2)
+            # Each out[j] only depends on x[j], so out may alias x.
+            for j in range(n):
+                out[j] = x[j] + dt / 6.0 * (k1[j] + k2[j])
+
+    @numba.njit
+    def step(x, u, dt, params, out):
+        n = x.shape[1]
+        k1, k2, k3, stage = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+        for i in range(x.shape[0]):
+            step_one(x[i], u[i], dt, params, k1, k2, k3, stage, out[i])
+
+    @numba.njit
+    def rollout(controls, dt, params, states):
+        n = states.shape[2]
+        k1, k2, k3, stage = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+        for k in range(1, states.shape[0]):
+            for i in range(states.shape[1]):
+                step_one(states[k - 1, i], controls[k - 1, i], dt, params,
+                         k1, k2, k3, stage, states[k, i])
+
+    _COMPILED[key] = (step, rollout)
+    return step, rollout
+
+def _scalar_parameters(model) -> Optional[tuple]:
+    params = model.kernel_parameters()
+    for p in params:
+        if not isinstance(p, (int, float)) and np.ndim(p) != 0:
+            return None
+    return tuple(float(p) for p in params)
+
+
+class JitStep:
+    """Fused x_dot + integrator step of a model, compiled with Numba."""
+
+    def __init__(self, model):
+        self._step, self._rollout = _compile(type(model).x_dot_kernel, model.integrator.name)
+
+    def __call__(self,
+                 model,
+                 x_k: np.ndarray,
+                 u_k: np.ndarray,
+                 out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Step x_k forward one timestep of model.dt.
+
+        Returns:
+            Optional[np.ndarray]: The state at timestep k+1, or None if the
+            inputs are not supported by the compiled kernel.
+        """
+        params = _scalar_parameters(model)
+        if params is None or x_k.dtype != np.float64 or np.ndim(model.dt) != 0:
+            return None
+        if out is None:
+            out = np.empty_like(x_k)
+        elif out.dtype != np.float64:
+            return None
+        x = x_k.reshape(-1, x_k.shape[-1])
+        u = np.asarray(u_k, dtype=np.float64)
+        if u.shape[:-1] != x_k.shape[:-1]:
+            u = np.broadcast_to(u, x_k.shape[:-1] + u.shape[-1:])
+        u = u.reshape(len(x), -1)
+        if out.ndim > 2 and not out.flags.c_contiguous:
+            # Flattening a non-contiguous view would copy it, and the result
+            # would never reach out.
+            return None
+        out_2d = out.reshape(-1, out.shape[-1])
+        self._step(x, u, float(model.dt), params, out_2d)
+        return out
+
+    def rollout(self, model, x_0: np.ndarray, controls: np.ndarray) -> np.ndarray:
+        """Simulate an open-loop control sequence in a single compiled loop
+        over time and batch.
+
+        Args:
+            model (DynamicsModel): The model.
+            x_0 (np.ndarray): The (N, n) initial states.
+            controls (np.ndarray): The (T - 1, N, m) controls.
+
+        Returns:
+            np.ndarray: The (T, N, n) states.
+        """
+        states = np.empty((len(controls) + 1,) + x_0.shape)
+        states[0] = x_0
+        controls = np.ascontiguousarray(controls, dtype=np.float64)
+        self._rollout(controls, float(model.dt), _scalar_parameters(model), states)
+        return states
+
+
+def compile_step(model) -> Optional[JitStep]:
+    """Compile the fused step of model, if possible.
+
+    Args:
+        model (DynamicsModel): The model.
+
+    Returns:
+        Optional[JitStep]: The compiled step, or None (with a warning) if
+        Numba is not installed or the model or its integrator are not
+        supported.
+    """
+    if not NUMBA_AVAILABLE:
+        warnings.warn("Numba is not installed; falling back to the NumPy backend")
+        return None
+    if getattr(type(model), "x_dot_kernel", None) is None:
+        warnings.warn(f"{type(model).__name__} has no x_dot_kernel; falling back to the "
+                      f"NumPy backend")
+        return None
+    if model.integrator.name not in SUPPORTED_INTEGRATORS:
+        warnings.warn(f"The numba backend does not support the '{model.integrator.name}' "
+                      f"integrator; falling back to the NumPy backend")
+        return None
+    return JitStep(model)
+
+def rollout(model, x_0: np.ndarray, controls: np.ndarray) -> np.ndarray:
+    """Simulate an open-loop control sequence, using a single compiled loop
+    over time and batch when the model uses the numba backend and its steps
+    are exactly the kernel's (see DynamicsModel.fuses_rollouts), and stepping
+    with x_k_1 otherwise. The states keep the dtype of x_0.
+
+    Args:
+        model (DynamicsModel): The model.
+        x_0 (np.ndarray): The (n,) or (N, n) initial state(s).
+        controls (np.ndarray): The (T - 1, m) or (T - 1, N, m) controls.
+
+    Returns:
+        np.ndarray: The (T, n) or (T, N, n) states.
+    """
+    x_0 = np.asarray(x_0)
+    dtype = np.result_type(x_0, 1.0)
+    controls = np.broadcast_to(controls, (len(controls),) + x_0.shape[:-1] + np.shape(controls)[-1:])
+    jit_step = getattr(model, "_jit_step", None)
+    if (jit_step is not None and dtype == np.float64 and model.fuses_rollouts()
+            and _scalar_parameters(model) is not None):
+        batch = x_0.reshape(-1, x_0.shape[-1])
+        states = jit_step.rollout(model, batch, controls.reshape(len(controls), len(batch), -1))
+        return states.reshape((len(controls) + 1,) + x_0.shape)
+
+    states = np.empty((len(controls) + 1,) + x_0.shape, dtype=dtype)
+    states[0] = x_0
+    for k in range(1, len(states)):
+        model.x_k_1(states[k - 1], controls[k - 1], out=states[k])
+    return states
@@ -0,0 +1,69 @@
+"""Functions for linearizing discrete-time dynamics about a point or along a
+trajectory.
+"""
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Relative finite difference step. The cube root of machine epsilon balances
+# truncation and rounding error for central differences.
+FD_EPSILON = np.finfo(float).eps ** (1 / 3)
+
+def finite_difference_jacobians(f: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                                x: np.ndarray,
+                                u: np.ndarray,
+                                epsilon: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the Jacobians of f(x, u) with respect to x and u using central
+    finite differences.
+
+    Rather than calling f 2(n+m) times, every perturbed (x, u) pair for every
+    linearization point is stacked into a single batch and f is evaluated
+    once, so f must accept arbitrary leading batch dimensions. f is
+    evaluated in the floating point type of x and u (float64 for integers), so
+    a reduced precision model is differentiated in its own precision.
+
+    Args:
+        f (Callable): The function to differentiate, e.g., a model's x_k_1.
+        x (np.ndarray): The (..., n) point(s) to linearize about.
+        u (np.ndarray): The (..., m) control input(s) to linearize about.
+        epsilon (Optional[float], optional): Relative perturbation size.
+        Defaults to None (the cube root of the machine epsilon of the dtype,
+        i.e., FD_EPSILON for float64).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (..., n_out, n) Jacobian with
+        respect to x and the (..., n_out, m) Jacobian with respect to u.
+    """
+    dtype = np.result_type(x, u, 1.0)
+    x = np.asarray(x, dtype=dtype)
+    u = np.asarray(u, dtype=dtype)
+    if epsilon is None:
+        epsilon = np.finfo(dtype).eps ** (1 / 3)
+    batch_shape = np.broadcast_shapes(x.shape[:-1], u.shape[:-1])
+    n, m = x.shape[-1], u.shape[-1]
+    x = np.broadcast_to(x, batch_shape + (n,))
+    u = np.broadcast_to(u, batch_shape + (m,))
+
+    # Perturbation sizes scaled by the magnitude of each variable.
+    h_x = epsilon * np.maximum(1.0, np.abs(x))
+    h_u = epsilon * np.maximum(1.0, np.abs(u))
+
+    # Stack the 2(n+m) perturbed copies of every point along a new axis: rows
+    # [0, n) perturb x by +h, [n, 2n) by -h, then likewise for u.
+    num = 2 * (n + m)
+    X = np.repeat(x[..., None, :], num, axis=-2)
+    U = np.repeat(u[..., None, :], num, axis=-2)
+    i_x = np.arange(n)
+    i_u = np.arange(m)
+    X[..., i_x, i_x] += h_x
+    X[..., n + i_x, i_x] -= h_x
+    U[..., 2 * n + i_u, i_u] += h_u
+    U[..., 2 * n + m + i_u, i_u] -= h_u
+
+    F = f(X, U)
+    # (..., n_out, n) and (..., n_out, m) Jacobians, one column per variable.
+    A = np.swapaxes((F[..., :n, :] - F[..., n:2 * n, :]) / (2 * h_x[..., :, None]), -1, -2)
+    B = np.swapaxes((F[..., 2 * n:2 * n + m, :] - F[..., 2 * n + m:, :])
+                    / (2 * h_u[..., :, None]), -1, -2)
+    return A, B
@@ -2,19 +2,32 @@
 example.
 """
 
+from math import factorial
+from typing import Optional, Tuple
+
 import numpy as np
 
 from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.state_layout import StateLayout
 
 class BoxDynamics(DynamicsModel):
     """Implementing dynamics model for a box being pushed on a table with
     surface friction.
     """
 
+    state_layout = StateLayout(("p", 2, ["px (meters)", "py (meters)"]),
+                               ("v", 2, ["vx (m/s)", "vy (m/s)"]))
+    control_layout = StateLayout(("f", 2, ["fx (N)", "fy (N)"]))
+    positions = state_layout["p"]
+    velocities = state_layout["v"]
+
     def __init__(self, dt=0.01,
                  box_mass=1.0,
                  surface_friction_coef=0.1,
-                 gravity=9.81):
+                 gravity=9.81,
+                 integrator="rk4",
+                 backend="numpy",
+                 precision=None):
         """Initialize the box dynamics model with the box_mass and surface
         _surface_friction_coef parameters.
 
@@ -25,39 +38,60 @@ class BoxDynamics(DynamicsModel):
             Defaults to 0.1.
             gravity (float, optional): Acceleration due to gravity. Defaults to
             9.81.
+            integrator (str, optional): Name of the integrator used by x_k_1.
+            Defaults to "rk4".
+            backend (str, optional): "numpy" or "numba" (see
+            dynamics_sim.jit). Defaults to "numpy".
+            precision (str, optional): "float32" or "float64" (see
+            dynamics_sim.precision). Defaults to None (any).
         """
-        super().__init__(dt=dt)
+        super().__init__(dt=dt, integrator=integrator, backend=backend, precision=precision)
         self._box_mass = box_mass
         self._surface_friction_coef = surface_friction_coef
         self._gravity = gravity
 
-    def x_dot_k_1(self, x_k: np.ndarray, u_k: np.ndarray) -> np.ndarray:
+    def x_dot_k_1(self,
+                  x_k: np.ndarray,
+                  u_k: np.ndarray,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
         """Returns xdot at timestep k+1 given the current state x_k and control
         input u_k.
 
+        Both x_k and u_k may be batched along their leading dimensions, i.e.,
+        x_k can be a single (4,) state or an (N, 4) array of N independent
+        environments, with u_k a matching (2,) or (N, 2) array.
+
         Args:
             x_k (np.ndarray): The state of the system at timestep k. 
             u_k (np.ndarray): The control value to command at timestep k.
+            out (Optional[np.ndarray], optional): Array to write x_dot into.
+            Defaults to None.
 
         Returns:
             np.ndarray: The instantaneous rate of change of the state (x_dot) at
-            timestep k.
+            timestep k. Same shape as x_k.
         """
-        # Unpack state
-        p_x, p_y, v_x, v_y = x_k
+        # Unpack state into zero-copy views. Indexing the last axis (rather
+        # than tuple-unpacking) keeps this working for batched states too.
+        p, v = self.state_layout.views(x_k)
+        v_x = v[..., 0]
         # Unpack control input
-        f_x, f_y = u_k
+        f_x = u_k[..., 0]
+        f_y = u_k[..., 1]
+
+        out = self.derivative_buffer(x_k, u_k, out)
+        p_dot, v_dot = self.state_layout.views(out)
 
         # Compute acceleration (the core of the dynamics model / equations).
         # TODO: Update the dynamics for acceleration in the x direction so that
         # the kinetic (sliding) friction is ONLY "on" when the box is moving.
         # The current implementation has the kinetic friction "on" even when
         # the box is at rest.
-        if v_x > 0.0:
-            a_x = f_x - self._surface_friction_coef * (self._box_mass * self._gravity + -1 * f_y)
-        else:
-            a_x = f_x
-        a_y = 0
+        # NOTE: The friction branch is evaluated as a masked array operation so
+        # that every environment in a batch is stepped in a single call.
+        friction = self._surface_friction_coef * (self._box_mass * self._gravity + -1 * f_y)
+        v_dot[..., 0] = np.where(v_x > 0.0, f_x - friction, f_x)
+        v_dot[..., 1] = 0.0
 
         # Problem: the friction force should only slow down the box to a stop
         # (I.e., cause an acceleration in the direction it is facing). It does
@@ -65,4 +99,60 @@ class BoxDynamics(DynamicsModel):
         # friction force should not cause the box to move in the opposite
         # direction. How can we fix this?
 
-        return np.array([v_x, v_y, a_x, a_y])
+        p_dot[...] = v
+        return out
+
+    @staticmethod
+    def x_dot_kernel(x: np.ndarray, u: np.ndarray, params: tuple, out: np.ndarray):
+        """Scalar version of x_dot_k_1 for a single (4,) state, compiled by the
+        numba backend. Must be kept in sync with x_dot_k_1.
+        """
+        box_mass, surface_friction_coef, gravity = params
+        friction = surface_friction_coef * (box_mass * gravity - u[1])
+        out[0] = x[2]
+        out[1] = x[3]
+        out[2] = u[0] - friction if x[2] > 0.0 else u[0]
+        out[3] = 0.0
+
+    def kernel_parameters(self) -> tuple:
+        return (self._box_mass, self._surface_friction_coef, self._gravity)
+
+    def jacobians(self, x_k: np.ndarray, u_k: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Analytic Jacobians A = dx_k+1/dx_k and B = dx_k+1/du_k of x_k_1.
+
+        With the friction mode (whether v_x > 0) held fixed, the box dynamics
+        are affine, x_dot = A_c x + B_c u + c. Explicit Euler and RK4 applied to
+        affine dynamics reproduce the Taylor series of the matrix exponential
+        up to their order p, so
+            A = sum_{j=0..p} (dt A_c)^j / j!
+            B = sum_{j=1..p} dt^j A_c^(j-1) B_c / j!
+        Other integrators fall back to finite differences.
+
+        Args:
+            x_k (np.ndarray): The (..., 4) state(s) to linearize about.
+            u_k (np.ndarray): The (..., 2) control input(s).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (..., 4, 4) A and (..., 4, 2) B
+            matrices.
+        """
+        order = {"euler": 1, "rk4": 4}.get(self.integrator.name)
+        if order is None:
+            return super().jacobians(x_k, u_k)
+
+        batch_shape = np.broadcast_shapes(x_k.shape[:-1], u_k.shape[:-1])
+        A_c = np.zeros((4, 4))
+        A_c[self.positions, self.velocities] = np.eye(2)
+        B_c = np.zeros(batch_shape + (4, 2))
+        B_c[..., 2, 0] = 1.0
+        B_c[..., 2, 1] = np.where(x_k[..., 2] > 0.0, self._surface_friction_coef, 0.0)
+
+        A = np.broadcast_to(np.eye(4), batch_shape + (4, 4)).copy()
+        B = np.zeros(batch_shape + (4, 2))
+        A_c_power = np.eye(4)
+        for j in range(1, order + 1):
+            # B accumulates A_c^(j-1) B_c before A_c_power advances to A_c^j.
+            B += self.dt**j / factorial(j) * (A_c_power @ B_c)
+            A_c_power = A_c_power @ A_c
+            A += self.dt**j / factorial(j) * A_c_power
+        return A, B
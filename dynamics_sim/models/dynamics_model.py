@@ -7,47 +7,406 @@
 # example--or if the user wishes for a different integrator to be used for the
 # simulation.
 
+import copy
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
 import numpy as np
 
+from dynamics_sim.integrators import (DenseSolution, DormandPrince45, Integrator,
+                                      get_integrator, state_dtype)
+from dynamics_sim.linearization import finite_difference_jacobians
+from dynamics_sim.precision import check_dtype, resolve_dtype
+from dynamics_sim.state_layout import StateLayout
+
 class DynamicsModel:
 
-    def __init__(self, dt=0.01):
-        """_summary_
+    # Names and labels of the parts of the state and control vectors. Declared
+    # once per model and shared by the dynamics, plotting, and logging.
+    state_layout: Optional[StateLayout] = None
+    control_layout: Optional[StateLayout] = None
+
+    # Slices of the state vector holding the "position" and "velocity" parts of
+    # the state. Subclasses set these to opt in to the partitioned (symplectic)
+    # integrators, which update the two parts in separate stages.
+    positions: Optional[slice] = None
+    velocities: Optional[slice] = None
+
+    # Maximum number of (x, u) points whose linearization is kept by linearize.
+    linearization_cache_size = 128
+
+    # Scalar kernel computing the derivative of a single state, compiled by
+    # the numba backend (see dynamics_sim.jit). Subclasses set this (and
+    # implement kernel_parameters) to opt in.
+    x_dot_kernel = None
+
+    def __init__(self,
+                 dt=0.01,
+                 integrator: Union[str, Integrator] = "rk4",
+                 backend: str = "numpy",
+                 precision: Optional[str] = None):
+        """Initialize the dynamics model.
 
         Args:
             dt (float, optional): Simulation timestep length. Defaults to 0.01.
+            integrator (Union[str, Integrator], optional): Name of a registered
+            integrator (see dynamics_sim.integrators) or an Integrator
+            instance used by x_k_1. Defaults to "rk4".
+            backend (str, optional): "numpy", or "numba" to step with a
+            compiled kernel fusing x_dot_k_1 and the integrator (see
+            dynamics_sim.jit). Defaults to "numpy".
+            precision (Optional[str], optional): "float32" or "float64" to
+            only step states of that dtype (see dynamics_sim.precision).
+            Defaults to None (step states of any dtype, in that dtype).
         """
         self.dt = dt
+        self._jit_step = None
+        self.integrator = integrator
+        self.backend = backend
+        self.precision = precision
+        self._linearization_cache = OrderedDict()
+
+    def parameters(self) -> dict:
+        """Return the model's parameters, keyed by their constructor argument
+        names (a leading underscore on the attribute name is dropped).
+
+        Returns:
+            dict: The scalar, string, and array attributes of the model, plus
+            the name of its integrator.
+        """
+        params = {name.lstrip("_"): value for name, value in vars(self).items()
+                  if isinstance(value, (int, float, str, np.ndarray, np.number))}
+        params["integrator"] = self._integrator.name
+        return params
+
+    @property
+    def integrator(self) -> Integrator:
+        """The integrator used by x_k_1 to discretize x_dot_k_1."""
+        return self._integrator
+
+    @integrator.setter
+    def integrator(self, integrator: Union[str, Integrator]):
+        if isinstance(integrator, str):
+            integrator = get_integrator(integrator)
+        self._integrator = integrator
+        if getattr(self, "_backend", None) == "numba":
+            self.backend = "numba"
+
+    @property
+    def backend(self) -> str:
+        """The backend used by x_k_1, "numpy" or "numba"."""
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: str):
+        if backend not in ("numpy", "numba"):
+            raise ValueError(f"Unknown backend '{backend}'")
+        self._backend = backend
+        self._jit_step = None
+        if backend == "numba":
+            # Imported here so that Numba is only loaded when requested.
+            from dynamics_sim.jit import compile_step
+            self._jit_step = compile_step(self)
+
+    @property
+    def precision(self) -> Optional[str]:
+        """The precision x_k_1 steps states in, or None for any."""
+        return self._precision
+
+    @precision.setter
+    def precision(self, precision: Optional[str]):
+        self._dtype = None if precision is None else resolve_dtype(precision)
+        self._precision = None if precision is None else self._dtype.name
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        self._invalidate()
+
+    def __delattr__(self, name):
+        super().__delattr__(name)
+        self._invalidate()
+
+    def _invalidate(self):
+        """Drop everything derived from the model's attributes after any of
+        them changes (a parameter, the precision, or an instrumented method):
+        the reduced precision copy and the cached linearizations.
+        """
+        self.__dict__.pop("_reduced_model", None)
+        cache = self.__dict__.get("_linearization_cache")
+        if cache:
+            cache.clear()
+
+    def select_runs(self, index: np.ndarray, num_runs: int) -> "DynamicsModel":
+        """Return the model of a subset of the runs of a batch: a shallow copy
+        with its per-run (num_runs,) array parameters (see dynamics_sim.sweep)
+        sliced to index, or the model itself if it has none.
+
+        Args:
+            index (np.ndarray): Indices of the selected runs.
+            num_runs (int): Number of runs N in the batch.
+
+        Returns:
+            DynamicsModel: The model of the selected runs.
+        """
+        sliced = {name: value[index] for name, value in vars(self).items()
+                  if isinstance(value, np.ndarray) and value.shape == (num_runs,)}
+        if not sliced:
+            return self
+        selected = self._copy()
+        selected.__dict__.update(sliced)
+        return selected
+
+    def _copy(self) -> "DynamicsModel":
+        """Return a shallow copy of the model that shares nothing derived
+        from its attributes, so that changing either does not affect the
+        other's cached linearizations or reduced precision copy.
+        """
+        copied = copy.copy(self)
+        copied.__dict__.pop("_reduced_model", None)
+        copied.__dict__["_linearization_cache"] = OrderedDict()
+        return copied
+
+    def _check_precision(self,
+                         x_k: np.ndarray,
+                         u_k: np.ndarray,
+                         out: Optional[np.ndarray]) -> np.ndarray:
+        """Check that x_k (and out) have the model's precision, and return
+        u_k cast down to it.
+        """
+        dtype = self._dtype
+        check_dtype("x_k", x_k, dtype)
+        if out is not None:
+            check_dtype("out", out, dtype)
+        return np.asarray(u_k, dtype=dtype)
+
+    def _reduced_precision_model(self) -> "DynamicsModel":
+        """Return the model whose x_dot_k_1 is integrated in the model's
+        precision: a shallow copy with its floating point array parameters
+        (e.g., the (N,) arrays of a sweep) cast down, so that they do not
+        upcast the dynamics, or the model itself if none need casting.
+
+        The copy is built once and kept until an attribute of the model
+        changes, and the model's own parameters are never modified.
+        """
+        reduced = self.__dict__.get("_reduced_model")
+        if reduced is None:
+            dtype = self._dtype
+            cast = {name: value.astype(dtype) for name, value in vars(self).items()
+                    if isinstance(value, (np.ndarray, np.floating))
+                    and value.dtype.kind == "f" and value.dtype != dtype}
+            reduced = self
+            if cast:
+                reduced = copy.copy(self)
+                reduced.__dict__.update(cast)
+            # Set directly, as setting it as an attribute would invalidate it.
+            self.__dict__["_reduced_model"] = reduced
+        return reduced
+
+    def kernel_parameters(self) -> tuple:
+        """Return the scalar parameters passed to x_dot_kernel by the numba
+        backend.
+        """
+        raise NotImplementedError
+
+    def fuses_rollouts(self) -> bool:
+        """Return whether x_k_1 is exactly the integrator step of
+        x_dot_kernel, so that the numba backend may run open-loop rollouts
+        (see dynamics_sim.jit.rollout) in a single compiled loop instead of
+        stepping with x_k_1. Subclasses that override x_k_1 must override
+        this too if any of their modes qualify.
+        """
+        return type(self).x_k_1 is DynamicsModel.x_k_1
     
-    def x_dot_k_1(self, x_k: np.ndarray, u_k: np.ndarray) -> np.ndarray:
+    def x_dot_k_1(self,
+                  x_k: np.ndarray,
+                  u_k: np.ndarray,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
         """Returns xdot at timestep k+1 given the current state x_k and control
         input u_k. This is to be implemented by each specific dynamics model
         subclass.
 
+        Implementations should operate on the last axis of x_k and u_k so that
+        a batch of N environments can be passed in as (N, n) states and (N, m)
+        (or broadcastable (m,)) controls, returning an (N, n) array. Scalar
+        model parameters given as (N,) arrays should broadcast the same way,
+        one value per environment (see dynamics_sim.sweep). They
+        should write the derivative into out when it is given (see
+        derivative_buffer) so that integrators can reuse their buffers.
+
         Args:
             x_k (np.ndarray): The state of the system at timestep k. 
             u_k (np.ndarray): The control value to command at timestep k.
+            out (Optional[np.ndarray], optional): Array to write x_dot into.
+            Never aliases x_k. Defaults to None.
 
         Returns:
             np.ndarray: The instantaneous rate of change of the state (x_dot) at
            timestep k.
         """
         raise NotImplementedError
-    
-    def x_k_1(self, x_k: np.ndarray, u_k: np.ndarray) -> np.ndarray:
-        """Compute RK4 approximation of x_k+1 using the dynamics function
-        x_dot_k_1, given the current state x_k, the control input u_k, and the
-        timestep length dt.
+
+    def derivative_buffer(self,
+                          x_k: np.ndarray,
+                          u_k: np.ndarray,
+                          out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return out if given, otherwise allocate an array x_dot_k_1 can
+        write the derivative of x_k into.
+
+        Args:
+            x_k (np.ndarray): The state of the system at timestep k.
+            u_k (np.ndarray): The control value to command at timestep k.
+            out (Optional[np.ndarray], optional): A caller-provided buffer.
+            Defaults to None.
+
+        Returns:
+            np.ndarray: An array of the same shape as x_k.
+        """
+        if out is None:
+            out = np.empty(x_k.shape, dtype=state_dtype(x_k, u_k))
+        return out
+
+    def x_k_1(self,
+              x_k: np.ndarray,
+              u_k: np.ndarray,
+              out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute an approximation of x_k+1 by integrating the dynamics
+        function x_dot_k_1 over one timestep of length dt, given the current
+        state x_k and the control input u_k. The integration scheme is the
+        model's integrator (RK4 by default).
+
+        All environments in a batch are stepped together in a single call, so
+        the cost of the Python-level integrator stages is paid once per batch
+        rather than once per environment.
+
+        Args:
+            x_k (np.ndarray): The state at timestep k, either (n,) or a batch
+            of states (N, n).
+            u_k (np.ndarray): The control input at timestep k, either (m,) or
+            a batch of controls (N, m).
+            out (Optional[np.ndarray], optional): Array to write the result
+            into. Defaults to None (allocate a new array).
+
+        Returns:
+            np.ndarray: The state at timestep k+1, same shape as x_k.
+        """
+        model = self
+        if self._dtype is not None:
+            u_k = self._check_precision(x_k, u_k, out)
+            model = self._reduced_precision_model()
+        if self._jit_step is not None:
+            x_k_1 = self._jit_step(model, x_k, u_k, out)
+            if x_k_1 is not None:
+                return x_k_1
+        return self._integrator.step(model, x_k, u_k, model.dt, out=out)
+
+    def propagate(self,
+                  x_0: np.ndarray,
+                  u_k: np.ndarray,
+                  t_final: float,
+                  rtol: float = 1e-6,
+                  atol: float = 1e-9) -> DenseSolution:
+        """Propagate the continuous-time dynamics x_dot_k_1 from x_0 over
+        [0, t_final] with the adaptive Dormand-Prince 5(4) integrator, holding
+        the control input constant. Unlike x_k_1, the step size is not tied to
+        dt: it grows as large as the tolerances allow, which makes long
+        propagations of smooth dynamics (e.g. orbits) far cheaper.
+
+        As with x_k_1, a model with a precision only propagates states of its
+        precision, and does so in that precision.
+
+        Args:
+            x_0 (np.ndarray): The initial state, (n,) or (N, n).
+            u_k (np.ndarray): The control input held over the interval.
+            t_final (float): Length of the propagation in seconds.
+            rtol (float, optional): Relative tolerance. Defaults to 1e-6.
+            atol (float, optional): Absolute tolerance. Defaults to 1e-9.
+
+        Returns:
+            DenseSolution: Callable solution that can be sampled at arbitrary
+            times in [0, t_final].
+        """
+        model = self
+        if self._dtype is not None:
+            x_0 = np.asarray(x_0)
+            u_k = self._check_precision(x_0, u_k, None)
+            model = self._reduced_precision_model()
+        return DormandPrince45(rtol=rtol, atol=atol).integrate(model, x_0, u_k, t_final)
+
+    def jacobians(self, x_k: np.ndarray, u_k: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the Jacobians A = dx_k+1/dx_k and B = dx_k+1/du_k of the
+        discrete-time dynamics x_k_1.
+
+        Subclasses with analytic Jacobians should override this. The default
+        implementation uses central finite differences, evaluating all of the
+        perturbed states of every point in a single batched x_k_1 call.
+
+        Args:
+            x_k (np.ndarray): The (..., n) state(s) to linearize about.
+            u_k (np.ndarray): The (..., m) control input(s) to linearize about.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (..., n, n) A and (..., n, m) B
+            matrices.
+        """
+        return finite_difference_jacobians(self.x_k_1, x_k, u_k)
+
+    def linearize(self, x_k: np.ndarray, u_k: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Linearize the discrete-time dynamics x_k_1 about a single point or
+        along a whole trajectory.
+
+        Passing (T, n) states and (T, m) controls returns the (T, n, n) and
+        (T, n, m) Jacobians of every step of the trajectory from one call to
+        jacobians. Results are cached per (x_k, u_k), so re-linearizing the
+        same point (e.g., between iterations of an iLQR solve that did not
+        change part of the trajectory) is free. The returned arrays are
+        read-only, as they may be shared with the cache. Setting any attribute
+        of the model (e.g., a parameter) clears the cache, but parameters
+        modified in place (e.g., model.mu[0] = ...) require a call to
+        clear_linearization_cache. A model with a precision only linearizes
+        about states of its precision, and returns Jacobians in it.
 
         Args:
-            x_k (np.ndarray): 
-            u_k (np.ndarray): _description_
+            x_k (np.ndarray): The (n,) or (T, n) state(s) to linearize about.
+            u_k (np.ndarray): The (m,) or (T, m) control input(s).
 
         Returns:
-            np.ndarray: _description_
+            Tuple[np.ndarray, np.ndarray]: The A and B matrices.
+        """
+        x_k = np.ascontiguousarray(x_k)
+        if self._dtype is not None:
+            u_k = self._check_precision(x_k, u_k, None)
+        u_k = np.ascontiguousarray(u_k)
+        # The integrator is keyed on its type and settings rather than its
+        # id, which may be reused once an integrator is garbage collected.
+        integrator = (type(self._integrator).__qualname__,
+                      repr(sorted((name, value) for name, value in vars(self._integrator).items()
+                                  if not name.startswith("_"))))
+        key = (self.dt, integrator, x_k.shape, x_k.dtype.str, x_k.tobytes(),
+               u_k.shape, u_k.dtype.str, u_k.tobytes())
+        cache = self._linearization_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        if self._dtype is None:
+            A, B = self.jacobians(x_k, u_k)
+        else:
+            # Differences of reduced precision steps lose small perturbations
+            # to rounding (e.g., of float32 positions in orbit), so the
+            # Jacobians are computed from the float64 dynamics and cast down.
+            full = self._copy()
+            full.precision = None
+            A, B = full.jacobians(x_k.astype(np.float64), u_k.astype(np.float64))
+            A, B = A.astype(self._dtype), B.astype(self._dtype)
+        A.flags.writeable = False
+        B.flags.writeable = False
+        cache[key] = (A, B)
+        if len(cache) > self.linearization_cache_size:
+            cache.popitem(last=False)
+        return A, B
+
+    def clear_linearization_cache(self):
+        """Drop all cached linearizations, e.g., after changing the model's
+        parameters.
         """
-        k1 = self.x_dot_k_1(x_k, u_k)
-        k2 = self.x_dot_k_1(x_k + 0.5 * self.dt * k1, u_k)
-        k3 = self.x_dot_k_1(x_k + 0.5 * self.dt * k2, u_k)
-        k4 = self.x_dot_k_1(x_k + self.dt * k3, u_k)
-        return x_k + self.dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
\ No newline at end of file
+        self._linearization_cache.clear()
@@ -2,10 +2,13 @@
 (LEO).
 """
 
+from typing import Optional
+
 import numpy as np
 import quatmath as qm
 
 from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.state_layout import StateLayout
 
 
 class GravityDynamics(DynamicsModel):
@@ -21,48 +24,155 @@ class GravityDynamics(DynamicsModel):
         w_B: Angular velocity of the satellite body frame relative to the ECI.
              Vector in R3.
     """
-    def __init__(self, mu=3.986e14, R=6371e3):
+    state_layout = StateLayout(
+        ("r_N", 3, ["r_N x (m)", "r_N y (m)", "r_N z (m)"]),
+        ("q_N_B", 4, ["q_N_B w", "q_N_B x", "q_N_B y", "q_N_B z"]),
+        ("v_N", 3, ["v_N x (m/s)", "v_N y (m/s)", "v_N z (m/s)"]),
+        ("w_B", 3, ["w_B x (rad/s)", "w_B y (rad/s)", "w_B z (rad/s)"]))
+    control_layout = StateLayout(("m", 3, ["m x (N m)", "m y (N m)", "m z (N m)"]))
+    # [r_N, q_N_B] are integrated as the "positions" and [v_N, w_B] as the
+    # "velocities" by the partitioned (symplectic) integrators.
+    positions = state_layout.span("r_N", "q_N_B")
+    velocities = state_layout.span("v_N", "w_B")
+
+    def __init__(self, mu=3.986e14, R=6371e3, dt=0.01, integrator="rk4",
+                 attitude="additive", backend="numpy", precision=None):
         """Initialize the GravityDynamics class.
 
         Args:
             mu (float): Gravitational parameter of the Earth in m^3/s^2.
             R (float): Radius of the Earth in meters.
+            dt (float, optional): Simulation timestep length. Defaults to 0.01.
+            integrator (str, optional): Name of the integrator used by x_k_1.
+            Symplectic integrators such as "velocity_verlet" keep orbital
+            energy bounded at much larger timesteps. Defaults to "rk4".
+            attitude (str, optional): How x_k_1 propagates q_N_B. "additive"
+            integrates q_dot with the integrator like the rest of the state,
+            which lets the quaternion drift off the unit sphere. "lie"
+            advances it on the unit sphere with the quaternion exponential
+            map, which preserves its norm at any timestep. Defaults to
+            "additive".
+            backend (str, optional): "numpy" or "numba" (see
+            dynamics_sim.jit). Defaults to "numpy".
+            precision (str, optional): "float32" or "float64" (see
+            dynamics_sim.precision). Defaults to None (any).
         """
-        super().__init__()
+        super().__init__(dt=dt, integrator=integrator, backend=backend, precision=precision)
+        if attitude not in ("additive", "lie"):
+            raise ValueError(f"Unknown attitude propagation mode '{attitude}'")
+        self.attitude = attitude
         self.mu = mu
         self.R = R
 
-    def x_dot_k_1(self, x_k: np.ndarray, u_k: np.ndarray) -> np.ndarray:
+    def x_dot_k_1(self,
+                  x_k: np.ndarray,
+                  u_k: np.ndarray,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
         """Returns xdot at timestep k+1 given the current state x_k and control
         input u_k.
 
+        x_k may be a single (13,) state or an (N, 13) batch of states.
+
         Args:
             x_k (np.ndarray): The state of the system at timestep k. 
             u_k (np.ndarray): The control value to command at timestep k. Not
                               used for now.
+            out (Optional[np.ndarray], optional): Array to write x_dot into.
+            Defaults to None.
 
         Returns:
             np.ndarray: The instantaneous rate of change of the state (x_dot) at
-            timestep k.
+            timestep k. Same shape as x_k.
         """
-        # Unpack state
-        r_N, q_N_B, v_N, w_B = x_k
+        # Unpack state into zero-copy views along the last axis so that
+        # batched states work too.
+        r_N, q_N_B, v_N, w_B = self.state_layout.views(x_k)
         # Unpack control input
         m = u_k
 
+        # Each part of the derivative is written straight into its slice of
+        # out rather than concatenated together at the end.
+        out = self.derivative_buffer(x_k, u_k, out)
+        r_dot, q_dot, v_dot, w_dot = self.state_layout.views(out)
+
         # Compute acceleration (the core of the dynamics model / equations).
         # Compute the acceleration due to gravity
-        a_gravity = -self.mu / (np.linalg.norm(r_N)**3) * r_N
-
-        # Compute the total acceleration
-        a_N = a_gravity
+        # mu may be an (N,) array of per-environment parameters, so give it
+        # a trailing axis to broadcast against the (N, 1) norms. It is cast to
+        # the state's dtype, as a float64 mu would upcast float32 states.
+        r_norm = np.linalg.norm(r_N, axis=-1, keepdims=True)
+        mu = np.expand_dims(np.asarray(self.mu, dtype=out.dtype), -1)
+        np.multiply(r_N, -mu / (r_norm**3), out=v_dot)
 
         # Compute the rate of change of the state
-        r_dot = v_N
-        q_dot = 0.5 * qm.Q(q_N_B) @ w_B
-        v_dot = a_N
-        w_dot = 0.0 # Not sure how to compute this next--how do we compute the inertia matrix? 
+        r_dot[...] = v_N
+        # q_dot = 0.5 * L(q) @ hat(w) = 0.5 * G(q) @ w, evaluated with the
+        # closed-form (batched) quaternion product.
+        q_dot[...] = 0.5 * qm.compose(q_N_B, qm.hat(w_B))
+        w_dot[...] = 0.0 # Not sure how to compute this next--how do we compute the inertia matrix? 
         # https://ocw.mit.edu/courses/16-07-dynamics-fall-2009/dd277ec654440f4c2b5b07d6c286c3fd_MIT16_07F09_Lec26.pdf
         # maybe this will help?
 
-        return np.concatenate([r_dot, q_dot, v_dot, w_dot])
\ No newline at end of file
+        return out
+
+    @staticmethod
+    def x_dot_kernel(x: np.ndarray, u: np.ndarray, params: tuple, out: np.ndarray):
+        """Scalar version of x_dot_k_1 for a single (13,) state, compiled by
+        the numba backend. Must be kept in sync with x_dot_k_1.
+        """
+        mu = params[0]
+        r_norm = np.sqrt(x[0] * x[0] + x[1] * x[1] + x[2] * x[2])
+        scale = -mu / (r_norm * r_norm * r_norm)
+        for i in range(3):
+            out[i] = x[7 + i]
+            out[7 + i] = scale * x[i]
+            out[10 + i] = 0.0
+        # q_dot = 0.5 * q (*) [0, w] = 0.5 * [-q_v . w, q_w w + q_v x w]
+        qw, qx, qy, qz = x[3], x[4], x[5], x[6]
+        wx, wy, wz = x[10], x[11], x[12]
+        out[3] = -0.5 * (qx * wx + qy * wy + qz * wz)
+        out[4] = 0.5 * (qw * wx + qy * wz - qz * wy)
+        out[5] = 0.5 * (qw * wy + qz * wx - qx * wz)
+        out[6] = 0.5 * (qw * wz + qx * wy - qy * wx)
+
+    def kernel_parameters(self) -> tuple:
+        return (self.mu,)
+
+    def fuses_rollouts(self) -> bool:
+        # The "lie" mode advances the attitude outside of the kernel.
+        return self.attitude == "additive"
+
+    def x_k_1(self,
+              x_k: np.ndarray,
+              u_k: np.ndarray,
+              out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute x_k+1 given the current state x_k and control input u_k.
+
+        In "lie" attitude mode, the position, velocity and angular velocity
+        are integrated with the model's integrator as usual, but the attitude
+        is advanced with the exponential map,
+            q_k+1 = q_k (*) exp(dt * w_mid),
+        where w_mid is the average of the angular velocity at the start and
+        end of the step. This keeps q_N_B on the unit sphere exactly (up to
+        rounding) for any number of bodies and any timestep.
+
+        Args:
+            x_k (np.ndarray): The state at timestep k, (13,) or (N, 13).
+            u_k (np.ndarray): The control input at timestep k.
+            out (Optional[np.ndarray], optional): Array to write the result
+            into. Defaults to None.
+
+        Returns:
+            np.ndarray: The state at timestep k+1.
+        """
+        if self.attitude == "additive":
+            return super().x_k_1(x_k, u_k, out=out)
+
+        # Copy the attitude and angular velocity first, as out may alias x_k.
+        layout = self.state_layout
+        q_k = np.array(layout.view(x_k, "q_N_B"))
+        w_k = np.array(layout.view(x_k, "w_B"))
+        out = super().x_k_1(x_k, u_k, out=out)
+        w_mid = 0.5 * (w_k + layout.view(out, "w_B"))
+        layout.view(out, "q_N_B")[...] = qm.compose(q_k, qm.exp(self.dt * w_mid))
+        return out
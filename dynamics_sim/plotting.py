@@ -1,39 +1,185 @@
 """Utility functions for plotting simulation results"""
 
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Sequence, Union
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+from dynamics_sim.state_layout import StateLayout
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+def _import_plotly():
+    """Import plotly on first use rather than with this module, so that
+    headless jobs never pay for it (and need not have it installed).
+    """
+    try:
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+    except ImportError as e:
+        raise ImportError("Plotting requires plotly: pip install plotly") from e
+    return go, make_subplots
+
+def lttb(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """Select the indices of a series to keep with the Largest-Triangle-Three-
+    Buckets algorithm, which preserves the visual shape of the series (peaks,
+    troughs, and edges) far better than taking every k-th sample.
+
+    Args:
+        x (np.ndarray): The (T,) x values of the series.
+        y (np.ndarray): The (T,) y values of the series.
+        num_points (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The sorted indices of the points to keep.
+    """
+    n = len(y)
+    if num_points >= n or num_points < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept, and the points in between
+    # are split into num_points - 2 buckets that each contribute one point.
+    edges = np.linspace(1, n - 1, num_points - 1).astype(int)
+    selected = np.empty(num_points, dtype=int)
+    selected[0] = a = 0
+    for i in range(num_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start = stop
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        # Twice the area of the triangle formed by the previously selected
+        # point, each candidate in this bucket, and the next bucket's average.
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+def minmax_decimate(y: np.ndarray, num_points: int) -> np.ndarray:
+    """Select the indices of a series to keep by taking the minimum and the
+    maximum of each of num_points / 2 equal buckets, so no extreme value is
+    ever dropped.
+
+    Args:
+        y (np.ndarray): The (T,) series.
+        num_points (int): The (approximate) number of points to keep.
+
+    Returns:
+        np.ndarray: The sorted, unique indices of the points to keep.
+    """
+    n = len(y)
+    num_buckets = num_points // 2
+    if num_buckets < 1 or num_points >= n:
+        return np.arange(n)
+    bucket_size = -(-n // num_buckets)
+    padded = np.concatenate([y, np.full(num_buckets * bucket_size - n, y[-1])])
+    buckets = padded.reshape(num_buckets, bucket_size)
+    offsets = np.arange(num_buckets) * bucket_size
+    indices = np.concatenate([offsets + buckets.argmin(axis=1),
+                              offsets + buckets.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.minimum(indices, n - 1))
+
+def _bucket_edges(n: int, num_points: Optional[int]) -> np.ndarray:
+    num_buckets = n if num_points is None else min(n, num_points)
+    return np.unique(np.linspace(0, n, num_buckets + 1).astype(int))
 
 # Write a function that creates a grid of plotly line plots, where each plot is
 # one of the states in the states array. The x-axis should be the timestep and
 # the y-axis should be the corresponding value of the state.
 def plot_states(states: np.ndarray,
-                state_names: List[str],
-                num_columns: Optional[int] = 2) -> go.Figure:
+                state_names: Union[List[str], StateLayout],
+                num_columns: Optional[int] = 2,
+                dt: Optional[float] = None,
+                max_points: Optional[int] = None,
+                downsample: str = "lttb",
+                webgl: Optional[bool] = None,
+                percentiles: Sequence[float] = (5, 25, 50, 75, 95)) -> "go.Figure":
     """Create a grid of plotly line plots, where each plot is one of the states
     in the states array. The x-axis should be the timestep and the y-axis should
     be the corresponding value of the state.
 
+    For long (e.g., 1e6 step) or Monte Carlo results, pass max_points to
+    downsample every series before it is embedded in the figure, and pass a
+    batch of runs as a (T, N, n) array to draw percentile bands across the runs
+    instead of one trace per run.
+
     Args:
         states (np.ndarray): A 2D numpy array where each row is a timestep and
-        each column is a state value.
-        state_names (List[str]): A list of strings where each string is the name
-        of the corresponding state.
+        each column is a state value, or a (T, N, n) array of N runs.
+        state_names (Union[List[str], StateLayout]): A list of strings where
+        each string is the name of the corresponding state, or the model's
+        StateLayout to take the names from.
         num_columns (Optional[int], optional): Number of columns in the grid.
         Defaults to 2.
+        dt (Optional[float], optional): Timestep length. If given, the x-axis
+        is time in seconds instead of the timestep index. Defaults to None.
+        max_points (Optional[int], optional): Maximum number of points plotted
+        per series. Defaults to None (plot every timestep).
+        downsample (str, optional): Downsampling algorithm for single runs,
+        "lttb" or "minmax". Defaults to "lttb".
+        webgl (Optional[bool], optional): Whether to use WebGL (Scattergl)
+        traces instead of SVG. Defaults to None (WebGL whenever max_points is
+        given or a batch of runs is plotted).
+        percentiles (Sequence[float], optional): Percentiles across runs drawn
+        for a batch of runs, as symmetric pairs around an optional median.
+        Defaults to (5, 25, 50, 75, 95).
 
     Returns:
         go.Figure: A plotly figure object.
     """
+    go, make_subplots = _import_plotly()
+    if isinstance(state_names, StateLayout):
+        state_names = state_names.labels
+    if downsample not in ("lttb", "minmax"):
+        raise ValueError(f"Unknown downsampling algorithm '{downsample}'")
+    batched = states.ndim == 3
+    if webgl is None:
+        webgl = max_points is not None or batched
+    scatter = go.Scattergl if webgl else go.Scatter
+
     timesteps = np.arange(0, states.shape[0])
-    num_states = states.shape[1]
-    fig = make_subplots(rows=num_states, cols=num_columns, subplot_titles=state_names)
+    x_values = timesteps if dt is None else timesteps * dt
+    num_states = states.shape[-1]
+    num_rows = -(-num_states // num_columns)
+    fig = make_subplots(rows=num_rows, cols=num_columns, subplot_titles=state_names)
+
+    if batched:
+        bands = np.percentile(states, percentiles, axis=1)
+        edges = _bucket_edges(len(timesteps), max_points)
+        x_bucketed = x_values[edges[:-1]]
+
+    for i in range(num_states):
+        position = dict(row=i // num_columns + 1, col=i % num_columns + 1)
+        if not batched:
+            if max_points is None:
+                keep = timesteps
+            elif downsample == "lttb":
+                keep = lttb(x_values, states[:, i], max_points)
+            else:
+                keep = minmax_decimate(states[:, i], max_points)
+            fig.add_trace(scatter(x=x_values[keep], y=states[keep, i], mode="lines",
+                                  name=state_names[i]), **position)
+            continue
 
-    for i in range(0, num_states, num_columns):
-        for j in range(num_columns):
-            fig.add_trace(go.Scatter(x=timesteps, y=states[:, i+j], mode="lines"), row=i+1, col=j+1)
+        # Each pair of percentiles (outermost first) is drawn as a filled band.
+        # Bands are decimated by taking the envelope of every bucket so that
+        # their extent is preserved.
+        for j in range(len(percentiles) // 2):
+            lower = np.minimum.reduceat(bands[j, :, i], edges[:-1])
+            upper = np.maximum.reduceat(bands[-j - 1, :, i], edges[:-1])
+            name = f"{state_names[i]} p{percentiles[j]:g}-p{percentiles[-j - 1]:g}"
+            fig.add_trace(scatter(x=x_bucketed, y=lower, mode="lines", line=dict(width=0),
+                                  showlegend=False, hoverinfo="skip"), **position)
+            fig.add_trace(scatter(x=x_bucketed, y=upper, mode="lines", line=dict(width=0),
+                                  fill="tonexty", name=name), **position)
+        if len(percentiles) % 2:
+            median = np.add.reduceat(bands[len(percentiles) // 2, :, i], edges[:-1]) \
+                / np.diff(edges)
+            name = f"{state_names[i]} p{percentiles[len(percentiles) // 2]:g}"
+            fig.add_trace(scatter(x=x_bucketed, y=median, mode="lines", name=name), **position)
 
+    if dt is not None:
+        fig.update_xaxes(title_text="time (s)")
     fig.update_layout(showlegend=True, title_text="State Trajectories")
-    return fig
\ No newline at end of file
+    return fig
@@ -0,0 +1,171 @@
+"""Floating point precision of simulations, and a report of the error a
+reduced precision run accumulates.
+
+Batched rollouts of cheap dynamics are bound by memory bandwidth rather than
+arithmetic, so running them in float32 halves their memory and roughly doubles
+their throughput. A model constructed with precision="float32" only steps
+float32 states: it raises a TypeError for states of any other dtype instead of
+silently upcasting them, and casts controls and array-valued parameters down
+to float32. Together with a float32 x_0 (the Simulator, trajectory storage and
+quatmath all keep the dtype of their inputs), the whole pipeline then runs in
+float32.
+
+Whether float32 is accurate enough depends on the model, the timestep and the
+horizon, so drift_report reruns a sample of a batch in float64 and reports how
+far the reduced precision run drifted from it:
+    report = drift_report(BoxDynamics(precision="float32"), controller, x_0, 1000)
+    print(report)
+"""
+
+import copy
+from typing import Optional, Union
+
+import numpy as np
+
+# Names of the supported precisions.
+PRECISIONS = ("float32", "float64")
+
+def resolve_dtype(precision: Union[str, np.dtype, type]) -> np.dtype:
+    """Return the dtype of a precision.
+
+    Args:
+        precision (Union[str, np.dtype, type]): "float32" or "float64", or
+        the equivalent dtype.
+
+    Returns:
+        np.dtype: The dtype.
+    """
+    try:
+        dtype = np.dtype(precision)
+    except TypeError:
+        dtype = None
+    if dtype is None or dtype.name not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Available precisions: "
+                         f"{list(PRECISIONS)}")
+    return dtype
+
+def check_dtype(name: str, array: np.ndarray, dtype: np.dtype):
+    """Raise a TypeError if array does not have the given dtype.
+
+    Args:
+        name (str): Name of the array, for the error message.
+        array (np.ndarray): The array to check.
+        dtype (np.dtype): The expected dtype.
+    """
+    if array.dtype != dtype:
+        raise TypeError(f"{name} has dtype {array.dtype}, expected {dtype}. Cast it "
+                        f"explicitly, e.g., with {name}.astype(np.{dtype.name})")
+
+
+class DriftReport:
+    """Error of a reduced precision run against a float64 reference run of
+    the same sample of initial states.
+
+    Attributes:
+        precision (str): Precision of the checked run.
+        sample (np.ndarray): Indices of the sampled runs in the batch.
+        max_abs_error (np.ndarray): (n,) largest absolute error of each state
+        component over the sample and the horizon.
+        max_rel_error (np.ndarray): (n,) max_abs_error relative to the largest
+        magnitude the component reached in the reference run.
+        drift (np.ndarray): (T,) largest normwise relative error
+        |x_k - x_ref_k| / |x_ref_k| over the sample, at every timestep.
+        labels (Optional[list]): Names of the state components, if the model
+        declares a state layout.
+    """
+
+    def __init__(self,
+                 precision: str,
+                 sample: np.ndarray,
+                 states: np.ndarray,
+                 reference: np.ndarray,
+                 labels: Optional[list] = None):
+        """Compare a (T, S, n) trajectory against its (T, S, n) reference."""
+        self.precision = precision
+        self.sample = sample
+        self.labels = labels
+        error = np.abs(states.astype(np.float64) - reference)
+        tiny = np.finfo(np.float64).tiny
+        self.max_abs_error = error.max(axis=(0, 1))
+        self.max_rel_error = self.max_abs_error / np.maximum(np.abs(reference).max(axis=(0, 1)),
+                                                             tiny)
+        self.drift = (np.linalg.norm(error, axis=-1)
+                      / np.maximum(np.linalg.norm(reference, axis=-1), tiny)).max(axis=-1)
+
+    def within(self, rtol: float) -> bool:
+        """Return whether every component stayed within rtol of the reference
+        (relative to the component's magnitude) over the whole horizon.
+        """
+        return bool(np.all(self.max_rel_error <= rtol))
+
+    def __str__(self) -> str:
+        labels = self.labels or [f"x[{i}]" for i in range(len(self.max_abs_error))]
+        width = max(len(label) for label in labels)
+        lines = [f"{self.precision} drift against float64 over {len(self.sample)} sampled "
+                 f"runs and {len(self.drift)} timesteps (final {self.drift[-1]:.3g}, "
+                 f"max {self.drift.max():.3g}):",
+                 f"  {'component':<{width}}  {'max abs error':>13}  {'max rel error':>13}"]
+        for label, abs_error, rel_error in zip(labels, self.max_abs_error, self.max_rel_error):
+            lines.append(f"  {label:<{width}}  {abs_error:>13.3g}  {rel_error:>13.3g}")
+        return "\n".join(lines)
+
+
+def _sample_model(model, index: np.ndarray, num_runs: int, precision: str):
+    """Return a copy of model for the runs in index, with its (num_runs,)
+    per-run parameters (see dynamics_sim.sweep) sliced to match, and the
+    given precision.
+    """
+    sampled = model.select_runs(index, num_runs)
+    if sampled is model:
+        sampled = model._copy()
+    # Give the copy its own integrator, so that its scratch buffers and any
+    # adaptive step size are not shared with model.
+    sampled.integrator = copy.deepcopy(model.integrator)
+    sampled.precision = precision
+    return sampled
+
+def drift_report(model,
+                 controller,
+                 x_0: np.ndarray,
+                 horizon: int,
+                 sample_size: int = 32,
+                 seed: int = 0,
+                 precision: Optional[str] = None) -> DriftReport:
+    """Simulate a random sample of a batch of initial states in reduced
+    precision and in float64, and report the error of the reduced precision
+    run.
+
+    Args:
+        model (DynamicsModel): The model. Its (N,) array-valued parameters are
+        sampled along with x_0.
+        controller (ControllerFn): Batched controller, called with (S, n)
+        states of the sample. It should not depend on the batch size.
+        x_0 (np.ndarray): The (n,) or (N, n) initial states.
+        horizon (int): Number of timesteps T to simulate.
+        sample_size (int, optional): Number of runs S to sample from x_0.
+        Defaults to 32.
+        seed (int, optional): Seed of the sample. Defaults to 0.
+        precision (Optional[str], optional): The precision to check. Defaults
+        to None (the model's precision, or float32 if it has none).
+
+    Returns:
+        DriftReport: The error of the reduced precision run.
+    """
+    # NOTE: Imported here, as the simulator imports the models, which import
+    # this module.
+    from dynamics_sim.simulator import Simulator
+
+    precision = resolve_dtype(precision or model.precision or "float32").name
+    x_0 = np.asarray(x_0)
+    x_0 = x_0.reshape(-1, x_0.shape[-1])
+    num_runs = len(x_0)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(num_runs, size=min(sample_size, num_runs), replace=False))
+
+    trajectories = []
+    for dtype in (precision, "float64"):
+        sampled = _sample_model(model, sample, num_runs, dtype)
+        states, _ = Simulator(sampled, controller, x_0[sample].astype(dtype), horizon).simulate()
+        trajectories.append(states)
+    labels = model.state_layout.labels if model.state_layout is not None else None
+    return DriftReport(precision, sample, trajectories[0], trajectories[1], labels)
@@ -0,0 +1,317 @@
+"""Real-time simulation server that publishes state frames over ZeroMQ.
+
+SimulationServer steps a DynamicsModel under asyncio at a fixed real-time
+rate and publishes every state as a binary frame on a PUB socket, so any
+number of subscribers (plotters, recorders, a meshcat bridge) can watch a run
+without slowing it down. Control inputs are received on a separate PULL
+socket and applied with a zero-order hold from the next step on.
+
+Slow consumers never stall the physics:
+    - PUB sockets drop frames for subscribers whose queue (of at most
+      send_hwm frames) is full, instead of blocking the publisher.
+    - Frames and control messages are single-part, so consumers can set
+      zmq.CONFLATE to only ever keep the latest one (see subscriber), and the
+      server drains the control socket every step, keeping only the latest
+      control.
+    - Steps are due at fixed times measured from the start of the run. If
+      the loop falls behind by more than max_lag steps (e.g., the process was
+      suspended), it skips ahead instead of bursting through the backlog.
+
+Run a scenario config (see dynamics_sim.cli) as a server with:
+    python -m dynamics_sim.server scenario.json [--pub tcp://*:5556] [--control tcp://*:5557]
+
+and watch it from another process with, e.g.:
+    socket = subscriber("tcp://localhost:5556")
+    k, t, x_k, u_k = decode_frame(socket.recv())
+"""
+
+import argparse
+import asyncio
+import struct
+import sys
+from typing import List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+# Topic prefix of state frames, for subscription filtering.
+STATE_TOPIC = b"state"
+
+# Frame header: topic, timestep index k, simulation time t, dtype character,
+# and the number of dimensions of x_k and u_k. It is followed by the int32
+# shapes of x_k and u_k, and then their raw (little-endian) data.
+_FRAME_HEADER = struct.Struct("<5sqdcBB")
+
+def encode_frame(k: int, t: float, x_k: np.ndarray, u_k: np.ndarray) -> bytes:
+    """Encode one timestep as a binary state frame.
+
+    Args:
+        k (int): The timestep index.
+        t (float): The simulation time in seconds.
+        x_k (np.ndarray): The (n,) or (N, n) state.
+        u_k (np.ndarray): The control commanded at timestep k.
+
+    Returns:
+        bytes: The frame.
+    """
+    x_k = np.ascontiguousarray(x_k)
+    u_k = np.ascontiguousarray(u_k, dtype=x_k.dtype)
+    header = _FRAME_HEADER.pack(STATE_TOPIC, k, t, x_k.dtype.char.encode(),
+                                x_k.ndim, u_k.ndim)
+    shapes = np.array(x_k.shape + u_k.shape, dtype="<i4")
+    return b"".join([header, shapes.tobytes(), x_k.astype(x_k.dtype.newbyteorder("<")).tobytes(),
+                     u_k.astype(u_k.dtype.newbyteorder("<")).tobytes()])
+
+def decode_frame(frame: bytes) -> Tuple[int, float, np.ndarray, np.ndarray]:
+    """Decode a state frame.
+
+    Args:
+        frame (bytes): A frame produced by encode_frame.
+
+    Returns:
+        Tuple[int, float, np.ndarray, np.ndarray]: k, t, x_k and u_k.
+    """
+    topic, k, t, char, x_ndim, u_ndim = _FRAME_HEADER.unpack_from(frame)
+    if topic != STATE_TOPIC:
+        raise ValueError(f"Not a state frame: {topic!r}")
+    offset = _FRAME_HEADER.size
+    shapes = np.frombuffer(frame, dtype="<i4", count=x_ndim + u_ndim, offset=offset)
+    offset += shapes.nbytes
+    dtype = np.dtype(char.decode()).newbyteorder("<")
+    arrays = []
+    for shape in (tuple(shapes[:x_ndim]), tuple(shapes[x_ndim:])):
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(frame, dtype=dtype, count=count, offset=offset).reshape(shape))
+        offset += count * dtype.itemsize
+    return k, t, arrays[0], arrays[1]
+
+def subscriber(address: str,
+               conflate: bool = True,
+               context: Optional[zmq.Context] = None) -> zmq.Socket:
+    """Connect a SUB socket to a server's state frames.
+
+    Args:
+        address (str): The server's PUB address, e.g., "tcp://localhost:5556".
+        conflate (bool, optional): Only keep the latest frame, for consumers
+        that display the current state. Recorders that need every frame
+        should pass False. Defaults to True.
+        context (Optional[zmq.Context], optional): Defaults to None (the
+        global context).
+
+    Returns:
+        zmq.Socket: The socket. Decode received frames with decode_frame.
+    """
+    socket = (context or zmq.Context.instance()).socket(zmq.SUB)
+    if conflate:
+        # Must be set before connecting.
+        socket.setsockopt(zmq.CONFLATE, 1)
+    socket.setsockopt(zmq.SUBSCRIBE, STATE_TOPIC)
+    socket.connect(address)
+    return socket
+
+def send_control(socket: zmq.Socket, u: np.ndarray):
+    """Send a control input to a server's control socket (connected with a
+    PUSH socket). Never blocks: if the server is not keeping up, the control
+    is dropped.
+    """
+    try:
+        socket.send(np.ascontiguousarray(u, dtype="<f8").tobytes(), zmq.NOBLOCK)
+    except zmq.Again:
+        pass
+
+
+class SimulationServer:
+    """Steps a dynamics model at a fixed real-time rate, publishing states
+    and receiving controls over ZeroMQ.
+
+    Attributes:
+        k (int): Index of the current timestep.
+        x_k (np.ndarray): The current state.
+        u_k (np.ndarray): The control currently applied.
+        overruns (int): Number of steps that started late.
+        skipped (int): Number of times the loop fell more than max_lag steps
+        behind and skipped ahead.
+        rejected_controls (int): Number of malformed control messages.
+    """
+
+    def __init__(self,
+                 model: DynamicsModel,
+                 x_0: np.ndarray,
+                 u_0: np.ndarray,
+                 pub_address: str = "tcp://*:5556",
+                 control_address: str = "tcp://*:5557",
+                 rate: float = 1.0,
+                 send_hwm: int = 16,
+                 max_lag: int = 10,
+                 context: Optional[zmq.Context] = None):
+        """Initialize the server and bind its sockets.
+
+        Args:
+            model (DynamicsModel): The model to step.
+            x_0 (np.ndarray): The initial state, (n,) or (N, n).
+            u_0 (np.ndarray): The control applied until another is received.
+            Received controls must have the same shape.
+            pub_address (str, optional): Address to publish state frames on.
+            Defaults to "tcp://*:5556".
+            control_address (str, optional): Address to receive controls on.
+            Defaults to "tcp://*:5557".
+            rate (float, optional): Simulated seconds per wall clock second.
+            Defaults to 1.0 (real time).
+            send_hwm (int, optional): Maximum number of frames queued per
+            subscriber before frames are dropped. Defaults to 16.
+            max_lag (int, optional): Number of steps the loop may fall behind
+            before skipping ahead. Defaults to 10.
+            context (Optional[zmq.Context], optional): Defaults to None (the
+            global context).
+        """
+        self.model = model
+        self.x_k = np.array(x_0, dtype=np.result_type(x_0, 1.0))
+        self.u_k = np.array(u_0, dtype=self.x_k.dtype)
+        self.k = 0
+        self.rate = rate
+        self.max_lag = max_lag
+        self.overruns = 0
+        self.skipped = 0
+        self.rejected_controls = 0
+        self._x_next = np.empty_like(self.x_k)
+        self._running = False
+
+        context = context or zmq.Context.instance()
+        self._pub = context.socket(zmq.PUB)
+        self._pub.setsockopt(zmq.SNDHWM, send_hwm)
+        self._pub.setsockopt(zmq.LINGER, 0)
+        self._pub.bind(pub_address)
+        self._control = context.socket(zmq.PULL)
+        self._control.setsockopt(zmq.RCVHWM, send_hwm)
+        self._control.setsockopt(zmq.LINGER, 0)
+        self._control.bind(control_address)
+
+    @property
+    def pub_endpoint(self) -> str:
+        """The bound PUB endpoint, with any wildcard port resolved."""
+        return self._pub.getsockopt(zmq.LAST_ENDPOINT).decode()
+
+    @property
+    def control_endpoint(self) -> str:
+        """The bound control endpoint, with any wildcard port resolved."""
+        return self._control.getsockopt(zmq.LAST_ENDPOINT).decode()
+
+    def _receive_controls(self):
+        """Apply the latest control message waiting on the control socket."""
+        latest = None
+        while True:
+            try:
+                latest = self._control.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+        if latest is None:
+            return
+        if len(latest) != self.u_k.size * 8:
+            self.rejected_controls += 1
+            return
+        self.u_k[...] = np.frombuffer(latest, dtype="<f8").reshape(self.u_k.shape)
+
+    def _publish(self):
+        frame = encode_frame(self.k, self.k * self.model.dt, self.x_k, self.u_k)
+        try:
+            self._pub.send(frame, zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+    def step(self):
+        """Apply the latest control, publish the current timestep, and step
+        the model forward.
+        """
+        self._receive_controls()
+        self._publish()
+        self.model.x_k_1(self.x_k, self.u_k, out=self._x_next)
+        self.x_k, self._x_next = self._x_next, self.x_k
+        self.k += 1
+
+    async def run(self, num_steps: Optional[int] = None):
+        """Step the model in real time until stop is called, or for
+        num_steps steps.
+
+        Step k is due at k * dt / rate seconds after the run starts. Every due
+        time is measured from the same start time, so time spent stepping and
+        publishing never accumulates into drift.
+
+        Args:
+            num_steps (Optional[int], optional): Number of steps to run.
+            Defaults to None (until stopped).
+        """
+        loop = asyncio.get_running_loop()
+        period = self.model.dt / self.rate
+        # The step budget is fixed up front, while the schedule (start and
+        # k_start) is rebased whenever the loop skips ahead.
+        k_end = None if num_steps is None else self.k + num_steps
+        start, k_start = loop.time(), self.k
+        self._running = True
+        try:
+            while self._running and (k_end is None or self.k < k_end):
+                self.step()
+                due = start + (self.k - k_start) * period
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self.overruns += 1
+                if delay < -self.max_lag * period:
+                    # Skip ahead rather than bursting through the backlog.
+                    self.skipped += 1
+                    start, k_start = loop.time(), self.k
+                # Still yield, so that other tasks (e.g., a stop request) run.
+                await asyncio.sleep(0)
+        finally:
+            self._running = False
+
+    def stop(self):
+        """Stop a running run after the current step."""
+        self._running = False
+
+    def close(self):
+        """Close the sockets."""
+        self._pub.close()
+        self._control.close()
+
+    def __enter__(self) -> "SimulationServer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # Imported here, as the scenario helpers are only needed by the command
+    # line entry point.
+    from dynamics_sim.cli import control_tape, load_config, model_class
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", help="Path of the scenario config (JSON or YAML).")
+    parser.add_argument("--pub", default="tcp://*:5556", help="Address to publish states on.")
+    parser.add_argument("--control", default="tcp://*:5557", help="Address to receive controls on.")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Simulated seconds per wall clock second.")
+    parser.add_argument("--steps", type=int, help="Number of steps to run (default: forever).")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.scenario)
+    model = model_class(config["model"])(**config.get("params", {}))
+    u_0 = control_tape(config["controls"], 1)[0]
+    with SimulationServer(model, np.asarray(config["x_0"], dtype=float), u_0,
+                          pub_address=args.pub, control_address=args.control,
+                          rate=args.rate) as server:
+        print(f"Publishing {config['model']} states on {server.pub_endpoint}, receiving "
+              f"controls on {server.control_endpoint}")
+        try:
+            asyncio.run(server.run(args.steps))
+        except KeyboardInterrupt:
+            pass
+        print(f"Stopped after {server.k} steps ({server.overruns} late)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
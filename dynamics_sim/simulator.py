@@ -0,0 +1,275 @@
+"""Module containing a simulator that rolls a dynamics model forward in time
+under a controller.
+"""
+
+from typing import Callable, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from dynamics_sim.checkpoint import Checkpoint, Checkpointer, restore
+from dynamics_sim.events import Event, EventResult, locate
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+# A controller is any callable that maps the current state x_k and timestep
+# index k to the control input u_k to command at that timestep.
+ControllerFn = Callable[[np.ndarray, int], np.ndarray]
+
+class TrajectorySink(Protocol):
+    """Anything that consumes a trajectory one timestep at a time, e.g., a
+    dynamics_sim.trajectory_io.TrajectoryWriter.
+    """
+
+    def append(self, x_k: np.ndarray, u_k: Optional[np.ndarray] = None):
+        ...
+
+class Simulator:
+    """Simulate a dynamics model forward from an initial state, querying a
+    controller for the control input at every timestep.
+
+    States and controls are written into preallocated (T, n) and (T, m) arrays
+    (or (T, N, n) and (T, N, m) for a batch of N environments) rather than
+    being accumulated in Python lists, so the cost of a rollout does not grow
+    with allocations and list-to-array copies.
+    """
+
+    def __init__(self,
+                 model: DynamicsModel,
+                 controller: ControllerFn,
+                 x_0: np.ndarray,
+                 horizon: int):
+        """Initialize the simulator.
+
+        Args:
+            model (DynamicsModel): The "ground truth" dynamics model to
+            simulate.
+            controller (ControllerFn): Callable returning u_k given (x_k, k).
+            x_0 (np.ndarray): The initial state, either (n,) or (N, n).
+            horizon (int): Number of timesteps T to simulate, including the
+            initial state.
+        """
+        if horizon < 1:
+            raise ValueError(f"horizon must be at least 1, got {horizon}")
+        self.model = model
+        self.controller = controller
+        self.x_0 = np.asarray(x_0)
+        self.horizon = horizon
+
+    def allocate(self, m: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Allocate a pair of state and control trajectory buffers sized for
+        this simulator.
+
+        Args:
+            m (int): The dimension of the control input.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Empty (T, n) states and (T, m)
+            controls arrays.
+        """
+        states = np.empty((self.horizon,) + self.x_0.shape,
+                          dtype=np.result_type(self.x_0, 1.0))
+        controls = np.empty((self.horizon,) + self.x_0.shape[:-1] + (m,),
+                            dtype=states.dtype)
+        return states, controls
+
+    def _check_buffer(self, name: str, buffer: np.ndarray, shape: Tuple[int, ...]):
+        if buffer.shape != shape:
+            raise ValueError(f"{name} buffer has shape {buffer.shape}, expected {shape}")
+
+    def simulate(self,
+                 states: Optional[np.ndarray] = None,
+                 controls: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Run the simulation.
+
+        At every timestep k the controller is evaluated at states[k] and the
+        result is stored in controls[k]; the model is then stepped forward to
+        produce states[k+1].
+
+        Args:
+            states (Optional[np.ndarray], optional): Caller-provided (T, n)
+            buffer to write states into. Pass the same buffer across runs to
+            avoid reallocating it. Defaults to None (allocate a new one).
+            controls (Optional[np.ndarray], optional): Caller-provided (T, m)
+            buffer to write controls into, (T, N, m) for a batch of N
+            environments. Controllers may return a single (m,) control that
+            is broadcast across the batch. Defaults to None.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The states and controls arrays.
+        """
+        model = self.model
+        controller = self.controller
+        u_0 = np.asarray(controller(self.x_0, 0))
+        m = u_0.shape[-1]
+
+        if states is None or controls is None:
+            new_states, new_controls = self.allocate(m)
+            states = new_states if states is None else states
+            controls = new_controls if controls is None else controls
+        self._check_buffer("states", states, (self.horizon,) + self.x_0.shape)
+        self._check_buffer("controls", controls,
+                           (self.horizon,) + self.x_0.shape[:-1] + (m,))
+
+        states[0] = self.x_0
+        controls[0] = u_0
+        for k in range(1, self.horizon):
+            model.x_k_1(states[k-1], controls[k-1], out=states[k])
+            controls[k] = controller(states[k], k)
+
+        return states, controls
+
+    def stream(self,
+               sink: TrajectorySink,
+               checkpointer: Optional[Checkpointer] = None,
+               resume: Optional[Checkpoint] = None) -> np.ndarray:
+        """Run the simulation, passing every state and control to sink instead
+        of keeping the trajectory in memory.
+
+        Only two state buffers are used, swapped every step, so memory use is
+        independent of the horizon.
+
+        Args:
+            sink (TrajectorySink): Receives (x_k, u_k) at every timestep. The
+            arrays are reused, so sinks must copy anything they keep.
+            checkpointer (Optional[Checkpointer], optional): Periodically
+            checkpoints the run (see dynamics_sim.checkpoint). Defaults to
+            None.
+            resume (Optional[Checkpoint], optional): Continue from this
+            checkpoint instead of x_0. Timesteps up to and including the
+            checkpoint's are not passed to sink again. Defaults to None.
+
+        Returns:
+            np.ndarray: The final state.
+        """
+        model = self.model
+        controller = self.controller
+        if resume is None:
+            k_0 = 0
+            x_k = np.array(self.x_0, dtype=np.result_type(self.x_0, 1.0))
+            u_k = controller(x_k, 0)
+            sink.append(x_k, u_k)
+        else:
+            restore(self, resume, checkpointer)
+            k_0 = resume.k
+            x_k = np.array(resume.x_k)
+            u_k = np.array(resume.u_k)
+        x_next = np.empty_like(x_k)
+
+        for k in range(k_0 + 1, self.horizon):
+            model.x_k_1(x_k, u_k, out=x_next)
+            x_k, x_next = x_next, x_k
+            u_k = controller(x_k, k)
+            sink.append(x_k, u_k)
+            if checkpointer is not None and checkpointer.due(k):
+                checkpointer.save(self, k, x_k, u_k, sink)
+
+        return x_k
+
+    def simulate_until(self,
+                       events: Sequence[Event],
+                       t_tol: float = 1e-9) -> EventResult:
+        """Run the simulation until every run hits a terminal event or the
+        horizon is reached.
+
+        The runs that are still going are kept in a compacted active set:
+        once a run terminates it is dropped from the batch, so later steps
+        (and controller calls) only cost as much as the live runs. Per-run
+        (N,) array parameters of the model, as used by sweeps, are compacted
+        along with the states (see DynamicsModel.select_runs).
+
+        The controller is therefore called with a (B, n) batch of the active
+        states, where B shrinks over time. Whenever runs are dropped, a
+        controller with a select_runs method (see Controller.select_runs) is
+        passed the indices, into its previous batch, of the runs that remain,
+        so that it can keep per-run state (e.g., MPPI's warm starts) aligned
+        with the runs. Other controllers must not keep per-run state.
+
+        Args:
+            events (Sequence[Event]): The events to monitor.
+            t_tol (float, optional): Tolerance on the located event times.
+            Defaults to 1e-9.
+
+        Returns:
+            EventResult: The trajectories, the terminal event of every run,
+            and every located event occurrence.
+        """
+        model = self.model
+        batched = self.x_0.ndim > 1
+        x_0 = np.array(self.x_0, dtype=np.result_type(self.x_0, 1.0))
+        x_0 = x_0.reshape(-1, x_0.shape[-1])
+        num_runs = len(x_0)
+        # Unbatched controllers are called with single states, as in simulate.
+        controller = self.controller if batched else \
+            lambda x_k, k: np.asarray(self.controller(x_k[0], k))[None]
+        select_runs = getattr(self.controller, "select_runs", None) if batched else None
+
+        u_0 = np.asarray(controller(x_0, 0))
+        u_0 = np.broadcast_to(u_0, (num_runs, u_0.shape[-1]))
+        states = np.empty((self.horizon,) + x_0.shape, dtype=x_0.dtype)
+        controls = np.empty((self.horizon, num_runs, u_0.shape[-1]), dtype=x_0.dtype)
+        num_steps = np.full(num_runs, self.horizon)
+        t_event = np.full(num_runs, np.nan)
+        event_index = np.full(num_runs, -1)
+        occurrences = []
+
+        states[0] = x_0
+        controls[0] = u_0
+        active = np.arange(num_runs)
+        g_prev = [event(x_0) for event in events]
+        # The model of the active runs.
+        active_model = model
+        for k in range(1, self.horizon):
+            x_prev = states[k-1, active]
+            u_prev = controls[k-1, active]
+            x_k = active_model.x_k_1(x_prev, u_prev)
+
+            # Locate every crossing of this step, keeping the earliest
+            # terminal one of each run.
+            t_stop = np.full(len(active), np.inf)
+            x_stop = x_k.copy()
+            stop_index = np.full(len(active), -1)
+            g_next = []
+            for j, event in enumerate(events):
+                g_k = event(x_k)
+                g_next.append(g_k)
+                crossed = np.flatnonzero(event.crossed(g_prev[j], g_k))
+                if len(crossed) == 0:
+                    continue
+                crossed_model = active_model.select_runs(crossed, len(active))
+                t, x_event = locate(event, crossed_model, x_prev[crossed], x_k[crossed],
+                                    u_prev[crossed], g_prev[j][crossed], g_k[crossed],
+                                    t_tol=t_tol)
+                t = t + (k - 1) * crossed_model.dt
+                for i, t_i, x_i in zip(crossed, t, x_event):
+                    occurrences.append((int(active[i]), j, float(t_i), x_i))
+                if event.terminal:
+                    earlier = t < t_stop[crossed]
+                    t_stop[crossed[earlier]] = t[earlier]
+                    x_stop[crossed[earlier]] = x_event[earlier]
+                    stop_index[crossed[earlier]] = j
+
+            states[k, active] = x_stop
+            stopped = stop_index >= 0
+            if np.any(stopped):
+                runs = active[stopped]
+                # Hold the terminal state (and last control) for the rest of
+                # the horizon.
+                states[k:, runs] = x_stop[stopped]
+                controls[k:, runs] = u_prev[stopped]
+                num_steps[runs] = k + 1
+                t_event[runs] = t_stop[stopped]
+                event_index[runs] = stop_index[stopped]
+
+                keep = ~stopped
+                active = active[keep]
+                g_next = [g[keep] for g in g_next]
+                if len(active) == 0:
+                    break
+                active_model = model.select_runs(active, num_runs)
+                if select_runs is not None:
+                    select_runs(np.flatnonzero(keep))
+            g_prev = g_next
+            controls[k, active] = controller(states[k, active], k)
+
+        if not batched:
+            states, controls = states[:, 0], controls[:, 0]
+        return EventResult(states, controls, num_steps, t_event, event_index, occurrences)
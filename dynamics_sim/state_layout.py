@@ -0,0 +1,132 @@
+"""Module containing the StateLayout descriptor, which names the parts of a
+flat state (or control) vector.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# A field is declared as (name, size) or (name, size, labels), where labels
+# holds one human readable label (e.g., with units) per component.
+Field = Union[Tuple[str, int], Tuple[str, int, Sequence[str]]]
+
+class StateLayout:
+    """Describes how named sub-vectors are laid out in a contiguous flat
+    vector of length n, or along the last axis of an (N, n) batch.
+
+    Every accessor returns basic-slice views of the given array, so reading a
+    field never copies and writing into a field (e.g., when filling in a
+    derivative) writes directly into the underlying buffer.
+
+    Example:
+        layout = StateLayout(("p", 2, ["px (m)", "py (m)"]),
+                             ("v", 2, ["vx (m/s)", "vy (m/s)"]))
+        p, v = layout.views(x)      # zero-copy views of x[..., 0:2], x[..., 2:4]
+        layout.view(x_dot, "p")[...] = v
+    """
+
+    def __init__(self, *fields: Field):
+        """Initialize the layout from an ordered list of fields.
+
+        Args:
+            *fields (Field): (name, size) or (name, size, labels) tuples, in
+            the order they appear in the vector.
+        """
+        self.names: List[str] = []
+        self.slices: Dict[str, slice] = {}
+        self.labels: List[str] = []
+        start = 0
+        for field in fields:
+            name, size = field[0], field[1]
+            if name in self.slices:
+                raise ValueError(f"Duplicate field name '{name}'")
+            labels = list(field[2]) if len(field) > 2 else \
+                [f"{name}[{i}]" for i in range(size)]
+            if len(labels) != size:
+                raise ValueError(f"Field '{name}' has size {size} but {len(labels)} labels")
+            self.names.append(name)
+            self.slices[name] = slice(start, start + size)
+            self.labels.extend(labels)
+            start += size
+        self.size = start
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, name: str) -> slice:
+        return self.slices[name]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}[{s.start}:{s.stop}]" for name, s in self.slices.items())
+        return f"StateLayout({fields})"
+
+    def span(self, first: str, last: Optional[str] = None) -> slice:
+        """Return the slice covering the contiguous run of fields from first
+        through last (inclusive).
+
+        Args:
+            first (str): Name of the first field.
+            last (Optional[str], optional): Name of the last field. Defaults to
+            None (just the first field).
+
+        Returns:
+            slice: The slice of the vector spanning those fields.
+        """
+        last = first if last is None else last
+        return slice(self.slices[first].start, self.slices[last].stop)
+
+    def view(self, x: np.ndarray, name: str) -> np.ndarray:
+        """Return a zero-copy view of the named field of x.
+
+        Args:
+            x (np.ndarray): A (..., n) vector or batch of vectors.
+            name (str): Name of the field.
+
+        Returns:
+            np.ndarray: The (..., size) view x[..., field].
+        """
+        return x[..., self.slices[name]]
+
+    def views(self, x: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Return zero-copy views of every field of x, in layout order. This
+        is the batched, allocation-free replacement for tuple-unpacking a state
+        vector.
+
+        Args:
+            x (np.ndarray): A (..., n) vector or batch of vectors.
+
+        Returns:
+            Tuple[np.ndarray, ...]: One (..., size) view per field.
+        """
+        self._check(x)
+        return tuple(x[..., s] for s in self.slices.values())
+
+    def as_dict(self, x: np.ndarray) -> Dict[str, np.ndarray]:
+        """Return a dictionary mapping field names to zero-copy views of x.
+
+        Args:
+            x (np.ndarray): A (..., n) vector or batch of vectors.
+
+        Returns:
+            Dict[str, np.ndarray]: The field views, keyed by name.
+        """
+        self._check(x)
+        return {name: x[..., s] for name, s in self.slices.items()}
+
+    def empty(self, batch_shape: Tuple[int, ...] = (), dtype=float) -> np.ndarray:
+        """Allocate an uninitialized buffer for this layout.
+
+        Args:
+            batch_shape (Tuple[int, ...], optional): Leading batch dimensions.
+            Defaults to () (a single vector).
+            dtype (optional): The dtype of the buffer. Defaults to float.
+
+        Returns:
+            np.ndarray: An empty (*batch_shape, n) array.
+        """
+        return np.empty(tuple(batch_shape) + (self.size,), dtype=dtype)
+
+    def _check(self, x: np.ndarray):
+        if x.shape[-1] != self.size:
+            raise ValueError(f"Expected vectors of length {self.size} for {self!r}, "
+                             f"got shape {x.shape}")
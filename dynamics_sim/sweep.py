@@ -0,0 +1,216 @@
+"""Parallel parameter sweeps and Monte Carlo runs over dynamics model
+parameters and initial states.
+
+Runs are split into batches that are spread across a process pool. Within a
+batch, every run is simulated together as one vectorized (B, n) rollout, with
+any parameters that differ between runs passed to the model as (B,) arrays.
+Workers write their trajectories directly into a shared-memory (runs, T, n)
+array, so no trajectories are pickled back to the parent process.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type, Union
+
+import numpy as np
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.precision import resolve_dtype
+from dynamics_sim.simulator import ControllerFn, Simulator
+
+# Samples a value (a parameter or an initial state) given a run's generator.
+Sampler = Callable[[np.random.Generator], Any]
+# Builds the controller of a single run given the run's generator, e.g., a
+# stochastic controller such as MPPI seeded from it.
+ControllerFactory = Callable[[np.random.Generator], ControllerFn]
+
+def run_generators(seed: int, num_runs: int) -> List[np.random.Generator]:
+    """Create one independent random generator per run.
+
+    The generators are spawned from a single SeedSequence, so run i always
+    sees the same random stream for a given seed, regardless of how runs are
+    batched or how many workers are used.
+
+    Args:
+        seed (int): The root seed of the sweep.
+        num_runs (int): The number of runs.
+
+    Returns:
+        List[np.random.Generator]: One generator per run.
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(num_runs)]
+
+def grid(**values: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Build the cartesian product of the given parameter values.
+
+    Example:
+        grid(box_mass=[1.0, 2.0], surface_friction_coef=[0.1, 0.5])
+
+    Args:
+        **values (Sequence[Any]): The values to sweep for each parameter.
+
+    Returns:
+        List[Dict[str, Any]]: One parameter dictionary per combination.
+    """
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+def sample(distributions: Dict[str, Sampler], num_runs: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Draw parameter sets for a Monte Carlo sweep.
+
+    Example:
+        sample({"box_mass": lambda rng: rng.uniform(0.5, 2.0)}, 1000, seed=3)
+
+    Args:
+        distributions (Dict[str, Sampler]): Sampler for each parameter.
+        num_runs (int): The number of parameter sets to draw.
+        seed (int, optional): The root seed. Defaults to 0.
+
+    Returns:
+        List[Dict[str, Any]]: One parameter dictionary per run.
+    """
+    return [{name: draw(rng) for name, draw in distributions.items()}
+            for rng in run_generators(seed, num_runs)]
+
+def _batch_params(params: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-run parameter dictionaries into model constructor arguments,
+    keeping parameters shared by every run as scalars and stacking the others
+    into (B,) arrays.
+    """
+    merged = {}
+    for name in params[0]:
+        values = [p[name] for p in params]
+        merged[name] = values[0] if all(np.array_equal(v, values[0]) for v in values) \
+            else np.array(values)
+    return merged
+
+class _PerRunController:
+    """Batched controller that calls the controller of every run in a batch
+    on that run's state, so that each run's (stochastic) controls only depend
+    on its own generator, regardless of how runs are batched.
+    """
+
+    def __init__(self, controllers: List[ControllerFn]):
+        self.controllers = controllers
+
+    def select_runs(self, index: np.ndarray):
+        self.controllers = [self.controllers[i] for i in index]
+
+    def __call__(self, x_k: np.ndarray, k: int) -> np.ndarray:
+        return np.stack([np.asarray(controller(x, k))
+                         for controller, x in zip(self.controllers, x_k)])
+
+def _run_batch(shm_name: str,
+               shape,
+               dtype,
+               start: int,
+               model_cls: Type[DynamicsModel],
+               model_kwargs: Dict[str, Any],
+               controller: Optional[ControllerFn],
+               controller_factory: Optional[ControllerFactory],
+               rngs: List[np.random.Generator],
+               x_0: np.ndarray,
+               horizon: int):
+    """Simulate one batch of runs and write it into the shared states array.
+    Runs in the worker processes.
+    """
+    if controller_factory is not None:
+        controller = _PerRunController([controller_factory(rng) for rng in rngs])
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        states = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        # (B, T, n) slice of the shared array, viewed as the (T, B, n) buffer
+        # the simulator writes a batched rollout into.
+        out = states[start:start + len(x_0)].transpose(1, 0, 2)
+        model = model_cls(**model_kwargs)
+        Simulator(model, controller, x_0, horizon).simulate(states=out)
+    finally:
+        shm.close()
+
+def sweep(model_cls: Type[DynamicsModel],
+          params: Sequence[Dict[str, Any]],
+          controller: Optional[ControllerFn],
+          x_0: Union[np.ndarray, Sampler],
+          horizon: int,
+          seed: int = 0,
+          batch_size: int = 256,
+          num_workers: Optional[int] = None,
+          model_kwargs: Optional[Dict[str, Any]] = None,
+          precision: Optional[str] = None,
+          controller_factory: Optional[ControllerFactory] = None) -> np.ndarray:
+    """Simulate model_cls under controller once for every parameter set.
+
+    Args:
+        model_cls (Type[DynamicsModel]): The model class to instantiate. Its
+        dynamics must broadcast (B,) array-valued parameters over a batch.
+        params (Sequence[Dict[str, Any]]): Constructor parameters for each run
+        (see grid and sample).
+        controller (Optional[ControllerFn]): Batched controller shared by
+        all runs, called with (B, n) states. Must be picklable when
+        num_workers > 1. None if controller_factory is given.
+        x_0 (Union[np.ndarray, Sampler]): The initial state shared by all runs
+        (n,), one per run (runs, n), or a sampler called with each run's
+        generator.
+        horizon (int): Number of timesteps T per run.
+        seed (int, optional): Root seed for the per-run generators. Defaults
+        to 0.
+        batch_size (int, optional): Runs simulated together per task.
+        Defaults to 256.
+        num_workers (Optional[int], optional): Number of worker processes.
+        Defaults to None (one per CPU). 0 or 1 runs in this process.
+        model_kwargs (Optional[Dict[str, Any]], optional): Constructor
+        arguments shared by all runs, e.g., dt. Defaults to None.
+        precision (Optional[str], optional): "float32" to simulate (and
+        return) the runs in float32, passed on to the model (see
+        dynamics_sim.precision). Defaults to None (float64).
+        controller_factory (Optional[ControllerFactory], optional): Instead
+        of controller, build a controller for every run from the run's
+        generator (after x_0 was sampled from it), e.g.,
+        lambda rng: MPPI(..., seed=rng). Every run is then reproducible from
+        the seed alone, regardless of batching and workers. Each controller
+        is called with its run's (n,) state. Must be picklable when
+        num_workers > 1. Defaults to None.
+
+    Returns:
+        np.ndarray: The (runs, T, n) states of every run.
+    """
+    num_runs = len(params)
+    if num_runs == 0:
+        raise ValueError("params must contain at least one run")
+    if (controller is None) == (controller_factory is None):
+        raise ValueError("Exactly one of controller and controller_factory must be given")
+    rngs = run_generators(seed, num_runs)
+    if callable(x_0):
+        x_0 = np.stack([x_0(rng) for rng in rngs])
+    dtype = np.dtype(float) if precision is None else resolve_dtype(precision)
+    x_0 = np.broadcast_to(np.asarray(x_0, dtype=dtype), (num_runs, np.shape(x_0)[-1]))
+    model_kwargs = model_kwargs or {}
+    if precision is not None:
+        model_kwargs = {**model_kwargs, "precision": dtype.name}
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+
+    shape = (num_runs, horizon, x_0.shape[-1])
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * dtype.itemsize)
+    try:
+        tasks = []
+        for start in range(0, num_runs, batch_size):
+            stop = min(start + batch_size, num_runs)
+            kwargs = {**model_kwargs, **_batch_params(params[start:stop])}
+            tasks.append((shm.name, shape, dtype, start, model_cls, kwargs,
+                          controller, controller_factory, rngs[start:stop],
+                          np.array(x_0[start:stop]), horizon))
+
+        if num_workers <= 1:
+            for task in tasks:
+                _run_batch(*task)
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                for future in [pool.submit(_run_batch, *task) for task in tasks]:
+                    future.result()
+
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
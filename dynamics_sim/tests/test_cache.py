@@ -0,0 +1,156 @@
+"""Unit tests for the content-addressed rollout cache."""
+
+import importlib
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from dynamics_sim.cache import RolloutCache, rollout_key, source_fingerprint
+from dynamics_sim.controllers.controller import OpenLoopController
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+
+def push_controls(horizon: int = 200) -> np.ndarray:
+    controls = np.zeros((horizon, 2))
+    controls[:100, 0] = 10.0
+    return controls
+
+def test_memory_and_disk_tiers(tmp_path):
+    """Test that a cached rollout matches a fresh simulation and is served
+    from memory, and from disk by a new cache instance.
+    """
+    box = BoxDynamics(surface_friction_coef=0.5)
+    x_0, controls = np.zeros(4), push_controls()
+    expected, _ = Simulator(box, OpenLoopController(controls), x_0, len(controls)).simulate()
+
+    cache = RolloutCache(str(tmp_path))
+    states, _ = cache.rollout(box, x_0, controls)
+    assert np.array_equal(states, expected)
+    assert cache.misses == 1
+    again, _ = cache.rollout(BoxDynamics(surface_friction_coef=0.5), x_0, controls)
+    assert again is states
+    assert not again.flags.writeable
+    assert cache.hits == {"memory": 1, "disk": 0}
+
+    cache = RolloutCache(str(tmp_path))
+    states, recorded = cache.rollout(BoxDynamics(surface_friction_coef=0.5), x_0, controls)
+    assert cache.hits == {"memory": 0, "disk": 1}
+    assert np.array_equal(states, expected)
+    assert np.array_equal(recorded, controls)
+
+def test_key_covers_inputs():
+    """Test that the key changes with every input of a rollout, but not with
+    the memory layout of the arrays.
+    """
+    x_0, controls = np.zeros(4), push_controls()
+    key = rollout_key(BoxDynamics(), x_0, controls)
+    assert rollout_key(BoxDynamics(), x_0.copy(), np.asfortranarray(controls)) == key
+    assert rollout_key(BoxDynamics(box_mass=2.0), x_0, controls) != key
+    assert rollout_key(BoxDynamics(dt=0.02), x_0, controls) != key
+    assert rollout_key(BoxDynamics(integrator="euler"), x_0, controls) != key
+    assert rollout_key(BoxDynamics(), x_0 + 1e-12, controls) != key
+    assert rollout_key(BoxDynamics(), x_0, controls[:-1]) != key
+    assert rollout_key(BoxDynamics(), x_0.astype(np.float32), controls) != key
+
+def test_key_covers_all_attributes():
+    """Test that the key covers attributes that parameters() leaves out, and
+    refuses attributes it cannot hash rather than skipping them.
+    """
+    x_0, controls = np.zeros(4), push_controls()
+    box = BoxDynamics()
+    box.gains = [1, 1]
+    key = rollout_key(box, x_0, controls)
+    box.gains = [5, 5]
+    assert rollout_key(box, x_0, controls) != key
+    box.gains = (1, 1)
+    assert rollout_key(box, x_0, controls) != key
+    box.gains = None
+    assert rollout_key(box, x_0, controls) != key
+
+    box.gains = lambda x: x
+    with pytest.raises(TypeError, match="gains"):
+        rollout_key(box, x_0, controls)
+    with pytest.raises(TypeError):
+        RolloutCache().rollout(box, x_0, controls)
+
+def test_source_without_file():
+    """Test that rollouts of classes without a source file, whose edits
+    could not be tracked, are not cached.
+    """
+    namespace = {"__name__": "cell"}
+    exec("from dynamics_sim.models.box_dynamics import BoxDynamics\n"
+         "class CellBox(BoxDynamics):\n"
+         "    pass\n", namespace)
+    with pytest.raises(ValueError, match="CellBox"):
+        RolloutCache().rollout(namespace["CellBox"](), np.zeros(4), push_controls())
+    # Built-in classes (here, of numpy) only change with the installed packages.
+    assert source_fingerprint(np.ndarray)
+
+def test_adaptive_integrator_rollouts_hit():
+    """Test that repeating a rollout on the same model with an adaptive
+    integrator, whose step size carries over between steps, hits the cache
+    and matches a rollout on a fresh model.
+    """
+    box = BoxDynamics(integrator="dopri5")
+    x_0, controls = np.zeros(4), push_controls()
+    cache = RolloutCache()
+    states, _ = cache.rollout(box, x_0, controls)
+    again, _ = cache.rollout(box, x_0, controls)
+    assert again is states
+    assert cache.hits["memory"] == 1 and cache.misses == 1
+
+    fresh, _ = RolloutCache().rollout(BoxDynamics(integrator="dopri5"), x_0, controls)
+    assert np.array_equal(fresh, states)
+    # Simulating on the same model again reproduces the rollout too.
+    cache.clear()
+    rerun, _ = cache.rollout(box, x_0, controls)
+    assert np.array_equal(rerun, states)
+
+    # Hits leave the integrator's state alone.
+    step_size = box.integrator.get_state()
+    cache.rollout(box, x_0, controls)
+    assert box.integrator.get_state() == step_size
+
+def test_source_change_invalidates(tmp_path, monkeypatch):
+    """Test that editing a model's source file changes its rollout keys."""
+    source = ("from dynamics_sim.models.box_dynamics import BoxDynamics\n"
+              "class EditedBox(BoxDynamics):\n"
+              "    pass\n")
+    (tmp_path / "edited_box.py").write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("edited_box")
+    try:
+        key = rollout_key(module.EditedBox(), np.zeros(4), push_controls())
+        assert rollout_key(module.EditedBox(), np.zeros(4), push_controls()) == key
+        (tmp_path / "edited_box.py").write_text(source + "    # Changed.\n")
+        module = importlib.reload(module)
+        assert rollout_key(module.EditedBox(), np.zeros(4), push_controls()) != key
+    finally:
+        sys.modules.pop("edited_box", None)
+
+def test_disk_lru_eviction(tmp_path):
+    """Test that the least recently used rollouts are evicted from disk once
+    the size bound is exceeded.
+    """
+    box = BoxDynamics()
+    controls = push_controls()
+    x_0s = [np.full(4, float(i)) for i in range(3)]
+    cache = RolloutCache(str(tmp_path), max_memory_bytes=0)
+    cache.rollout(box, x_0s[0], controls)
+    entry_size = sum(f.stat().st_size for f in tmp_path.iterdir())
+    cache.max_disk_bytes = int(2.5 * entry_size)
+
+    time.sleep(0.01)
+    cache.rollout(box, x_0s[1], controls)
+    time.sleep(0.01)
+    # Use the first rollout again, so that the second is now the oldest.
+    cache.rollout(box, x_0s[0], controls)
+    assert cache.hits["disk"] == 1
+    time.sleep(0.01)
+    cache.rollout(box, x_0s[2], controls)
+
+    stored = {name.split(".")[0] for name in os.listdir(tmp_path)}
+    assert stored == {rollout_key(box, x_0s[0], controls), rollout_key(box, x_0s[2], controls)}
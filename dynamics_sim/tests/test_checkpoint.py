@@ -0,0 +1,107 @@
+"""Unit tests for checkpointing, resuming and replaying simulations."""
+
+import os
+
+import numpy as np
+import pytest
+
+from dynamics_sim.checkpoint import Checkpointer, load_checkpoint, replay
+from dynamics_sim.controllers.mppi import MPPI
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+from dynamics_sim.trajectory_io import TrajectoryReader, TrajectoryWriter
+
+class Interrupted(Exception):
+    pass
+
+class InterruptAt:
+    """Wraps a sink, raising (like a killed process) when timestep k is
+    appended.
+    """
+
+    def __init__(self, sink, k: int):
+        self.sink = sink
+        self.k = k
+        self.count = 0
+
+    def append(self, x_k, u_k=None):
+        if self.count == self.k:
+            raise Interrupted
+        self.count += 1
+        self.sink.append(x_k, u_k)
+
+    def flush(self):
+        self.sink.flush()
+
+def noisy_push(rng: np.random.Generator):
+    def policy(x_k: np.ndarray, k: int) -> np.ndarray:
+        return np.array([10.0, 0.0]) + rng.normal(scale=2.0, size=2)
+    return policy
+
+def test_resume_is_bit_identical(tmp_path):
+    """Test that a run interrupted mid-way and resumed from its last
+    checkpoint writes exactly the trajectory of an uninterrupted run, with an
+    adaptive integrator and random process noise.
+    """
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.5, integrator="dopri5")
+    rng = np.random.default_rng(1)
+    states, controls = Simulator(box, noisy_push(rng), np.zeros(4), 200).simulate()
+
+    rng = np.random.default_rng(1)
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.5, integrator="dopri5")
+    simulator = Simulator(box, noisy_push(rng), np.zeros(4), 200)
+    path = str(tmp_path / "checkpoint.pkl")
+    checkpointer = Checkpointer(path, every_steps=30, rngs={"noise": rng})
+    with pytest.raises(Interrupted):
+        with TrajectoryWriter(str(tmp_path), model=box, chunk_size=16) as writer:
+            simulator.stream(InterruptAt(writer, 137), checkpointer)
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.k < 137
+    assert [f for f in os.listdir(tmp_path) if f.startswith(".checkpoint-")] == []
+
+    # Start from fresh objects, as a restarted process would.
+    rng = np.random.default_rng()
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.5, integrator="dopri5")
+    simulator = Simulator(box, noisy_push(rng), np.zeros(4), 200)
+    checkpointer = Checkpointer(path, every_steps=30, rngs={"noise": rng})
+    with TrajectoryWriter(str(tmp_path), model=box, chunk_size=16,
+                          resume=checkpoint.k + 1) as writer:
+        simulator.stream(writer, checkpointer, resume=checkpoint)
+
+    reader = TrajectoryReader(str(tmp_path))
+    assert np.array_equal(reader.states, states)
+    assert np.array_equal(reader.controls, controls)
+
+def test_replay_mppi(tmp_path):
+    """Test that replaying from a checkpoint reproduces an MPPI run, whose
+    warm start and sampling noise are part of the controller state.
+    """
+    def make_simulator():
+        box = BoxDynamics(dt=0.05, surface_friction_coef=0.1)
+        cost = lambda x, u, k: (x[..., 0] - 1.0)**2 + 1e-3 * np.sum(u**2, axis=-1)
+        controller = MPPI(box, cost, horizon=8, noise_sigma=np.array([5.0, 0.1]),
+                          num_samples=32, seed=3)
+        return Simulator(box, controller, np.zeros(4), 40)
+
+    simulator = make_simulator()
+    checkpointer = Checkpointer(str(tmp_path / "checkpoint.pkl"), every_steps=10)
+    with TrajectoryWriter(str(tmp_path), chunk_size=8) as writer:
+        simulator.stream(writer, checkpointer)
+    checkpoint = load_checkpoint(checkpointer.path)
+    assert checkpoint.controller_state["U"].shape == (8, 2)
+
+    states, controls = replay(make_simulator(), checkpoint)
+    reader = TrajectoryReader(str(tmp_path))
+    assert np.array_equal(states, reader.states[checkpoint.k:])
+    assert np.array_equal(controls, reader.controls[checkpoint.k:])
+
+def test_checkpointer_wall_clock():
+    """Test checkpointing on an interval of wall time."""
+    now = [0.0]
+    checkpointer = Checkpointer("unused.pkl", every_seconds=10.0, clock=lambda: now[0])
+    assert not checkpointer.due(1)
+    now[0] = 10.5
+    assert checkpointer.due(2)
+    checkpointer.restart(2)
+    assert not checkpointer.due(3)
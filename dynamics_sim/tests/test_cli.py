@@ -0,0 +1,68 @@
+"""Unit tests for the headless CLI and the startup import budget."""
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+from dynamics_sim.cli import control_tape, main
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+from dynamics_sim.trajectory_io import TrajectoryReader
+
+# Generous bound on the time to import the headless modules (after numpy),
+# to catch heavy imports creeping back in without being flaky on slow
+# machines.
+IMPORT_BUDGET_S = 0.5
+
+SCENARIO = {
+    "model": "BoxDynamics",
+    "params": {"dt": 0.01, "surface_friction_coef": 0.5},
+    "x_0": [0.0, 0.0, 0.0, 0.0],
+    "horizon": 250,
+    "controls": [{"until": 99, "u": [10.0, 0.0]}, {"u": [0.0, 0.0]}],
+}
+
+def test_control_tape():
+    tape = control_tape(SCENARIO["controls"], 120)
+    assert tape.shape == (120, 2)
+    assert np.all(tape[:99] == [10.0, 0.0]) and np.all(tape[99:] == 0.0)
+
+def test_run_scenario(tmp_path):
+    """Test that the CLI writes the same trajectory as a direct simulation,
+    and that stop_when truncates it.
+    """
+    config_path = tmp_path / "scenario.json"
+    config_path.write_text(json.dumps(SCENARIO))
+    assert main([str(config_path), "--output", str(tmp_path / "full")]) == 0
+
+    box = BoxDynamics(dt=0.01, surface_friction_coef=0.5)
+    push = lambda x_k, k: np.array([10.0, 0.0]) if k < 99 else np.zeros(2)
+    states, controls = Simulator(box, push, np.zeros(4), 250).simulate()
+    reader = TrajectoryReader(str(tmp_path / "full"))
+    assert np.allclose(reader.states, states)
+    assert np.allclose(reader.controls, controls)
+    assert reader.metadata["scenario"]["model"] == "BoxDynamics"
+
+    config_path.write_text(json.dumps(
+        {**SCENARIO, "stop_when": [{"state": "vx (m/s)", "direction": -1}]}))
+    main([str(config_path), "--output", str(tmp_path / "stopped")])
+    reader = TrajectoryReader(str(tmp_path / "stopped"))
+    assert len(reader) == reader.metadata["num_steps"][0] < 250
+    assert abs(reader.states[-1, 2]) < 1e-6
+
+def test_import_budget():
+    """Test that the headless modules import quickly and without any
+    visualization or optional dependencies.
+    """
+    code = ("import sys, time, numpy\n"
+            "start = time.perf_counter()\n"
+            "import dynamics_sim.cli, dynamics_sim.plotting, dynamics_sim.visualization\n"
+            "elapsed = time.perf_counter() - start\n"
+            "heavy = [m for m in ('plotly', 'meshcat', 'numba', 'scipy', 'yaml') if m in sys.modules]\n"
+            "print(elapsed, heavy)\n")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True).stdout.split(maxsplit=1)
+    assert output[1].strip() == "[]"
+    assert float(output[0]) < IMPORT_BUDGET_S
@@ -0,0 +1,98 @@
+"""Unit tests for the constellation propagator and conjunction screener."""
+
+import numpy as np
+import pytest
+
+from dynamics_sim.constellation import (J2_EARTH, R_EARTH_EQUATORIAL, ConjunctionScreener,
+                                        Constellation)
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+
+MU = 3.986e14
+
+def circular_orbits(rng: np.random.Generator, n: int) -> np.ndarray:
+    a = 6371e3 + rng.uniform(400e3, 1200e3, size=n)
+    r = rng.normal(size=(n, 3))
+    r /= np.linalg.norm(r, axis=-1, keepdims=True)
+    v = np.cross(r, rng.normal(size=(n, 3)))
+    v /= np.linalg.norm(v, axis=-1, keepdims=True)
+    return np.concatenate([a[:, None] * r, np.sqrt(MU / a)[:, None] * v], axis=-1)
+
+def brute_force_pairs(r: np.ndarray, threshold: float) -> np.ndarray:
+    d = np.linalg.norm(r.T[:, None] - r.T[None], axis=-1)
+    i, j = np.triu_indices(r.shape[1], 1)
+    close = d[i, j] < threshold
+    return np.stack([i[close], j[close]], axis=-1)
+
+def test_rk4_matches_gravity_dynamics():
+    """Test that the structure-of-arrays RK4 propagation matches
+    GravityDynamics on the same orbits.
+    """
+    x = circular_orbits(np.random.default_rng(0), 50)
+    constellation = Constellation.from_states(x, integrator="rk4")
+    gravity = GravityDynamics(mu=MU, dt=10.0)
+    x_13 = np.zeros((50, 13))
+    x_13[:, :3], x_13[:, 3], x_13[:, 7:10] = x[:, :3], 1.0, x[:, 3:]
+    for _ in range(20):
+        constellation.step(10.0)
+        x_13 = gravity.x_k_1(x_13, np.zeros(3))
+    assert np.allclose(constellation.r.T, x_13[:, :3], rtol=0, atol=1e-6)
+    assert np.allclose(constellation.v.T, x_13[:, 7:10], rtol=0, atol=1e-9)
+
+def test_j2_acceleration_is_potential_gradient():
+    """Test the J2 acceleration against a finite difference gradient of the
+    J2 gravitational potential.
+    """
+    def potential(r):
+        norm = np.linalg.norm(r, axis=0)
+        z2 = (r[2] / norm)**2
+        return MU / norm * (1 - 0.5 * J2_EARTH * (R_EARTH_EQUATORIAL / norm)**2 * (3 * z2 - 1))
+
+    x = circular_orbits(np.random.default_rng(1), 20)
+    constellation = Constellation.from_states(x, j2=True)
+    a = constellation.acceleration(constellation.r)
+    eps = 1.0
+    for axis in range(3):
+        dr = np.zeros((3, 1))
+        dr[axis] = eps
+        gradient = (potential(constellation.r + dr) - potential(constellation.r - dr)) / (2 * eps)
+        assert np.allclose(a[axis], gradient, rtol=1e-6, atol=1e-9)
+
+def test_verlet_conserves_energy():
+    """Test that the default symplectic integrator keeps the orbital energy
+    bounded over many orbits.
+    """
+    x = circular_orbits(np.random.default_rng(2), 100)
+    constellation = Constellation.from_states(x)
+    energy = lambda c: 0.5 * np.sum(c.v**2, axis=0) - MU / np.linalg.norm(c.r, axis=0)
+    e_0 = energy(constellation)
+    constellation.propagate(30.0, 2000)
+    assert constellation.t == pytest.approx(60000.0)
+    assert np.allclose(energy(constellation), e_0, rtol=1e-4)
+
+def test_screener_matches_brute_force():
+    """Test that the grid screener finds exactly the close pairs, including
+    crowded cells, over several incremental steps.
+    """
+    rng = np.random.default_rng(3)
+    x = circular_orbits(rng, 1500)
+    # A cluster of objects sharing cells, and a cluster straddling cell edges.
+    x[:40, :3] = x[0, :3] + rng.normal(scale=2e3, size=(40, 3))
+    x[40:80, :3] = np.floor(x[40, :3] / 10e3) * 10e3 + rng.normal(scale=5e3, size=(40, 3))
+    x[:40, 3:], x[40:80, 3:] = x[0, 3:], x[40, 3:]
+    constellation = Constellation.from_states(x)
+    screener = ConjunctionScreener(threshold=10e3)
+    for _ in range(5):
+        pairs, distances = screener.screen(constellation.r)
+        expected = brute_force_pairs(constellation.r, 10e3)
+        assert len(expected) > 100
+        assert np.array_equal(pairs, expected)
+        r = constellation.r
+        assert np.allclose(distances, np.linalg.norm(r[:, pairs[:, 0]] - r[:, pairs[:, 1]], axis=0))
+        constellation.step(1.0)
+
+def test_screener_no_pairs():
+    """Test screening objects that are all far apart."""
+    r = np.array([[0.0, 1e6, 2e6], [0.0, 0.0, 0.0], [7e6, 7e6, 7e6]])
+    pairs, distances = ConjunctionScreener(threshold=1e3).screen(r)
+    assert pairs.shape == (0, 2)
+    assert distances.shape == (0,)
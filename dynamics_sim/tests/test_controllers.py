@@ -0,0 +1,81 @@
+"""Unit tests for the controllers in dynamics_sim.controllers."""
+
+import numpy as np
+
+from dynamics_sim.controllers.controller import OpenLoopController
+from dynamics_sim.controllers.mppi import MPPI
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+
+def reach_cost(x: np.ndarray, u: np.ndarray, k: int) -> np.ndarray:
+    return 10.0 * (x[..., 0] - 1.0)**2 + x[..., 2]**2 + 1e-3 * np.sum(u**2, axis=-1)
+
+def test_open_loop_controller():
+    """Test that the open loop controller replays and then holds its tape."""
+    controller = OpenLoopController(np.array([[1.0, 0.0], [2.0, 0.0]]))
+    assert np.allclose(controller(np.zeros(4), 0), [1.0, 0.0])
+    assert np.allclose(controller(np.zeros(4), 5), [2.0, 0.0])
+    assert controller(np.zeros((3, 4)), 1).shape == (3, 2)
+
+def test_mppi_drives_box_to_target():
+    """Test that MPPI pushes a batch of boxes to p_x = 1 and holds them."""
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.1)
+    controller = MPPI(box, reach_cost, horizon=20, noise_sigma=np.array([5.0, 0.1]),
+                      num_samples=256, temperature=0.1,
+                      u_min=np.array([-10.0, -1.0]), u_max=np.array([10.0, 1.0]), seed=0)
+    x_0 = np.zeros((2, 4))
+    x_0[1, 0] = 2.0
+    states, controls = Simulator(box, controller, x_0, 120).simulate()
+    assert controls.shape == (120, 2, 2)
+    assert np.allclose(states[-1, :, 0], 1.0, atol=0.1)
+    assert np.allclose(states[-1, :, 2], 0.0, atol=0.3)
+
+def test_mppi_float32():
+    """Test that MPPI rolls out a float32 model in float32, reaching the same
+    target as in float64.
+    """
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.1, precision="float32")
+    controller = MPPI(box, reach_cost, horizon=20, noise_sigma=np.array([5.0, 0.1]),
+                      num_samples=256, temperature=0.1,
+                      u_min=np.array([-10.0, -1.0]), u_max=np.array([10.0, 1.0]), seed=0)
+    x_0 = np.zeros((2, 4), np.float32)
+    x_0[1, 0] = 2.0
+    states, controls = Simulator(box, controller, x_0, 120).simulate()
+    assert states.dtype == controls.dtype == np.float32
+    assert np.allclose(states[-1, :, 0], 1.0, atol=0.1)
+    assert np.allclose(states[-1, :, 2], 0.0, atol=0.3)
+
+def test_mppi_select_runs():
+    """Test that MPPI keeps the warm starts of the runs it is narrowed to."""
+    box = BoxDynamics(dt=0.05)
+    controller = MPPI(box, reach_cost, horizon=10, noise_sigma=np.array([5.0, 0.1]),
+                      num_samples=64, seed=0)
+    x = np.zeros((3, 4))
+    x[:, 0] = [0.0, 1.0, 2.0]
+    controller(x, 0)
+    U = controller.U.copy()
+    controller.select_runs(np.array([0, 2]))
+    assert np.array_equal(controller.U, U[[0, 2]])
+    # The next call plans from the kept warm starts instead of resetting them.
+    controller.U[0] = 10.0
+    u = controller(x[[0, 2]], 1)
+    assert u[0, 0] > 5.0
+
+def test_mppi_all_samples_diverge():
+    """Test that MPPI keeps its warm-started plan, rather than a NaN one,
+    for the environments whose sampled rollouts all diverge.
+    """
+    box = BoxDynamics(dt=0.05)
+
+    def cost(x, u, k):
+        # Every sample of the first environment diverges.
+        return np.where(x[..., 1] == 0.0, np.inf, reach_cost(x, u, k))
+
+    controller = MPPI(box, cost, horizon=10, noise_sigma=np.array([5.0, 0.1]),
+                      num_samples=64, u_init=np.array([1.0, 0.0]), seed=0)
+    x = np.array([[0.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    for k in range(3):
+        u = controller(x, k)
+        assert np.all(np.isfinite(u)) and np.all(np.isfinite(controller.U))
+        assert np.allclose(u[0], [1.0, 0.0])
+        assert not np.allclose(u[1], [1.0, 0.0])
@@ -0,0 +1,99 @@
+"""Unit tests for event detection and early termination."""
+
+import numpy as np
+
+from dynamics_sim.events import Event, diverged, reentry
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+from dynamics_sim.simulator import Simulator
+
+def coast(x_k: np.ndarray, k: int) -> np.ndarray:
+    return np.zeros(x_k.shape[:-1] + (2,))
+
+def test_box_stops_with_compaction():
+    """Test that boxes sliding to a stop are located precisely and dropped
+    from the active batch once they stop.
+    """
+    box = BoxDynamics(dt=0.05, surface_friction_coef=0.5)
+    batch_sizes = []
+    def controller(x_k, k):
+        batch_sizes.append(len(x_k))
+        return coast(x_k, k)
+
+    x_0 = np.zeros((3, 4))
+    x_0[:, 2] = [0.5, 1.0, 2.0]
+    stopped = Event(lambda x: x[..., 2], direction=-1, name="stopped")
+    result = Simulator(box, controller, x_0, 200).simulate_until([stopped])
+
+    t_stop = x_0[:, 2] / (0.5 * 9.81)
+    assert np.all(result.terminated)
+    assert np.allclose(result.t_event, t_stop, atol=1e-3)
+    assert np.array_equal(result.num_steps, np.ceil(t_stop / box.dt).astype(int) + 1)
+    assert np.allclose(result.states[-1, :, 2], 0.0, atol=1e-2)
+    # Runs leave the batch as they stop, and the simulation ends once all did.
+    assert batch_sizes == sorted(batch_sizes, reverse=True)
+    assert batch_sizes[-1] == 1
+    assert len(batch_sizes) == result.num_steps.max() - 1
+
+def test_reentry_and_unbatched():
+    """Test locating a reentry for a single (unbatched) falling satellite."""
+    model = GravityDynamics(dt=1.0)
+    x_0 = np.zeros(13)
+    x_0[0] = model.R + 100e3
+    x_0[3] = 1.0
+    result = Simulator(model, lambda x, k: np.zeros(3), x_0, 500).simulate_until([reentry(model)])
+    assert result.states.shape == (500, 13)
+    assert result.event_index[0] == 0
+    k = result.num_steps[0] - 1
+    assert np.isclose(np.linalg.norm(result.states[k, :3]), model.R, atol=1.0)
+    assert np.allclose(result.states[k:], result.states[k])
+
+def test_divergence_and_non_terminal_events():
+    """Test that NaN states stop a run, and that non-terminal events are only
+    recorded.
+    """
+    box = BoxDynamics(dt=0.1)
+    def controller(x_k, k):
+        # Only the run starting at p_y = 0 is sent a NaN control.
+        u = coast(x_k, k) + 1.0
+        u[(x_k[:, 1] == 0.0) & (k >= 5)] = np.nan
+        return u
+
+    half = Event(lambda x: x[..., 0] - 1e-3, terminal=False)
+    x_0 = np.zeros((2, 4))
+    x_0[1, 1] = -1.0
+    result = Simulator(box, controller, x_0, 50).simulate_until([half, diverged()])
+    assert result.event_index.tolist() == [1, -1]
+    assert result.num_steps.tolist() == [7, 50]
+    assert [(run, j) for run, j, _, _ in result.occurrences][:3] == [(0, 0), (1, 0), (0, 1)]
+
+def test_per_run_parameters_and_controller_state():
+    """Test that per-run parameters and controller state are compacted along
+    with the active runs.
+    """
+    friction = np.array([1.0, 0.25, 0.5])
+    box = BoxDynamics(dt=0.05, surface_friction_coef=friction)
+
+    class Tracker:
+        """Remembers the lateral position of each of its runs."""
+        def __init__(self, y):
+            self.y = y
+        def select_runs(self, index):
+            self.y = self.y[index]
+        def __call__(self, x_k, k):
+            assert np.array_equal(x_k[:, 1], self.y)
+            return coast(x_k, k)
+
+    x_0 = np.zeros((3, 4))
+    x_0[:, 1] = [1.0, 2.0, 3.0]
+    x_0[:, 2] = 1.0
+    stopped = Event(lambda x: x[..., 2], direction=-1, name="stopped")
+    result = Simulator(box, Tracker(x_0[:, 1].copy()), x_0, 200).simulate_until([stopped])
+
+    # Each run stops as it would have on its own.
+    assert np.allclose(result.t_event, 1.0 / (friction * 9.81), atol=1e-3)
+    for i in range(3):
+        single = BoxDynamics(dt=0.05, surface_friction_coef=friction[i])
+        alone = Simulator(single, coast, x_0[i], 200).simulate_until([stopped])
+        assert result.num_steps[i] == alone.num_steps[0]
+        assert np.allclose(result.t_event[i], alone.t_event[0])
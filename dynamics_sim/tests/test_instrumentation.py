@@ -0,0 +1,89 @@
+"""Unit tests for the opt-in Profiler."""
+
+import json
+import time
+
+import numpy as np
+import pytest
+
+from dynamics_sim import jit
+from dynamics_sim.instrumentation import FUSED_STEPS, PhaseStats, Profiler
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+
+class ListSink:
+    def __init__(self):
+        self.states = []
+
+    def append(self, x_k, u_k=None):
+        self.states.append(x_k.copy())
+
+def controller(x_k: np.ndarray, k: int) -> np.ndarray:
+    return np.zeros(x_k.shape[:-1] + (2,))
+
+def test_profile_simulation(tmp_path):
+    """Test the counts and timings of an instrumented batched rollout, and
+    that detaching restores the original methods.
+    """
+    box = BoxDynamics()
+    simulator = Simulator(box, controller, np.zeros((8, 4)), 50)
+    sink = ListSink()
+    profiler = Profiler()
+    with profiler.attach(simulator, sink):
+        simulator.stream(sink)
+
+    # RK4 evaluates the dynamics 4 times per step.
+    assert profiler.phases["x_k_1"].count == 49
+    assert profiler.phases["integrator"].count == 49
+    assert profiler.phases["x_dot_k_1"].count == 4 * 49
+    assert profiler.counters["x_dot_k_1 states"] == 4 * 49 * 8
+    assert profiler.phases["controller"].count == 50
+    assert profiler.phases["sink"].count == 50
+    assert FUSED_STEPS not in profiler.counters
+    counts, edges = profiler.histogram("x_dot_k_1")
+    assert counts.sum() == 4 * 49 and len(edges) == len(counts) + 1
+    stats = profiler.stats()
+    # The integrator phase is the part of x_k_1 outside of x_dot_k_1.
+    assert stats["integrator"]["total"] < stats["x_k_1"]["total"]
+    assert "x_dot_k_1" in profiler.summary()
+
+    profiler.export_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        trace = json.load(f)
+    assert len(trace["traceEvents"]) == 49 + 4 * 49 + 50 + 50
+
+    # Nothing is left behind on the instances once detached.
+    assert "x_dot_k_1" not in vars(box) and "x_k_1" not in vars(box)
+    assert simulator.controller is controller
+    assert "append" not in vars(sink)
+
+def test_phase_stats_are_bounded():
+    """Test that the streaming phase statistics keep a fixed amount of
+    memory, and that their percentiles are within a bin of the exact ones.
+    """
+    durations = np.random.default_rng(0).lognormal(np.log(2e4), 1.0, size=20000).astype(int)
+    stats = PhaseStats()
+    size = stats.counts.nbytes
+    for duration in durations:
+        stats.add(int(duration))
+    assert stats.counts.nbytes == size
+    assert stats.count == len(durations) and stats.total_ns == durations.sum()
+    assert stats.min_ns == durations.min() and stats.max_ns == durations.max()
+    bin_ratio = 10 ** (1 / PhaseStats.BINS_PER_DECADE)
+    for q in (50, 90, 99):
+        exact = np.percentile(durations, q) * 1e-9
+        assert exact / bin_ratio <= stats.percentile(q) <= exact * bin_ratio
+
+@pytest.mark.skipif(not jit.NUMBA_AVAILABLE, reason="Numba is not installed")
+def test_fused_steps_are_flagged():
+    """Test that numba steps, which bypass x_dot_k_1, are counted as fused
+    instead of silently dropping their derivative evaluations.
+    """
+    box = BoxDynamics(backend="numba")
+    profiler = Profiler()
+    with profiler.attach(box):
+        for _ in range(5):
+            box.x_k_1(np.zeros((8, 4)), np.zeros(2))
+    assert profiler.counters[FUSED_STEPS] == 5
+    assert "x_dot_k_1" not in profiler.stats()
+    assert "fused" in profiler.summary()
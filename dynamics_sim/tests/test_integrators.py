@@ -0,0 +1,122 @@
+"""Unit tests for the integrators defined in dynamics_sim.integrators."""
+
+import numpy as np
+import pytest
+
+from dynamics_sim.integrators import get_integrator
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+
+def circular_orbit(mu: float, radius: float) -> np.ndarray:
+    x = np.zeros(13)
+    x[0] = radius
+    x[3] = 1.0
+    x[8] = np.sqrt(mu / radius)
+    return x
+
+def orbital_energy(x: np.ndarray, mu: float) -> float:
+    return 0.5 * np.dot(x[7:10], x[7:10]) - mu / np.linalg.norm(x[0:3])
+
+def test_rk4_matches_reference():
+    """Test the in-place RK4 against the textbook RK4 expression."""
+    box = BoxDynamics(surface_friction_coef=0.5, dt=0.05)
+    x_k = np.array([[0.0, 0.0, 1.0, 0.5], [1.0, 2.0, -1.0, 0.0]])
+    u_k = np.array([3.0, 1.0])
+
+    f, dt = box.x_dot_k_1, box.dt
+    k1 = f(x_k, u_k)
+    k2 = f(x_k + 0.5 * dt * k1, u_k)
+    k3 = f(x_k + 0.5 * dt * k2, u_k)
+    k4 = f(x_k + dt * k3, u_k)
+    expected = x_k + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    assert np.allclose(box.x_k_1(x_k, u_k), expected)
+    out = np.empty_like(x_k)
+    assert box.x_k_1(x_k, u_k, out=out) is out
+    assert np.allclose(out, expected)
+
+@pytest.mark.parametrize("name", ["euler", "semi_implicit_euler", "rk4", "velocity_verlet"])
+def test_integrators_agree_at_small_dt(name):
+    """Test that every integrator approximates the same trajectory."""
+    reference = BoxDynamics(dt=1e-3, integrator="rk4")
+    box = BoxDynamics(dt=1e-3, integrator=name)
+    x_ref = x_k = np.array([0.0, 0.0, 1.0, 0.0])
+    u_k = np.array([2.0, 0.0])
+    for _ in range(100):
+        x_ref = reference.x_k_1(x_ref, u_k)
+        x_k = box.x_k_1(x_k, u_k)
+    assert np.allclose(x_k, x_ref, atol=1e-3)
+
+def test_out_may_alias_input():
+    """Test that x_k_1 can write its result over its own input."""
+    for name in ["euler", "semi_implicit_euler", "rk4", "velocity_verlet"]:
+        box = BoxDynamics(integrator=name)
+        x_k = np.array([0.0, 0.0, 1.0, 0.0])
+        u_k = np.array([2.0, 0.0])
+        expected = box.x_k_1(x_k, u_k)
+        box.x_k_1(x_k, u_k, out=x_k)
+        assert np.allclose(x_k, expected)
+
+def test_verlet_bounds_orbital_energy():
+    """Test that velocity Verlet keeps orbital energy bounded at a large dt
+    where explicit Euler visibly drifts.
+    """
+    mu, radius = 3.986e14, 7000e3
+    x_0 = circular_orbit(mu, radius)
+    e_0 = orbital_energy(x_0, mu)
+    drift = {}
+    for name in ["euler", "velocity_verlet"]:
+        model = GravityDynamics(dt=30.0, integrator=name)
+        x_k = x_0.copy()
+        for _ in range(1000):
+            model.x_k_1(x_k, np.zeros(3), out=x_k)
+        drift[name] = abs(orbital_energy(x_k, mu) - e_0) / abs(e_0)
+    assert drift["velocity_verlet"] < 1e-3
+    assert drift["euler"] > 100 * drift["velocity_verlet"]
+
+def test_unknown_integrator():
+    """Test that unknown integrator names are rejected."""
+    with pytest.raises(ValueError):
+        get_integrator("not_an_integrator")
+
+def test_partitioned_integrator_requires_partition():
+    """Test that the symplectic integrators require position/velocity slices."""
+    class Decay(DynamicsModel):
+        def x_dot_k_1(self, x_k, u_k, out=None):
+            return np.negative(x_k, out=out)
+
+    model = Decay(integrator="leapfrog")
+    with pytest.raises(ValueError):
+        model.x_k_1(np.ones(2), np.zeros(1))
+
+def test_propagate_dense_output_tracks_circular_orbit():
+    """Test that the adaptive propagation follows a circular orbit with few
+    steps and that its dense output is accurate between steps.
+    """
+    mu, radius = 3.986e14, 7000e3
+    model = GravityDynamics(mu=mu)
+    x_0 = circular_orbit(mu, radius)
+    period = 2 * np.pi * np.sqrt(radius**3 / mu)
+
+    solution = model.propagate(x_0, np.zeros(3), period, rtol=1e-10, atol=1e-6)
+    assert len(solution.t) < 1000
+
+    t = np.linspace(0, period, 333)
+    n = 2 * np.pi / period
+    expected = radius * np.stack([np.cos(n * t), np.sin(n * t)], axis=-1)
+    assert np.allclose(solution(t)[:, 0:2], expected, atol=1.0)
+    assert np.allclose(solution(period), solution.x[-1])
+
+def test_dopri5_as_model_integrator():
+    """Test that the adaptive integrator can step a model at a large dt."""
+    mu, radius = 3.986e14, 7000e3
+    x_0 = circular_orbit(mu, radius)
+    coarse = GravityDynamics(mu=mu, dt=60.0, integrator="dopri5")
+    fine = GravityDynamics(mu=mu, dt=1.0, integrator="rk4")
+    x_coarse, x_fine = x_0.copy(), x_0.copy()
+    for _ in range(10):
+        coarse.x_k_1(x_coarse, np.zeros(3), out=x_coarse)
+    for _ in range(600):
+        fine.x_k_1(x_fine, np.zeros(3), out=x_fine)
+    assert np.allclose(x_coarse, x_fine, atol=1e-2)
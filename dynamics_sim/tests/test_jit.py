@@ -0,0 +1,116 @@
+"""Parity tests for the numba backend against the NumPy implementation."""
+
+import numpy as np
+import pytest
+
+from dynamics_sim import jit
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+from dynamics_sim.simulator import Simulator
+
+requires_numba = pytest.mark.skipif(not jit.NUMBA_AVAILABLE, reason="Numba is not installed")
+
+def box_case(rng, n):
+    x = rng.normal(size=(n, 4))
+    u = rng.normal(size=(n, 2))
+    return x, u
+
+def gravity_case(rng, n):
+    x = np.zeros((n, 13))
+    x[:, :3] = rng.normal(size=(n, 3)) * 1e3 + [7000e3, 0, 0]
+    q = rng.normal(size=(n, 4))
+    x[:, 3:7] = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    x[:, 7:10] = rng.normal(size=(n, 3)) * 10 + [0, 7.5e3, 0]
+    x[:, 10:] = rng.normal(size=(n, 3))
+    return x, rng.normal(size=(n, 3))
+
+MODELS = [(BoxDynamics, {"surface_friction_coef": 0.5}, box_case),
+          (GravityDynamics, {"dt": 1.0}, gravity_case),
+          (GravityDynamics, {"dt": 1.0, "attitude": "lie"}, gravity_case)]
+
+@requires_numba
+@pytest.mark.parametrize("model_cls, kwargs, case", MODELS)
+@pytest.mark.parametrize("integrator", ["euler", "rk4"])
+def test_step_parity(model_cls, kwargs, case, integrator):
+    """Test that the compiled step matches the NumPy step, batched, single,
+    and in place.
+    """
+    rng = np.random.default_rng(0)
+    reference = model_cls(integrator=integrator, **kwargs)
+    compiled = model_cls(integrator=integrator, backend="numba", **kwargs)
+    assert compiled._jit_step is not None
+    x, u = case(rng, 16)
+
+    expected = reference.x_k_1(x, u)
+    assert np.allclose(compiled.x_k_1(x, u), expected, rtol=1e-12, atol=1e-9)
+    assert np.allclose(compiled.x_k_1(x[3], u[3]), expected[3], rtol=1e-12, atol=1e-9)
+    # A single control broadcast across the batch.
+    assert np.allclose(compiled.x_k_1(x, u[0]), reference.x_k_1(x, u[0]), rtol=1e-12, atol=1e-9)
+    x_in_place = x.copy()
+    compiled.x_k_1(x_in_place, u, out=x_in_place)
+    assert np.allclose(x_in_place, expected, rtol=1e-12, atol=1e-9)
+
+@requires_numba
+def test_closed_loop_and_rollout_parity():
+    """Test a closed-loop Simulator run and the fused open-loop rollout."""
+    rng = np.random.default_rng(1)
+    controls = rng.normal(size=(99, 5, 2)) * 5
+    x_0 = np.zeros((5, 4))
+    reference = BoxDynamics(surface_friction_coef=0.3)
+    compiled = BoxDynamics(surface_friction_coef=0.3, backend="numba")
+
+    expected = jit.rollout(reference, x_0, controls)
+    assert np.allclose(jit.rollout(compiled, x_0, controls), expected, atol=1e-12)
+
+    controller = lambda x_k, k: controls[min(k, 98)]
+    states, _ = Simulator(compiled, controller, x_0, 100).simulate()
+    assert np.allclose(states, expected, atol=1e-12)
+
+@requires_numba
+@pytest.mark.parametrize("attitude", ["additive", "lie"])
+def test_gravity_rollout_parity(attitude):
+    """Test that the open-loop rollout of both attitude modes matches
+    stepping the NumPy model, including the lie mode's attitude update,
+    which the compiled kernel does not perform.
+    """
+    rng = np.random.default_rng(4)
+    x_0, _ = gravity_case(rng, 4)
+    controls = rng.normal(size=(49, 4, 3))
+    reference = GravityDynamics(dt=1.0, attitude=attitude)
+    compiled = GravityDynamics(dt=1.0, attitude=attitude, backend="numba")
+    assert compiled.fuses_rollouts() == (attitude == "additive")
+
+    expected = np.empty((50, 4, 13))
+    expected[0] = x_0
+    for k in range(1, 50):
+        expected[k] = reference.x_k_1(expected[k - 1], controls[k - 1])
+    states = jit.rollout(compiled, x_0, controls)
+    assert np.allclose(states, expected, rtol=1e-12, atol=1e-9)
+    if attitude == "lie":
+        assert np.allclose(np.linalg.norm(states[..., 3:7], axis=-1), 1.0, atol=1e-12)
+    # Other dtypes are kept rather than upcast.
+    assert jit.rollout(compiled, x_0.astype(np.float32), controls).dtype == np.float32
+
+@requires_numba
+def test_unsupported_inputs_fall_back():
+    """Test that array-valued parameters, float32 states and unsupported
+    integrators use the NumPy implementation.
+    """
+    x, u = box_case(np.random.default_rng(2), 3)
+    masses = np.array([1.0, 2.0, 3.0])
+    compiled = BoxDynamics(box_mass=masses, backend="numba")
+    assert np.allclose(compiled.x_k_1(x, u), BoxDynamics(box_mass=masses).x_k_1(x, u))
+    x32, u32 = x.astype(np.float32), u.astype(np.float32)
+    assert BoxDynamics(backend="numba").x_k_1(x32, u32).dtype == np.float32
+    with pytest.warns(UserWarning):
+        assert BoxDynamics(integrator="velocity_verlet", backend="numba")._jit_step is None
+
+def test_fallback_without_numba(monkeypatch):
+    """Test that selecting the numba backend without Numba warns and keeps
+    working with NumPy.
+    """
+    monkeypatch.setattr(jit, "NUMBA_AVAILABLE", False)
+    with pytest.warns(UserWarning, match="Numba is not installed"):
+        box = BoxDynamics(backend="numba")
+    x, u = box_case(np.random.default_rng(3), 4)
+    assert np.allclose(box.x_k_1(x, u), BoxDynamics().x_k_1(x, u))
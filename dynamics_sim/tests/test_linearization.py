@@ -0,0 +1,74 @@
+"""Unit tests for DynamicsModel.linearize and the finite difference fallback."""
+
+import numpy as np
+
+from dynamics_sim.linearization import finite_difference_jacobians
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.dynamics_model import DynamicsModel
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+
+def test_finite_differences_of_linear_map():
+    """Test the batched finite differences on an exactly linear function."""
+    rng = np.random.default_rng(0)
+    A_true = rng.normal(size=(3, 3))
+    B_true = rng.normal(size=(3, 2))
+    f = lambda x, u: x @ A_true.T + u @ B_true.T
+    A, B = finite_difference_jacobians(f, rng.normal(size=(5, 3)), rng.normal(size=(5, 2)))
+    assert A.shape == (5, 3, 3) and B.shape == (5, 3, 2)
+    assert np.allclose(A, A_true) and np.allclose(B, B_true)
+
+    # float32 inputs are differentiated in float32, with a step suited to it.
+    x32, u32 = rng.normal(size=(5, 3)).astype(np.float32), rng.normal(size=(5, 2)).astype(np.float32)
+    A, B = finite_difference_jacobians(lambda x, u: f(x, u).astype(x.dtype), x32, u32)
+    assert A.dtype == B.dtype == np.float32
+    assert np.allclose(A, A_true, atol=1e-3) and np.allclose(B, B_true, atol=1e-3)
+
+def test_box_analytic_matches_finite_differences():
+    """Test the analytic box Jacobians against the generic fallback."""
+    for integrator in ["euler", "rk4"]:
+        box = BoxDynamics(surface_friction_coef=0.5, integrator=integrator)
+        x = np.array([[0.0, 0.0, 1.0, 0.0], [1.0, 0.0, -1.0, 0.5]])
+        u = np.array([[1.0, 2.0], [3.0, 4.0]])
+        A, B = box.jacobians(x, u)
+        A_fd, B_fd = DynamicsModel.jacobians(box, x, u)
+        assert np.allclose(A, A_fd, atol=1e-8) and np.allclose(B, B_fd, atol=1e-8)
+
+def test_linearize_trajectory_and_cache():
+    """Test linearizing a whole trajectory at once, and that repeated
+    linearizations of the same trajectory come from the cache.
+    """
+    model = GravityDynamics(dt=1.0)
+    x = np.zeros((20, 13))
+    x[:, 0] = 7000e3
+    x[:, 3] = 1.0
+    x[:, 8] = 7.5e3
+    u = np.zeros((20, 3))
+    A, B = model.linearize(x, u)
+    assert A.shape == (20, 13, 13) and B.shape == (20, 13, 3)
+
+    A_0, B_0 = model.linearize(x[0], u[0])
+    assert np.allclose(A_0, A[0]) and np.allclose(B_0, B[0])
+    assert model.linearize(x, u)[0] is A
+    assert not A.flags.writeable
+
+    model.clear_linearization_cache()
+    assert model.linearize(x, u)[0] is not A
+
+def test_linearize_after_parameter_change():
+    """Test that changing a parameter or the integrator's settings is not
+    served stale linearizations from the cache.
+    """
+    model = GravityDynamics(dt=1.0)
+    x = np.zeros(13)
+    x[0], x[3], x[8] = 7000e3, 1.0, 7.5e3
+    u = np.zeros(3)
+    A_1, _ = model.linearize(x, u)
+    model.mu = 2 * model.mu
+    A_2, _ = model.linearize(x, u)
+    assert not np.allclose(A_1, A_2)
+    assert np.allclose(A_2, GravityDynamics(mu=model.mu, dt=1.0).linearize(x, u)[0])
+
+    model.integrator = "dopri5"
+    A_3, _ = model.linearize(x, u)
+    model.integrator.rtol = 1e-3
+    assert model.linearize(x, u)[0] is not A_3
@@ -0,0 +1,38 @@
+"""Unit tests for the plotting utilities."""
+
+import numpy as np
+
+from dynamics_sim.plotting import lttb, minmax_decimate, plot_states
+
+def test_downsampling_keeps_extremes():
+    """Test that both downsampling algorithms keep a single-sample spike."""
+    t = np.linspace(0, 10, 100000)
+    y = np.sin(t)
+    y[54321] = 10.0
+    for keep in [lttb(t, y, 500), minmax_decimate(y, 500)]:
+        assert len(keep) <= 502
+        assert np.all(np.diff(keep) > 0)
+        assert 54321 in keep
+        assert keep[0] == 0 and keep[-1] == len(y) - 1
+
+def test_plot_states_downsampled_webgl():
+    """Test the downsampled WebGL mode with a time axis in seconds."""
+    states = np.random.default_rng(0).normal(size=(50000, 3))
+    fig = plot_states(states, ["a", "b", "c"], dt=0.01, max_points=1000)
+    assert len(fig.data) == 3
+    assert all(trace.type == "scattergl" for trace in fig.data)
+    assert all(len(trace.x) <= 1000 for trace in fig.data)
+    assert np.isclose(fig.data[0].x[-1], 49999 * 0.01)
+
+def test_plot_states_batched_percentile_bands():
+    """Test that a batch of runs is drawn as percentile bands."""
+    states = np.random.default_rng(0).normal(size=(1000, 64, 2)).cumsum(axis=0)
+    fig = plot_states(states, ["a", "b"], max_points=100, percentiles=(10, 50, 90))
+    # One (lower, upper) band pair and one median per state.
+    assert len(fig.data) == 2 * 3
+    assert all(len(trace.x) == 100 for trace in fig.data)
+
+def test_plot_states_default_unchanged():
+    """Test that the default mode still plots every timestep with SVG."""
+    fig = plot_states(np.zeros((10, 4)), ["a", "b", "c", "d"])
+    assert all(trace.type == "scatter" and len(trace.x) == 10 for trace in fig.data)
@@ -0,0 +1,140 @@
+"""Unit tests for float32 simulation and the drift report."""
+
+import numpy as np
+import pytest
+import quatmath as qm
+
+from dynamics_sim.cache import rollout_key
+from dynamics_sim.integrators import INTEGRATORS
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+from dynamics_sim.precision import drift_report, resolve_dtype
+from dynamics_sim.simulator import Simulator
+from dynamics_sim.sweep import grid, sweep
+from dynamics_sim.trajectory_io import TrajectoryReader, TrajectoryWriter
+
+def orbit_states(num_runs: int, dtype=np.float64) -> np.ndarray:
+    x_0 = np.zeros((num_runs, 13))
+    x_0[:, 0] = np.linspace(6800e3, 7200e3, num_runs)
+    x_0[:, 3] = 1.0
+    x_0[:, 8] = np.sqrt(3.986e14 / x_0[:, 0])
+    x_0[:, 10:] = 0.01
+    return x_0.astype(dtype)
+
+def test_float32_everywhere():
+    """Test that float32 states stay float32 through every integrator, both
+    attitude modes, and quatmath.
+    """
+    for name in INTEGRATORS:
+        for model, x_k, u_k in [
+                (BoxDynamics(integrator=name, precision="float32"),
+                 np.ones((3, 4), np.float32), np.ones((3, 2))),
+                (GravityDynamics(integrator=name, attitude="lie", precision="float32"),
+                 orbit_states(3, np.float32), np.zeros(3))]:
+            assert model.x_k_1(x_k, u_k).dtype == np.float32, name
+
+    q = np.ones((5, 4), np.float32)
+    v = np.ones((5, 3), np.float32)
+    for result in [qm.invert(q), qm.compose(q, q), qm.Q(q), qm.rotate(q, v), qm.exp(v),
+                   qm.L(q), qm.G(q), qm.skew(v), qm.hat(v)]:
+        assert result.dtype == np.float32
+
+def test_no_silent_upcast():
+    """Test that a reduced precision model rejects states of another dtype,
+    and casts controls and (a copy of) its array parameters down.
+    """
+    box = BoxDynamics(box_mass=np.array([1.0, 2.0]), precision="float32")
+    with pytest.raises(TypeError):
+        box.x_k_1(np.zeros((2, 4)), np.zeros(2))
+    with pytest.raises(TypeError):
+        box.x_k_1(np.zeros((2, 4), np.float32), np.zeros(2), out=np.empty((2, 4)))
+    assert box.x_k_1(np.zeros((2, 4), np.float32), np.ones(2)).dtype == np.float32
+    assert box.parameters()["precision"] == "float32"
+
+    # The model's own parameters stay float64, so switching back to float64
+    # loses nothing, and its rollout cache keys do not change by stepping.
+    box_mass = np.array([1.0 + 1e-12, 2.0])
+    box = BoxDynamics(box_mass=box_mass, precision="float32")
+    key = rollout_key(box, np.zeros((2, 4)), np.ones((5, 2)))
+    single = box.x_k_1(np.ones((2, 4), np.float32), np.ones(2))
+    assert box.parameters()["box_mass"] is box_mass
+    assert rollout_key(box, np.zeros((2, 4)), np.ones((5, 2))) == key
+    box.precision = None
+    double = box.x_k_1(np.ones((2, 4)), np.ones(2))
+    assert np.array_equal(double, BoxDynamics(box_mass=box_mass).x_k_1(np.ones((2, 4)), np.ones(2)))
+    assert np.allclose(single, double, rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        resolve_dtype("float16")
+    # Models without a precision keep stepping states of any dtype.
+    assert BoxDynamics().x_k_1(np.zeros(4, np.float32), np.zeros(2, np.float32)).dtype == \
+        np.float32
+
+def test_float32_pipeline(tmp_path):
+    """Test that a float32 rollout is simulated, streamed and stored as
+    float32, and that a float32 sweep matches its float64 counterpart.
+    """
+    box = BoxDynamics(precision="float32")
+    simulator = Simulator(box, lambda x_k, k: np.array([10.0, 0.0]),
+                          np.zeros(4, np.float32), 100)
+    states, controls = simulator.simulate()
+    assert states.dtype == controls.dtype == np.float32
+    with TrajectoryWriter(str(tmp_path), model=box) as writer:
+        simulator.stream(writer)
+    stored = TrajectoryReader(str(tmp_path)).states
+    assert stored.dtype == np.float32
+    assert np.array_equal(stored, states)
+
+    params = grid(box_mass=[1.0, 2.0], surface_friction_coef=[0.0, 0.2])
+    controller = lambda x_k, k: np.array([5.0, 0.0])
+    single = sweep(BoxDynamics, params, controller, np.zeros(4), 200, num_workers=1,
+                   precision="float32")
+    double = sweep(BoxDynamics, params, controller, np.zeros(4), 200, num_workers=1)
+    assert single.dtype == np.float32
+    assert np.allclose(single, double, rtol=1e-4, atol=1e-4)
+
+def test_drift_report():
+    """Test that the drift report samples the batch, and picks up the
+    rounding error of float32 positions in orbit.
+    """
+    gravity = GravityDynamics(mu=np.linspace(3.98e14, 3.99e14, 100), dt=1.0,
+                              precision="float32")
+    report = drift_report(gravity, lambda x_k, k: np.zeros(3), orbit_states(100), 200,
+                          sample_size=10)
+    assert len(report.sample) == 10
+    assert report.drift.shape == (200,)
+    # The drift starts at the rounding error of the float32 initial states.
+    assert report.drift[0] < 1e-7 < report.drift[-1]
+    # float32 spaces orbital radii of ~7000 km half a meter apart, so the
+    # positions drift by meters.
+    assert 1e-2 < report.max_abs_error[0] < 1e3
+    assert report.within(1e-3)
+    assert not report.within(1e-9)
+    assert "r_N x (m)" in str(report)
+
+def test_float32_propagate_and_linearize():
+    """Test that propagate and linearize check and keep a reduced precision
+    model's dtype, and match their float64 counterparts.
+    """
+    gravity = GravityDynamics(dt=1.0, precision="float32")
+    reference = GravityDynamics(dt=1.0)
+    x_0 = orbit_states(2, np.float32)
+    with pytest.raises(TypeError):
+        gravity.propagate(x_0.astype(np.float64), np.zeros(3), 10.0)
+    with pytest.raises(TypeError):
+        gravity.linearize(x_0[0].astype(np.float64), np.zeros(3))
+
+    solution = gravity.propagate(x_0, np.zeros(3), 600.0)
+    expected = reference.propagate(x_0.astype(np.float64), np.zeros(3), 600.0)
+    assert solution.x.dtype == solution(300.0).dtype == np.float32
+    assert np.allclose(solution(600.0), expected(600.0), rtol=1e-5)
+
+    # Finite differences of float32 steps would lose the velocity
+    # perturbations of the positions to rounding.
+    A, B = gravity.linearize(x_0[0], np.zeros(3))
+    A_ref, B_ref = reference.linearize(x_0[0].astype(np.float64), np.zeros(3))
+    assert A.dtype == B.dtype == np.float32
+    assert np.allclose(A, A_ref, rtol=1e-6, atol=1e-9)
+    assert np.allclose(B, B_ref, rtol=1e-6, atol=1e-9)
+    # The model's own linearization cache is unaffected by the float64 copy.
+    assert len(gravity._linearization_cache) == 1
@@ -0,0 +1,131 @@
+"""Unit tests for the ZeroMQ real-time simulation server."""
+
+import asyncio
+import time
+
+import numpy as np
+import zmq
+
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.server import (SimulationServer, decode_frame, encode_frame, send_control,
+                                 subscriber)
+
+LOCAL = "tcp://127.0.0.1:*"
+
+def test_frame_round_trip():
+    """Test encoding and decoding single and batched state frames."""
+    for x, u in [(np.arange(4.0), np.array([1.0, 2.0])),
+                 (np.arange(12, dtype=np.float32).reshape(3, 4), np.ones((3, 2), np.float32))]:
+        k, t, x_k, u_k = decode_frame(encode_frame(7, 0.07, x, u))
+        assert (k, t) == (7, 0.07)
+        assert x_k.dtype == x.dtype
+        assert np.array_equal(x_k, x)
+        assert np.array_equal(u_k, u)
+
+def test_publish_and_control():
+    """Test that subscribers receive frames in order, and that controls sent
+    by a client are applied by the server.
+
+    Frames may be dropped under load (the PUB socket's high water mark is 16
+    frames), so only the order of the received frames is checked.
+    """
+    context = zmq.Context()
+    recorder = controls = None
+    try:
+        box = BoxDynamics(dt=0.01, surface_friction_coef=0.0)
+        with SimulationServer(box, np.zeros(4), np.zeros(2), pub_address=LOCAL,
+                              control_address=LOCAL, rate=10.0, context=context) as server:
+            recorder = subscriber(server.pub_endpoint, conflate=False, context=context)
+            controls = context.socket(zmq.PUSH)
+            controls.connect(server.control_endpoint)
+            # Let the subscription reach the publisher before the run starts.
+            time.sleep(0.2)
+
+            async def client():
+                await asyncio.sleep(0.05)
+                send_control(controls, np.array([10.0, 0.0]))
+
+            async def session():
+                await asyncio.gather(server.run(num_steps=200), client())
+            asyncio.run(session())
+            assert server.k == 200
+
+            frames = []
+            while len(frames) < 200 and recorder.poll(500):
+                frames.append(decode_frame(recorder.recv()))
+            assert frames
+            ks = [k for k, _, _, _ in frames]
+            assert ks == sorted(set(ks)) and ks[-1] < 200
+            # Once a frame shows the control, every later frame does too.
+            applied = [u_k[0] == 10.0 for _, _, _, u_k in frames]
+            assert applied == sorted(applied)
+            assert server.u_k[0] == 10.0
+            # The box only moved once the control arrived.
+            assert server.x_k[2] > 0.0
+            assert server.rejected_controls == 0
+    finally:
+        for socket in (recorder, controls):
+            if socket is not None:
+                socket.close(linger=0)
+        context.term()
+
+def test_conflating_subscriber_gets_latest():
+    """Test that a subscriber that does not keep up only sees the latest
+    frame, without holding the server back.
+    """
+    context = zmq.Context()
+    display = None
+    try:
+        box = BoxDynamics(dt=0.01)
+        with SimulationServer(box, np.zeros(4), np.zeros(2), pub_address=LOCAL,
+                              control_address=LOCAL, rate=10.0, context=context) as server:
+            display = subscriber(server.pub_endpoint, context=context)
+            time.sleep(0.2)
+            asyncio.run(server.run(num_steps=50))
+            # Frames still in flight may arrive after the first one is read,
+            # so keep reading until the socket goes quiet.
+            ks = []
+            while len(ks) < 50 and display.poll(500):
+                ks.append(decode_frame(display.recv())[0])
+            assert ks and ks[-1] == 49
+            assert len(ks) < 50
+    finally:
+        if display is not None:
+            display.close(linger=0)
+        context.term()
+
+def test_step_budget_when_falling_behind():
+    """Test that run(num_steps) stops after num_steps steps even when a slow
+    model keeps the loop skipping ahead.
+    """
+
+    class SlowBox(BoxDynamics):
+        def x_k_1(self, x_k, u_k, out=None):
+            time.sleep(0.002)
+            return super().x_k_1(x_k, u_k, out=out)
+
+    with SimulationServer(SlowBox(dt=0.0001), np.zeros(4), np.zeros(2), pub_address=LOCAL,
+                          control_address=LOCAL, max_lag=2) as server:
+        asyncio.run(server.run(num_steps=20))
+        assert server.k == 20
+        assert server.skipped > 0
+        asyncio.run(server.run(num_steps=5))
+        assert server.k == 25
+
+def test_real_time_rate():
+    """Test that the loop runs at the requested rate and can be stopped."""
+    box = BoxDynamics(dt=0.01)
+    with SimulationServer(box, np.zeros(4), np.zeros(2), pub_address=LOCAL,
+                          control_address=LOCAL, rate=0.5) as server:
+        async def stop_later():
+            await asyncio.sleep(0.3)
+            server.stop()
+
+        async def session():
+            await asyncio.gather(server.run(), stop_later())
+        start = time.monotonic()
+        asyncio.run(session())
+        elapsed = time.monotonic() - start
+    # 50 steps per wall clock second, and never faster.
+    assert 0.3 <= elapsed < 1.0
+    assert 5 <= server.k <= 16
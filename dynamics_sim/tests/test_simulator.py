@@ -0,0 +1,38 @@
+"""Unit tests for the Simulator class."""
+
+import numpy as np
+import pytest
+
+from dynamics_sim.models.box_dynamics import BoxDynamics
+from dynamics_sim.simulator import Simulator
+
+def push(x_k: np.ndarray, k: int) -> np.ndarray:
+    return np.array([10.0, 0.0]) if k < 10 else np.array([0.0, 0.0])
+
+def test_simulate_matches_manual_loop():
+    """Test that the simulator reproduces a hand-written rollout loop."""
+    box = BoxDynamics(surface_friction_coef=0.5)
+    x_0 = np.zeros(4)
+    states, controls = Simulator(box, push, x_0, 25).simulate()
+    assert states.shape == (25, 4)
+    assert controls.shape == (25, 2)
+
+    x_k = x_0
+    for k in range(24):
+        assert np.allclose(states[k], x_k)
+        assert np.allclose(controls[k], push(x_k, k))
+        x_k = box.x_k_1(x_k, push(x_k, k))
+    assert np.allclose(states[24], x_k)
+
+def test_simulate_reuses_buffers():
+    """Test that caller-provided buffers are written into in place."""
+    box = BoxDynamics()
+    simulator = Simulator(box, push, np.zeros((3, 4)), 20)
+    states = np.empty((20, 3, 4))
+    controls = np.empty((20, 3, 2))
+    out_states, out_controls = simulator.simulate(states, controls)
+    assert out_states is states
+    assert out_controls is controls
+
+    with pytest.raises(ValueError):
+        simulator.simulate(np.empty((10, 3, 4)), controls)
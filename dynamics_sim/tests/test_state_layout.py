@@ -0,0 +1,43 @@
+"""Unit tests for the StateLayout descriptor."""
+
+import numpy as np
+import pytest
+
+from dynamics_sim.models.gravity_dynamics import GravityDynamics
+from dynamics_sim.state_layout import StateLayout
+
+def test_views_are_zero_copy():
+    """Test that field views share memory with the underlying buffer."""
+    layout = StateLayout(("p", 2), ("v", 2, ["vx", "vy"]))
+    x = np.arange(12.0).reshape(3, 4)
+    p, v = layout.views(x)
+    assert np.shares_memory(p, x) and np.shares_memory(v, x)
+    assert np.allclose(v, x[:, 2:4])
+
+    layout.view(x, "p")[...] = -1.0
+    assert np.all(x[:, 0:2] == -1.0)
+    assert layout.labels == ["p[0]", "p[1]", "vx", "vy"]
+    assert layout.span("p", "v") == slice(0, 4)
+
+def test_invalid_layouts():
+    """Test that inconsistent layouts and vectors are rejected."""
+    with pytest.raises(ValueError):
+        StateLayout(("p", 2), ("p", 2))
+    with pytest.raises(ValueError):
+        StateLayout(("p", 2, ["only one label"]))
+    with pytest.raises(ValueError):
+        StateLayout(("p", 2)).views(np.zeros(3))
+
+def test_gravity_derivative_written_in_place():
+    """Test that GravityDynamics writes its derivative into out."""
+    model = GravityDynamics()
+    layout = model.state_layout
+    assert len(layout) == 13
+    x = np.zeros((4, 13))
+    x[:, 0] = 7000e3
+    x[:, 3] = 1.0
+    x[:, 8] = 7.5e3
+    out = np.full_like(x, np.nan)
+    assert model.x_dot_k_1(x, np.zeros(3), out=out) is out
+    assert np.allclose(layout.view(out, "r_N"), layout.view(x, "v_N"))
+    assert np.allclose(layout.view(out, "w_B"), 0.0)
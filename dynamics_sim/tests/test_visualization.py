@@ -0,0 +1,85 @@
+"""Unit tests for the meshcat visualization helpers. A stub stands in for the
+meshcat Visualizer so that no server is started.
+"""
+
+import numpy as np
+from meshcat.path import Path
+
+from dynamics_sim.visualization import (MeshcatSink, RealtimePacer, frame_stride,
+                                        play_realtime, upload_animation)
+
+class StubVisualizer:
+    def __init__(self, path=Path(("meshcat",)), log=None):
+        self.path = path
+        self.log = [] if log is None else log
+
+    def __getitem__(self, name):
+        return StubVisualizer(self.path.append(name), self.log)
+
+    def set_transform(self, T):
+        self.log.append((self.path.lower(), T))
+
+    def set_animation(self, animation, play=True, repetitions=1):
+        self.log.append(("animation", animation))
+
+class FakeClock:
+    """Clock that only advances when slept on, plus a fixed cost per call."""
+
+    def __init__(self, cost=0.0):
+        self.now = 0.0
+        self.cost = cost
+
+    def __call__(self):
+        self.now += self.cost
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_upload_animation_decimates_keyframes():
+    """Test that many bodies are uploaded as one decimated animation."""
+    vis = StubVisualizer()
+    positions = np.random.default_rng(0).normal(size=(1000, 5, 3))
+    quaternions = np.tile([1.0, 0.0, 0.0, 0.0], (1000, 5, 1))
+    names = [f"sat{i}" for i in range(5)]
+    animation = upload_animation(vis, names, positions, quaternions, dt=0.01, fps=25)
+
+    assert len(vis.log) == 1 and vis.log[0][0] == "animation"
+    assert frame_stride(0.01, 25) == 4
+    assert len(animation.clips) == 5
+    clip = animation.clips[vis["sat2"].path].lower()
+    assert clip["fps"] == 25
+    position_track = next(t for t in clip["tracks"] if t["name"] == ".position")
+    assert len(position_track["keys"]) == 250
+    assert np.allclose(position_track["keys"][10]["value"], positions[40, 2])
+
+def test_pacer_does_not_drift():
+    """Test that pacing is measured from the start time, so per-frame send
+    costs do not accumulate, and that surplus timesteps are dropped.
+    """
+    clock = FakeClock(cost=0.001)
+    pacer = RealtimePacer(dt=0.01, fps=20, clock=clock, sleep=clock.sleep)
+    shown = [k for k in range(1001) if pacer.due(k)]
+    assert shown == list(range(0, 1001, 5))
+    assert abs(clock.now - 10.0) < 0.01
+
+def test_play_realtime_drops_frames_when_slow():
+    """Test that slow frame sends cause frames to be skipped, not delayed."""
+    clock = FakeClock(cost=0.05)
+    pacer = RealtimePacer(dt=0.01, fps=30, clock=clock, sleep=clock.sleep)
+    vis = StubVisualizer()
+    positions = np.zeros((500, 3))
+    num_shown = play_realtime(vis, ["box"], positions, dt=0.01, pacer=pacer)
+    assert 0 < num_shown < 500 // frame_stride(0.01, 30)
+    assert clock.now < 5.0 + 0.5
+
+def test_meshcat_sink():
+    """Test streaming states through the sink."""
+    clock = FakeClock()
+    vis = StubVisualizer()
+    pacer = RealtimePacer(dt=0.01, fps=50, clock=clock, sleep=clock.sleep)
+    sink = MeshcatSink(vis, ["box"], lambda x: (x[:3], None), dt=0.01, pacer=pacer)
+    for k in range(100):
+        sink.append(np.full(4, float(k)))
+    assert sink.num_shown == 50
+    assert np.allclose(vis.log[1][1][:3, 3], 2.0)
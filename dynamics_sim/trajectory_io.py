@@ -0,0 +1,284 @@
+"""Streaming on-disk trajectory storage.
+
+A trajectory is stored as a directory containing:
+    states.npy      (T, ...) states, a regular .npy file.
+    controls.npy    (T, ...) controls, if any were recorded.
+    metadata.json   State and control names, dt, the model class and its
+                    parameters, and any user-provided metadata.
+
+TrajectoryWriter appends fixed-size chunks to the .npy files as the simulation
+runs, so its memory use does not depend on the horizon, and it rewrites the
+fixed-size .npy header after every chunk so the files are always valid.
+TrajectoryReader memory-maps the files, so opening a trajectory is instant and
+slicing a time range only reads that range from disk.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+STATES_FILE = "states.npy"
+CONTROLS_FILE = "controls.npy"
+METADATA_FILE = "metadata.json"
+
+class _NpyAppender:
+    """Appends rows to a .npy file in fixed-size chunks."""
+
+    # Total size of the magic string, version, and header. Padding the header
+    # to a fixed size lets it be rewritten in place as the file grows.
+    HEADER_SIZE = 128
+
+    def __init__(self,
+                 path: str,
+                 row_shape: Tuple[int, ...],
+                 dtype,
+                 chunk_size: int,
+                 length: Optional[int] = None):
+        self._row_shape = tuple(row_shape)
+        self._dtype = np.dtype(dtype)
+        self._buffer = np.empty((chunk_size,) + self._row_shape, dtype=self._dtype)
+        self._fill = 0
+        if length is None:
+            self._file = open(path, "wb")
+            self.length = 0
+        else:
+            # Keep the first length rows of an existing file and drop anything
+            # after them, e.g., rows written after the last checkpoint.
+            size = self.HEADER_SIZE + length * self._buffer[0].nbytes
+            if os.path.getsize(path) < size:
+                raise ValueError(f"{path} holds fewer than the {length} timesteps to resume after")
+            self._file = open(path, "r+b")
+            self._file.truncate(size)
+            self.length = length
+        self._write_header()
+
+    def _write_header(self):
+        header = repr({"descr": np.lib.format.dtype_to_descr(self._dtype),
+                       "fortran_order": False,
+                       "shape": (self.length,) + self._row_shape})
+        preamble = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+        header_len = self.HEADER_SIZE - len(preamble) - 2
+        header = header.ljust(header_len - 1) + "\n"
+        if len(header) != header_len:
+            raise ValueError(f"Row shape {self._row_shape} is too large for the .npy header")
+        self._file.seek(0)
+        self._file.write(preamble + header_len.to_bytes(2, "little") + header.encode("latin1"))
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, row: np.ndarray):
+        self._buffer[self._fill] = row
+        self._fill += 1
+        if self._fill == len(self._buffer):
+            self.flush()
+
+    def extend(self, rows: np.ndarray):
+        i = 0
+        while i < len(rows):
+            count = min(len(rows) - i, len(self._buffer) - self._fill)
+            self._buffer[self._fill:self._fill + count] = rows[i:i + count]
+            self._fill += count
+            i += count
+            if self._fill == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        if self._fill:
+            self._buffer[:self._fill].tofile(self._file)
+            self.length += self._fill
+            self._fill = 0
+            self._write_header()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class TrajectoryWriter:
+    """Trajectory sink that streams states (and optionally controls) to disk
+    in fixed-size chunks. Use it as a context manager, or call close when done.
+
+    Example:
+        with TrajectoryWriter("runs/orbit", model=model) as writer:
+            simulator.stream(writer)
+    """
+
+    def __init__(self,
+                 directory: str,
+                 model: Optional[DynamicsModel] = None,
+                 metadata: Optional[Dict[str, Any]] = None,
+                 chunk_size: int = 4096,
+                 dtype=None,
+                 resume: Optional[int] = None):
+        """Initialize the writer.
+
+        Args:
+            directory (str): Directory to write the trajectory into. Created if
+            it does not exist.
+            model (Optional[DynamicsModel], optional): The simulated model. Its
+            state/control names, dt, class, and parameters are recorded in the
+            metadata. Defaults to None.
+            metadata (Optional[Dict[str, Any]], optional): Additional JSON
+            serializable metadata. Defaults to None.
+            chunk_size (int, optional): Number of timesteps buffered in memory
+            before being written out. Defaults to 4096.
+            dtype (optional): dtype to store the trajectory as. Defaults to
+            None (the dtype of the first appended state).
+            resume (Optional[int], optional): Append to the trajectory already
+            in directory after its first resume timesteps, discarding the
+            rest, e.g., checkpoint.k + 1 when resuming from a checkpoint (see
+            dynamics_sim.checkpoint). Defaults to None (start a new
+            trajectory).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        self.resume = resume
+        self._states = None
+        self._controls = None
+
+        self.metadata = {}
+        if model is not None:
+            self.metadata.update(model=type(model).__name__,
+                                 dt=model.dt,
+                                 params=model.parameters())
+            if model.state_layout is not None:
+                self.metadata["state_names"] = model.state_layout.labels
+            if model.control_layout is not None:
+                self.metadata["control_names"] = model.control_layout.labels
+        self.metadata.update(metadata or {})
+        self._write_metadata()
+
+    def _write_metadata(self):
+        def to_json(value):
+            if isinstance(value, (np.ndarray, np.generic)):
+                return value.tolist()
+            raise TypeError(f"Cannot serialize {type(value).__name__} to JSON")
+        with open(os.path.join(self.directory, METADATA_FILE), "w") as f:
+            json.dump(self.metadata, f, indent=2, default=to_json)
+
+    def _appender(self, name: str, like: np.ndarray) -> _NpyAppender:
+        dtype = self.dtype if self.dtype is not None else like.dtype
+        return _NpyAppender(os.path.join(self.directory, name), like.shape, dtype,
+                            self.chunk_size, length=self.resume)
+
+    def append(self, x_k: np.ndarray, u_k: Optional[np.ndarray] = None):
+        """Append the state (and control) of one timestep.
+
+        Args:
+            x_k (np.ndarray): The state, (n,) or a batch of states (N, n).
+            u_k (Optional[np.ndarray], optional): The control commanded at x_k.
+            Defaults to None.
+        """
+        x_k = np.asarray(x_k)
+        if self._states is None:
+            self._states = self._appender(STATES_FILE, x_k)
+        self._states.append(x_k)
+        if u_k is not None:
+            u_k = np.asarray(u_k)
+            if self._controls is None:
+                self._controls = self._appender(CONTROLS_FILE, u_k)
+            self._controls.append(u_k)
+
+    def extend(self, states: np.ndarray, controls: Optional[np.ndarray] = None):
+        """Append a block of timesteps at once.
+
+        Args:
+            states (np.ndarray): (K, ...) states.
+            controls (Optional[np.ndarray], optional): (K, ...) controls.
+            Defaults to None.
+        """
+        states = np.asarray(states)
+        if self._states is None:
+            self._states = self._appender(STATES_FILE, states[0])
+        self._states.extend(states)
+        if controls is not None:
+            controls = np.asarray(controls)
+            if self._controls is None:
+                self._controls = self._appender(CONTROLS_FILE, controls[0])
+            self._controls.extend(controls)
+
+    def flush(self):
+        """Write any buffered timesteps to disk."""
+        for appender in (self._states, self._controls):
+            if appender is not None:
+                appender.flush()
+
+    def close(self):
+        """Flush and close the trajectory files."""
+        for appender in (self._states, self._controls):
+            if appender is not None:
+                appender.close()
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrajectoryReader:
+    """Lazily reads a trajectory written by TrajectoryWriter. The states and
+    controls are memory-mapped, so nothing is loaded until it is sliced.
+    """
+
+    def __init__(self, directory: str):
+        """Open a trajectory directory.
+
+        Args:
+            directory (str): The directory written by TrajectoryWriter.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.states = np.load(os.path.join(directory, STATES_FILE), mmap_mode="r")
+        controls_path = os.path.join(directory, CONTROLS_FILE)
+        self.controls = np.load(controls_path, mmap_mode="r") \
+            if os.path.exists(controls_path) else None
+
+    @property
+    def dt(self) -> Optional[float]:
+        return self.metadata.get("dt")
+
+    @property
+    def state_names(self) -> Optional[list]:
+        return self.metadata.get("state_names")
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def times(self) -> np.ndarray:
+        """Return the (T,) times of every timestep in seconds."""
+        if self.dt is None:
+            raise ValueError("The trajectory was written without a dt")
+        return np.arange(len(self)) * self.dt
+
+    def window(self,
+               t_start: Optional[float] = None,
+               t_stop: Optional[float] = None
+               ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Return the timesteps with t_start <= t < t_stop without loading the
+        rest of the trajectory.
+
+        Args:
+            t_start (Optional[float], optional): Start time in seconds.
+            Defaults to None (the beginning).
+            t_stop (Optional[float], optional): Stop time in seconds. Defaults
+            to None (the end).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]: The times, and
+            memory-mapped views of the states and controls in the window.
+        """
+        if self.dt is None:
+            raise ValueError("The trajectory was written without a dt")
+        start = 0 if t_start is None else max(0, int(np.ceil(t_start / self.dt - 1e-9)))
+        stop = len(self) if t_stop is None else min(len(self), int(np.ceil(t_stop / self.dt - 1e-9)))
+        stop = max(start, stop)
+        controls = None if self.controls is None else self.controls[start:stop]
+        return np.arange(start, stop) * self.dt, self.states[start:stop], controls
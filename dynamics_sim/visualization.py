@@ -0,0 +1,312 @@
+"""Utility functions for visualizing simulation results in meshcat.
+
+Two playback modes are provided:
+    upload_animation    Sends a whole trajectory of one or many bodies to the
+                        browser as a single meshcat Animation, with keyframes
+                        decimated to the display frame rate. The browser then
+                        plays it back in real time on its own.
+    play_realtime /     Sends transforms one frame at a time for live
+    MeshcatSink         streaming, paced against the wall clock. Frames that
+                        cannot be shown in time are dropped rather than
+                        delaying later ones, so playback never drifts.
+"""
+
+import time
+from typing import TYPE_CHECKING, Callable, Optional, Sequence, Tuple
+
+import numpy as np
+import quatmath as qm
+
+from dynamics_sim.models.dynamics_model import DynamicsModel
+
+if TYPE_CHECKING:
+    from meshcat.animation import Animation
+
+# Maps a (..., n) state to (..., 3) positions and optional (..., 4) [w, x, y,
+# z] attitude quaternions of the bodies it describes.
+PoseFn = Callable[[np.ndarray], Tuple[np.ndarray, Optional[np.ndarray]]]
+
+def layout_pose(model: DynamicsModel,
+                position: str = None,
+                attitude: str = None) -> PoseFn:
+    """Build a PoseFn that reads body poses out of a model's StateLayout.
+
+    Args:
+        model (DynamicsModel): The model whose state_layout is used.
+        position (str, optional): Name of the position field. Defaults to None
+        ("r_N" or "p", whichever the layout has). 2D positions are placed in
+        the z = 0 plane.
+        attitude (str, optional): Name of the quaternion field. Defaults to
+        None ("q_N_B" if the layout has it, otherwise no attitude).
+
+    Returns:
+        PoseFn: The pose function.
+    """
+    layout = model.state_layout
+    if position is None:
+        position = "r_N" if "r_N" in layout.slices else "p"
+    if attitude is None and "q_N_B" in layout.slices:
+        attitude = "q_N_B"
+
+    def pose(x: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        p = layout.view(x, position)
+        if p.shape[-1] < 3:
+            p = np.concatenate([p, np.zeros(p.shape[:-1] + (3 - p.shape[-1],))], axis=-1)
+        q = None if attitude is None else layout.view(x, attitude)
+        return p, q
+    return pose
+
+def transforms(positions: np.ndarray, quaternions: Optional[np.ndarray] = None) -> np.ndarray:
+    """Build homogeneous transforms from positions and attitude quaternions.
+
+    Args:
+        positions (np.ndarray): (..., 3) positions.
+        quaternions (Optional[np.ndarray], optional): (..., 4) quaternions in
+        the form [w, x, y, z]. Defaults to None (identity rotations).
+
+    Returns:
+        np.ndarray: The (..., 4, 4) transforms.
+    """
+    positions = np.asarray(positions)
+    T = np.zeros(positions.shape[:-1] + (4, 4))
+    T[..., :3, :3] = np.eye(3) if quaternions is None else qm.Q(quaternions)
+    T[..., :3, 3] = positions
+    T[..., 3, 3] = 1.0
+    return T
+
+def frame_stride(dt: float, fps: float) -> int:
+    """Return how many timesteps to advance per displayed frame so that a
+    trajectory with timestep dt plays back at (no more than) fps.
+    """
+    return max(1, int(np.ceil(1.0 / (dt * fps) - 1e-9)))
+
+def upload_animation(vis,
+                     names: Sequence[str],
+                     positions: np.ndarray,
+                     quaternions: Optional[np.ndarray] = None,
+                     dt: float = 0.01,
+                     fps: float = 30.0,
+                     play: bool = True,
+                     repetitions: int = 1) -> "Animation":
+    """Send the trajectories of one or many bodies to meshcat as a single
+    Animation.
+
+    The animation tracks are built directly from the (decimated) arrays
+    rather than one set_transform call per body per frame, so uploading a
+    1000 body scene is one message and one pass over the data.
+
+    Args:
+        vis (meshcat.Visualizer): The visualizer. Objects named names must
+        already have been created under it with set_object.
+        names (Sequence[str]): The N object names, e.g., ["box"].
+        positions (np.ndarray): (T, N, 3) positions, or (T, 3) for one body.
+        quaternions (Optional[np.ndarray], optional): (T, N, 4) (or (T, 4))
+        [w, x, y, z] attitude quaternions. Defaults to None.
+        dt (float, optional): Timestep length of the trajectory. Defaults to
+        0.01.
+        fps (float, optional): Display frame rate to decimate to. Defaults to
+        30.0.
+        play (bool, optional): Start playing immediately. Defaults to True.
+        repetitions (int, optional): Number of times to play. Defaults to 1.
+
+    Returns:
+        Animation: The uploaded animation.
+    """
+    # Imported here so that headless jobs importing this module (e.g., for
+    # transforms) never load meshcat.
+    try:
+        from meshcat.animation import Animation, AnimationClip, AnimationTrack
+    except ImportError as e:
+        raise ImportError("Animations require meshcat: pip install meshcat") from e
+
+    positions = np.asarray(positions)
+    if positions.ndim == 2:
+        positions = positions[:, None, :]
+        quaternions = None if quaternions is None else np.asarray(quaternions)[:, None, :]
+    if positions.shape[1] != len(names):
+        raise ValueError(f"Got {len(names)} names for {positions.shape[1]} bodies")
+
+    stride = frame_stride(dt, fps)
+    frame_rate = 1.0 / (dt * stride)
+    positions = positions[::stride]
+    frames = list(range(len(positions)))
+    if quaternions is not None:
+        # meshcat (three.js) orders quaternions as [x, y, z, w].
+        quaternions = np.asarray(quaternions)[::stride][..., [1, 2, 3, 0]]
+
+    animation = Animation(default_framerate=frame_rate)
+    for i, name in enumerate(names):
+        tracks = {"position": AnimationTrack("position", "vector3", frames,
+                                             positions[:, i].tolist())}
+        if quaternions is not None:
+            tracks["quaternion"] = AnimationTrack("quaternion", "quaternion", frames,
+                                                  quaternions[:, i].tolist())
+        animation.clips[vis[name].path] = AnimationClip(tracks=tracks, fps=frame_rate)
+
+    vis.set_animation(animation, play=play, repetitions=repetitions)
+    return animation
+
+def set_transforms(vis,
+                   names: Sequence[str],
+                   positions: np.ndarray,
+                   quaternions: Optional[np.ndarray] = None):
+    """Set the current transforms of one or many bodies.
+
+    Args:
+        vis (meshcat.Visualizer): The visualizer.
+        names (Sequence[str]): The N object names.
+        positions (np.ndarray): (N, 3) positions, or (3,) for one body.
+        quaternions (Optional[np.ndarray], optional): (N, 4) or (4,) [w, x, y,
+        z] quaternions. Defaults to None.
+    """
+    T = transforms(positions, quaternions).reshape(-1, 4, 4)
+    for name, T_i in zip(names, T):
+        vis[name].set_transform(T_i)
+
+
+class RealtimePacer:
+    """Paces the display of simulation timesteps against the wall clock.
+
+    Timestep k is due at wall time k * dt / speed after start. Every target
+    time is measured from the same start time (rather than sleeping dt after
+    each frame), so the time spent sending frames never accumulates into
+    drift. Timesteps that would be displayed within 1 / fps of the previously
+    displayed one are dropped.
+    """
+
+    def __init__(self,
+                 dt: float,
+                 fps: float = 30.0,
+                 speed: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """Initialize the pacer.
+
+        Args:
+            dt (float): Simulation timestep length.
+            fps (float, optional): Maximum display frame rate. Defaults to 30.
+            speed (float, optional): Playback speed relative to real time.
+            Defaults to 1.0.
+            clock (Callable[[], float], optional): Monotonic clock. Defaults
+            to time.monotonic.
+            sleep (Callable[[float], None], optional): Sleep function.
+            Defaults to time.sleep.
+        """
+        self.dt = dt
+        self.frame_period = 1.0 / fps
+        self.speed = speed
+        self._clock = clock
+        self._sleep = sleep
+        self._start = None
+        self._last_shown = -np.inf
+
+    def due(self, k: int) -> bool:
+        """Return whether timestep k should be displayed, sleeping first if it
+        is ahead of the wall clock.
+
+        Args:
+            k (int): The timestep index.
+
+        Returns:
+            bool: True if the timestep should be displayed, False if it should
+            be dropped.
+        """
+        if self._start is None:
+            self._start = self._clock()
+        target = k * self.dt / self.speed
+        # Allow for rounding in k * dt when comparing against the frame period.
+        if target - self._last_shown < self.frame_period * (1 - 1e-6):
+            return False
+        ahead = target - (self._clock() - self._start)
+        if ahead > 0:
+            self._sleep(ahead)
+        self._last_shown = target
+        return True
+
+    def current_step(self) -> int:
+        """Return the timestep that is due at the current wall time."""
+        if self._start is None:
+            self._start = self._clock()
+        return int((self._clock() - self._start) * self.speed / self.dt)
+
+
+def play_realtime(vis,
+                  names: Sequence[str],
+                  positions: np.ndarray,
+                  quaternions: Optional[np.ndarray] = None,
+                  dt: float = 0.01,
+                  fps: float = 30.0,
+                  speed: float = 1.0,
+                  pacer: Optional[RealtimePacer] = None) -> int:
+    """Play back a recorded trajectory by sending transforms frame by frame,
+    always showing the timestep that is due at the current wall time. If
+    sending a frame takes longer than a frame period, the timesteps that
+    should have been shown in the meantime are skipped.
+
+    Args:
+        vis (meshcat.Visualizer): The visualizer.
+        names (Sequence[str]): The N object names.
+        positions (np.ndarray): (T, N, 3) or (T, 3) positions.
+        quaternions (Optional[np.ndarray], optional): (T, N, 4) or (T, 4)
+        quaternions. Defaults to None.
+        dt (float, optional): Timestep length. Defaults to 0.01.
+        fps (float, optional): Maximum display frame rate. Defaults to 30.
+        speed (float, optional): Playback speed relative to real time.
+        Defaults to 1.0.
+        pacer (Optional[RealtimePacer], optional): Custom pacer. Defaults to
+        None.
+
+    Returns:
+        int: The number of frames that were displayed.
+    """
+    pacer = RealtimePacer(dt, fps, speed) if pacer is None else pacer
+    stride = frame_stride(dt / speed, fps)
+    num_shown = 0
+    k = 0
+    while k < len(positions):
+        if pacer.due(k):
+            set_transforms(vis, names, positions[k],
+                           None if quaternions is None else quaternions[k])
+            num_shown += 1
+        k = max(k + stride, pacer.current_step())
+    return num_shown
+
+
+class MeshcatSink:
+    """Trajectory sink that streams a running simulation to meshcat in real
+    time, e.g., Simulator(...).stream(MeshcatSink(vis, ["box"], pose, dt)).
+    """
+
+    def __init__(self,
+                 vis,
+                 names: Sequence[str],
+                 pose: PoseFn,
+                 dt: float,
+                 fps: float = 30.0,
+                 speed: float = 1.0,
+                 pacer: Optional[RealtimePacer] = None):
+        """Initialize the sink.
+
+        Args:
+            vis (meshcat.Visualizer): The visualizer.
+            names (Sequence[str]): The N object names.
+            pose (PoseFn): Extracts body poses from a state (see layout_pose).
+            dt (float): Simulation timestep length.
+            fps (float, optional): Maximum display frame rate. Defaults to 30.
+            speed (float, optional): Playback speed relative to real time.
+            Defaults to 1.0.
+            pacer (Optional[RealtimePacer], optional): Custom pacer. Defaults
+            to None.
+        """
+        self.vis = vis
+        self.names = names
+        self.pose = pose
+        self.pacer = RealtimePacer(dt, fps, speed) if pacer is None else pacer
+        self.k = 0
+        self.num_shown = 0
+
+    def append(self, x_k: np.ndarray, u_k: Optional[np.ndarray] = None):
+        if self.pacer.due(self.k):
+            set_transforms(self.vis, self.names, *self.pose(x_k))
+            self.num_shown += 1
+        self.k += 1
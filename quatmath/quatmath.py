@@ -39,105 +39,116 @@ def skew(v: np.ndarray) -> np.ndarray:
     """Compute the skew symmetric matrix of a vector in R3.
 
     Args:
-        v (np.ndarray): A vector in R3.
+        v (np.ndarray): A vector in R3, or a (..., 3) array of vectors.
 
     Returns:
-        np.ndarray: The skew symmetric matrix of the given vector v in R3.
+        np.ndarray: The (..., 3, 3) skew symmetric matrix of the given vector v
+        in R3.
     """
-    return np.array([
-        [0.0, -v[2], v[1]],
-        [v[2], 0.0, -v[0]],
-        [-v[1], v[0], 0.0]
-    ])
+    v = np.asarray(v)
+    x, y, z = v[..., 0], v[..., 1], v[..., 2]
+    zero = np.zeros_like(x)
+    return np.stack([
+        np.stack([zero, -z, y], axis=-1),
+        np.stack([z, zero, -x], axis=-1),
+        np.stack([-y, x, zero], axis=-1)
+    ], axis=-2)
 
 def hat(v: np.ndarray) -> np.ndarray:
     """Compute the "hat" map of a vector in R3 to a vector in R4.
 
     Args:
-        v (np.ndarray): A vector in R3.
+        v (np.ndarray): A vector in R3, or a (..., 3) array of vectors.
 
     Returns:
         np.ndarray: The "hat" map of the given vector v in R3 to a vector in R4.
 
-    NOTE: This function uses np.dot under the hood--this may have performance
-    implications if you are passing in an array of vectors to be mapped. Might
-    want to consider using matmul instead.
+    NOTE: Equivalent to H @ v, but written as a concatenation along the last
+    axis so that it does not need a matrix product and works on stacked
+    vectors.
     """
-    return np.dot(H, v)
+    v = np.asarray(v)
+    return np.concatenate([np.zeros_like(v[..., :1]), v], axis=-1)
 
 def unhat(v: np.ndarray) -> np.ndarray:
     """Compute the "unhat" map of a vector in R4 to a vector in R3.
 
     Args:
-        v (np.ndarray): A "hatted" vector in R4.
+        v (np.ndarray): A "hatted" vector in R4, or a (..., 4) array of them.
 
     Returns:
         np.ndarray: The "unhat" map of the given vector v in R4 to a vector in R3.
 
-    NOTE: This function uses np.dot under the hood--this may have performance
-    implications if you are passing in an array of vectors to be mapped. Might
-    want to consider using matmul instead.
+    NOTE: Equivalent to H.T @ v, but returns a copy of the vector part instead
+    of performing a matrix product.
     """
-    return np.dot(H.T, v)
+    return np.array(np.asarray(v)[..., 1:4])
 
 def invert(q: np.ndarray) -> np.ndarray:
     """Invert a quaternion.
 
     Args:
-        q (np.ndarray): A quaternion in the form [w, x, y, z].
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
 
     Returns:
         np.ndarray: The inverted quaternion.
+
+    NOTE: diag(T) is cast to the dtype of q first, so that float32
+    quaternions are not upcast to float64.
     """
-    return np.dot(T, q)
+    q = np.asarray(q)
+    return q * np.diag(T).astype(np.result_type(q, 1.0))
 
 def L(q: np.ndarray) -> np.ndarray:
     """Compute the "L" matrix from a given quaternion q.
 
     Args:
-        q (np.ndarray): A quaternion in the form [w, x, y, z].
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
 
     Returns:
-        np.ndarray: The "L" matrix corresponding to the given quaternion q.
+        np.ndarray: The (..., 4, 4) "L" matrix corresponding to the given
+        quaternion q.
     
     NOTE: This function directly forms skew symmetric matrices from the vector
     part of the quaternion. Could use the "skew" helper function instead, but
     this avoids the overhead of constructing intermediate arrays.
     """
-    w, x, y, z = q
-    return np.array([
-        [w, -x, -y, -z],
-        [x, w, -z, y],
-        [y, z, w, -x],
-        [z, -y, x, w]
-    ])
+    q = np.asarray(q)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack([
+        np.stack([w, -x, -y, -z], axis=-1),
+        np.stack([x, w, -z, y], axis=-1),
+        np.stack([y, z, w, -x], axis=-1),
+        np.stack([z, -y, x, w], axis=-1)
+    ], axis=-2)
 
 def R(q: np.ndarray) -> np.ndarray:
     """Compute the "R" matrix from a given quaternion q.
 
     Args:
-        q (np.ndarray): A quaternion in the form [w, x, y, z].
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
 
     Returns:
-        np.ndarray: The "R" matrix corresponding to the given quaternion q.
+        np.ndarray: The (..., 4, 4) "R" matrix corresponding to the given
+        quaternion q.
 
     NOTE: This function directly forms skew symmetric matrices from the vector
     part of the quaternion. Could use the "skew" helper function instead, but
     this avoids the overhead of constructing intermediate arrays.
     """
-    w, x, y, z = q
-    return np.array([
-        [w, -x, -y, -z],
-        [x, w, z, -y],
-        [y, -z, w, x],
-        [z, y, -x, w]
-    ])
+    q = np.asarray(q)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack([
+        np.stack([w, -x, -y, -z], axis=-1),
+        np.stack([x, w, z, -y], axis=-1),
+        np.stack([y, -z, w, x], axis=-1),
+        np.stack([z, y, -x, w], axis=-1)
+    ], axis=-2)
 
 
-# Write a function to "compose" two rotations == multiply two quaternions. Do
-# this using the L and R functions defined above.
-# def compose()
-
 def compose(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
     """Compose two rotations by multiplying two quaternions in the order q1 (*)
     q2.
@@ -149,8 +160,21 @@ def compose(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: The quaternion that results from composing the two rotations
         q1 (*) q2.
+
+    NOTE: Equivalent to L(q1) @ q2, but evaluated as the closed-form Hamilton
+    product so that no 4x4 matrix is formed. q1 and q2 may be stacked (..., 4)
+    arrays of quaternions with broadcastable leading dimensions.
     """
-    return np.dot(L(q1), q2)
+    q1 = np.asarray(q1)
+    q2 = np.asarray(q2)
+    w1, x1, y1, z1 = q1[..., 0], q1[..., 1], q1[..., 2], q1[..., 3]
+    w2, x2, y2, z2 = q2[..., 0], q2[..., 1], q2[..., 2], q2[..., 3]
+    return np.stack([
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        x1 * w2 + w1 * x2 - z1 * y2 + y1 * z2,
+        y1 * w2 + z1 * x2 + w1 * y2 - x1 * z2,
+        z1 * w2 - y1 * x2 + x1 * y2 + w1 * z2
+    ], axis=-1)
 
 
 # Define function to compute "Q(q)" recover a rotation matrix from a given
@@ -159,21 +183,88 @@ def Q(q: np.ndarray) -> np.ndarray:
     """Compute the equivalent rotation matrix from a quaternion q.
 
     Args:
-        q (np.ndarray): A quaternion in the form [w, x, y, z].
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
 
     Returns:
-        np.ndarray: The rotation matrix corresponding to the given quaternion q.
+        np.ndarray: The (..., 3, 3) rotation matrix corresponding to the given
+        quaternion q.
+
+    NOTE: Equivalent to H.T @ R(q).T @ L(q) @ H, but evaluated in closed form
+    instead of forming two 4x4 matrices and taking four matrix products.
     """
-    return H.T @ R(q).T @ L(q) @ H
+    q = np.asarray(q)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    ww, xx, yy, zz = w * w, x * x, y * y, z * z
+    wx, wy, wz = w * x, w * y, w * z
+    xy, xz, yz = x * y, x * z, y * z
+    return np.stack([
+        np.stack([ww + xx - yy - zz, 2 * (xy - wz), 2 * (xz + wy)], axis=-1),
+        np.stack([2 * (xy + wz), ww - xx + yy - zz, 2 * (yz - wx)], axis=-1),
+        np.stack([2 * (xz - wy), 2 * (yz + wx), ww - xx - yy + zz], axis=-1)
+    ], axis=-2)
+
+def rotate(q: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Rotate a vector v by the rotation represented by the quaternion q.
+
+    Args:
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
+        v (np.ndarray): A vector in R3, or a (..., 3) array of vectors.
+
+    Returns:
+        np.ndarray: The rotated vector(s), Q(q) @ v.
+
+    NOTE: Evaluated in closed form as (w^2 - u.u) v + 2 (u.v) u + 2 w (u x v),
+    where u is the vector part of q, which avoids forming the rotation matrix.
+    """
+    q = np.asarray(q)
+    v = np.asarray(v)
+    w = q[..., 0:1]
+    u = q[..., 1:4]
+    return ((w * w - np.sum(u * u, axis=-1, keepdims=True)) * v
+            + 2 * np.sum(u * v, axis=-1, keepdims=True) * u
+            + 2 * w * np.cross(u, v))
 
 def G(q: np.ndarray) -> np.ndarray:
     """Compute the attitude Jacobian matrix given a quaternion q
     
     Args:
-        q (np.ndarray): A quaternion in the form [w, x, y, z].
+        q (np.ndarray): A quaternion in the form [w, x, y, z], or a (..., 4)
+        array of quaternions.
     
     Returns:
-        np.ndarray: The attitude Jacobian matrix corresponding to the given
-        quaternion q.
+        np.ndarray: The (..., 4, 3) attitude Jacobian matrix corresponding to
+        the given quaternion q.
+
+    NOTE: Equivalent to L(q) @ H, i.e., the last three columns of L(q).
+    """
+    q = np.asarray(q)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack([
+        np.stack([-x, -y, -z], axis=-1),
+        np.stack([w, -z, y], axis=-1),
+        np.stack([z, w, -x], axis=-1),
+        np.stack([-y, x, w], axis=-1)
+    ], axis=-2)
+
+def exp(phi: np.ndarray) -> np.ndarray:
+    """Compute the quaternion exponential map of a rotation vector phi (axis
+    times angle), i.e., the unit quaternion that rotates by |phi| about phi.
+
+    Args:
+        phi (np.ndarray): A rotation vector in R3, or a (..., 3) array of them.
+
+    Returns:
+        np.ndarray: The unit quaternion(s) [cos(|phi|/2), sin(|phi|/2) phi/|phi|].
+
+    NOTE: For small angles, sin(|phi|/2)/|phi| is replaced by its Taylor series
+    to avoid dividing by zero. To first order this is [1, phi/2], which is the
+    familiar q + 0.5 * G(q) @ phi update once composed with q.
     """
-    return np.dot(L(q), H)
\ No newline at end of file
+    phi = np.asarray(phi)
+    theta = np.linalg.norm(phi, axis=-1, keepdims=True)
+    small = theta < 1e-6
+    safe_theta = np.where(small, 1.0, theta)
+    scale = np.where(small, 0.5 - theta**2 / 48, np.sin(0.5 * theta) / safe_theta)
+    return np.concatenate([np.cos(0.5 * theta), scale * phi], axis=-1)
@@ -106,3 +106,45 @@ def test_q():
     q = np.array([1, 1, 1, 1])
     R = qm.Q(q)
     assert np.allclose(R, np.array([[0, 0, 2], [0, 0, 2], [-2, -2, 0]]))
+
+def test_batched_matches_single():
+    """Test that every function accepts stacked (..., 4) / (..., 3) arrays and
+    matches applying it to each element individually.
+    """
+    rng = np.random.default_rng(0)
+    qs = rng.normal(size=(2, 5, 4))
+    vs = rng.normal(size=(2, 5, 3))
+    for name in ["invert", "L", "R", "Q", "G"]:
+        batched = getattr(qm, name)(qs)
+        for index in np.ndindex(2, 5):
+            assert np.allclose(batched[index], getattr(qm, name)(qs[index]))
+    for name in ["skew", "hat"]:
+        batched = getattr(qm, name)(vs)
+        for index in np.ndindex(2, 5):
+            assert np.allclose(batched[index], getattr(qm, name)(vs[index]))
+
+def test_closed_forms_match_matrix_route():
+    """Test the closed-form Q, compose and rotate against the L/R matrix
+    products they replace.
+    """
+    rng = np.random.default_rng(1)
+    qs = rng.normal(size=(10, 4))
+    vs = rng.normal(size=(10, 3))
+    for q1, q2, v in zip(qs, qs[::-1], vs):
+        assert np.allclose(qm.Q(q1), qm.H.T @ qm.R(q1).T @ qm.L(q1) @ qm.H)
+        assert np.allclose(qm.compose(q1, q2), qm.L(q1) @ q2)
+        assert np.allclose(qm.rotate(q1, v), qm.Q(q1) @ v)
+        assert np.allclose(qm.G(q1), qm.L(q1) @ qm.H)
+
+def test_exp():
+    """Test the quaternion exponential map."""
+    # A rotation of pi/2 about z.
+    q = qm.exp(np.array([0, 0, np.pi / 2]))
+    assert np.allclose(q, np.array([np.cos(np.pi / 4), 0, 0, np.sin(np.pi / 4)]))
+    assert np.allclose(qm.rotate(q, np.array([1, 0, 0])), np.array([0, 1, 0]))
+
+    # Batched, including the zero rotation.
+    phis = np.array([[0.0, 0.0, 0.0], [1e-9, 0.0, 0.0], [0.3, -0.2, 0.1]])
+    qs = qm.exp(phis)
+    assert np.allclose(qs[0], np.array([1, 0, 0, 0]))
+    assert np.allclose(np.linalg.norm(qs, axis=-1), 1.0)
@@ -3,41 +3,38 @@ dynamics_sim package. By all means possible, scripts that you invoke directly
 should not be included in the package itself.
 """
 
-import time
 import numpy as np
 
+from dynamics_sim.events import Event
 from dynamics_sim.models.box_dynamics import BoxDynamics
 from dynamics_sim.plotting import plot_states
-
-import meshcat
-import meshcat.geometry as g
-import meshcat.transformations as tf
+from dynamics_sim.simulator import Simulator
+from dynamics_sim.visualization import layout_pose, upload_animation
 
 # Initialize the box dynamics model
 TIMESTEP_LENGTH_S = 0.01
+NUM_TIMESTEPS = 250
 box_dynamics = BoxDynamics(surface_friction_coef=0.5,
                            dt=TIMESTEP_LENGTH_S)
 
 # Define initial state and control input
 x_k = np.array([0, 0, 0.0, 0.0])  # [p_x, p_y, v_x, v_y]
 
-# First simulate the dynamics for 50 timesteps where we apply a force in the x
-# direction, and then simulate for another 100 timesteps where we apply 0 force.
-
-# Store the state at each timestep in a list.
-states = [x_k]
+# First simulate the dynamics for 100 timesteps where we apply a force in the x
+# direction, and then simulate for another 150 timesteps where we apply 0 force.
+PUSH = np.array([10.0, 0.0])
+REST = np.array([0.0, 0.0])
 
-for i in range(1, 100):
-    u_k = np.array([10, 0])
-    x_k = states[i-1]
-    x_k_1 = box_dynamics.x_k_1(x_k, u_k)
-    states.append(x_k_1)
+def push_then_rest(x_k: np.ndarray, k: int) -> np.ndarray:
+    return PUSH if k < 99 else REST
 
-for i in range(100, 250):
-    u_k = np.array([0, 0])
-    x_k = states[i-1]
-    x_k = box_dynamics.x_k_1(x_k, u_k)
-    states.append(x_k)
+# Stop as soon as the box comes to rest (v_x falls to 0) rather than always
+# running all NUM_TIMESTEPS.
+box_stopped = Event(lambda x: x[..., 2], direction=-1, name="box_stopped")
+simulator = Simulator(box_dynamics, push_then_rest, x_k, NUM_TIMESTEPS)
+result = simulator.simulate_until([box_stopped])
+states = result.states[:result.num_steps[0]]
+controls = result.controls[:result.num_steps[0]]
 
 # # Create a plotly figure
 # fig = px.line(x=states[:, 0], y=states[:, 1], title="Box Trajectory")
@@ -50,13 +47,16 @@ for i in range(100, 250):
 
 print(len(states))
 
-states = np.array(states)
-
 # Create graphs for each component of the state vector.
-fig = plot_states(states, ["px (meters)", "py (meters)", "vx (m/s)", "vy (m/s)"])
+fig = plot_states(states, box_dynamics.state_layout)
 fig.show()
 
-# Create a meshcat visualizer
+# Create a meshcat visualizer. meshcat is only imported once it is needed; for
+# runs that only need the data, use the headless CLI instead:
+#     python -m dynamics_sim.cli scenario.json
+import meshcat
+import meshcat.geometry as g
+
 vis = meshcat.Visualizer()
 vis.open()
 vis.wait()
@@ -65,9 +65,10 @@ print(f"Open the visualizer at the following URL: {vis.url()}")
 # Create a box geometry
 vis["box"].set_object(g.Box([0.1, 0.1, 0.1]), g.MeshLambertMaterial(color=0x0000ff))
 
-for i in range(0, 250, 1):
-    vis["box"].set_transform(tf.translation_matrix([states[i, 0], states[i, 1], 0]))
-    time.sleep(TIMESTEP_LENGTH_S)
+# Upload the whole trajectory as a single animation that the browser plays back
+# in real time, rather than sending (and sleeping after) one transform per step.
+positions, _ = layout_pose(box_dynamics)(states)
+upload_animation(vis, ["box"], positions, dt=TIMESTEP_LENGTH_S)
 
 # TODO: Come up with a better way of simulating forward given an arbitrary
 # Dynamics object. Above code is a bit hacky.